@@ -1,4 +1,5 @@
 """Application configuration from environment. All Railway variable names unchanged."""
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
@@ -17,19 +18,54 @@ class Settings(BaseSettings):
     TELEGRAM_BOT_TOKEN: Optional[str] = None
     MINI_APP_URL: Optional[str] = None
     DEPLOY_NOTIFY_CHAT_ID: Optional[str] = None
+    TELEGRAM_API_URL: Optional[str] = None  # Bot API base, e.g. a local fake; default api.telegram.org
+
+    # Notification outbox dispatcher (per worker process)
+    NOTIFY_GLOBAL_RATE: float = 25.0  # messages/s across all chats (Telegram allows ~30)
+    NOTIFY_CHAT_RATE: float = 0.9  # messages/s to one chat (Telegram: 1; headroom for network jitter)
+    NOTIFY_BATCH_SIZE: int = 50
+    NOTIFY_POLL_SECONDS: float = 1.0
+    NOTIFY_MAX_ATTEMPTS: int = 5
 
     # GitHub
     GITHUB_ACCESS_TOKEN: Optional[str] = None
     GITHUB_REPO: Optional[str] = None
+    GITHUB_API_URL: str = "https://api.github.com"
+    GITHUB_BRANCH: str = "main"
+    GITHUB_BACKUP_RETRIES: int = 3  # per API call, on network errors, 429 and 5xx
+    GITHUB_BACKUP_FILES_PER_COMMIT: int = 200  # day files per Git Data API commit (backfills, catch-ups)
+    GITHUB_BACKUP_CATCHUP_DAYS: int = 3  # nightly backup re-checks this many days up to today
 
     # Backend URL (for frontend config)
     BACKEND_URL: Optional[str] = None
 
     # Optional
     OPENROUTER_API_KEY: Optional[str] = None
+    OPENROUTER_API_URL: str = "https://openrouter.ai/api/v1"
+    AI_SUMMARY_TIMEOUT_SECONDS: float = 15.0  # upstream call; keeps filling the cache after the request gave up
+    AI_SUMMARY_WAIT_SECONDS: float = 3.0  # how long a request waits before answering with the plain list
     ADMIN_IDS: Optional[str] = None  # comma-separated Telegram user IDs
 
+    # Connection pool (per worker process)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds; drop connections older than this
+    DB_POOL_PRE_PING: bool = True
+    HEALTH_DB_PROBE_INTERVAL: int = 10  # seconds; /health reuses a recent successful checkout
+
+    # Auth cache (verified initData -> user id/role)
+    AUTH_CACHE_MAX_ENTRIES: int = 1024
+    AUTH_CACHE_TTL_SECONDS: int = 3600
+    INIT_DATA_MAX_AGE_SECONDS: int = 86400
+
+    # Keyset-paginated lists (?limit= overrides the default up to PAGE_SIZE_MAX)
+    BABY_EVENTS_PAGE_SIZE: int = 50
+    HABIT_LOGS_PAGE_SIZE: int = 100
+    PAGE_SIZE_MAX: int = 500
+
 
+@lru_cache
 def get_settings() -> Settings:
-    """Load and validate settings. Call at app startup."""
+    """Load and validate settings once per process; later calls return the same instance."""
     return Settings()
@@ -1,36 +1,123 @@
-"""Database engine and session. Session only via get_db dependency or explicit context."""
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.ext.declarative import declarative_base
-from contextlib import contextmanager
-from typing import Generator
+"""Async database engine and session (asyncpg). Session only via get_db dependency or explicit context."""
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, Any
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
 
 from .config import get_settings
 
+
+def async_database_url(raw_url: str) -> URL:
+    """Railway gives postgres:// or postgresql:// (optionally ?sslmode=); asyncpg needs +asyncpg and ssl=."""
+    if raw_url.startswith("postgres://"):
+        raw_url = "postgresql://" + raw_url[len("postgres://"):]
+    url = make_url(raw_url)
+    if url.drivername in ("postgresql", "postgresql+psycopg2", "postgresql+psycopg"):
+        url = url.set(drivername="postgresql+asyncpg")
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+    return url
+
+
+class PoolMetrics:
+    """Counters for connection checkouts: wait time, overflow connections, timeouts."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.last_checkout_at = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.last_checkout_at = time.monotonic()
+
+    def record_overflow(self) -> None:
+        with self._lock:
+            self.overflow_events += 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool) -> Dict[str, Any]:
+        with self._lock:
+            avg = self.wait_total / self.checkouts if self.checkouts else 0.0
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(avg * 1000, 2),
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+            }
+
+
 _settings = get_settings()
-engine = create_engine(_settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(
+    async_database_url(_settings.DATABASE_URL),
+    pool_size=_settings.DB_POOL_SIZE,
+    max_overflow=_settings.DB_MAX_OVERFLOW,
+    pool_timeout=_settings.DB_POOL_TIMEOUT,
+    pool_recycle=_settings.DB_POOL_RECYCLE,
+    pool_pre_ping=_settings.DB_POOL_PRE_PING,
+)
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+pool_metrics = PoolMetrics()
 
 
-def get_db() -> Generator[Session, None, None]:
-    """Dependency for request-scoped DB session."""
-    db = SessionLocal()
+@event.listens_for(engine.sync_engine.pool, "connect")
+def _on_pool_connect(dbapi_connection, connection_record):
+    if engine.sync_engine.pool.overflow() > 0:
+        pool_metrics.record_overflow()
+
+
+def pool_status() -> Dict[str, Any]:
+    return pool_metrics.snapshot(engine.sync_engine.pool)
+
+
+async def _checkout(db: AsyncSession) -> None:
+    """Acquire the session's connection up front so checkout wait is measured."""
+    started = time.perf_counter()
     try:
+        await db.connection()
+    except exc.TimeoutError:
+        pool_metrics.record_timeout()
+        raise
+    pool_metrics.record_wait(time.perf_counter() - started)
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency for request-scoped DB session."""
+    async with SessionLocal() as db:
+        await _checkout(db)
         yield db
-    finally:
-        db.close()
 
 
-@contextmanager
-def session_scope() -> Generator[Session, None, None]:
+@asynccontextmanager
+async def session_scope() -> AsyncGenerator[AsyncSession, None]:
     """Context manager for explicit session (e.g. in cron jobs)."""
-    db = SessionLocal()
-    try:
-        yield db
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
-    finally:
-        db.close()
+    async with SessionLocal() as db:
+        try:
+            await _checkout(db)
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
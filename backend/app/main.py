@@ -1,35 +1,19 @@
 """FastAPI application entry point. Health checks process + DB only. Bot polling not run here (conflicts with uvicorn event loop)."""
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy import text
 
-from .database import engine, Base
+from .database import engine, pool_metrics, pool_status
 from .config import get_settings
 from . import models  # noqa: F401 - register models with Base
-from .routers import users, habits, baby, gamification, export
-
-
-def _run_habit_migration():
-    """Add description, goal_effective_from and new enum values if not present (e.g. after deploy)."""
-    with engine.connect() as conn:
-        conn.execute(text("ALTER TABLE habits ADD COLUMN IF NOT EXISTS description TEXT"))
-        conn.execute(text("ALTER TABLE habits ADD COLUMN IF NOT EXISTS goal_effective_from DATE"))
-        conn.commit()
-    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
-        for stmt in (
-            "ALTER TYPE habittype ADD VALUE 'times_per_week'",
-            "ALTER TYPE scheduletype ADD VALUE 'weekly_target'",
-        ):
-            try:
-                conn.execute(text(stmt))
-            except Exception as e:
-                if "already exists" not in str(e).lower():
-                    raise
-                logging.getLogger(__name__).debug("Enum value already exists: %s", e)
+from .routers import users, habits, baby, gamification, export, dashboard
+
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -47,26 +31,23 @@ def _error_response(detail: str, code: str = "error", status_code: int = 500):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Startup: DB + tables; optional scheduler, deploy notify, bot."""
+    """Startup: DB + pending migrations; optional scheduler, deploy notify, bot."""
     logger.info("Starting FamilyQuest API...")
+    started = time.perf_counter()
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         logger.info("Database connection OK")
     except Exception as e:
         logger.error("Database connection failed: %s", e)
         raise
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created/verified")
-    except Exception as e:
-        logger.error("Create tables failed: %s", e)
-        raise
-    try:
-        _run_habit_migration()
-        logger.info("Habit migration applied (description, goal_effective_from, enum values)")
+        from .migrate import run_migrations
+        applied = await run_migrations()
+        if applied:
+            logger.info("Migrations applied at startup: %s", ", ".join(applied))
     except Exception as e:
-        logger.error("Habit migration failed: %s", e)
+        logger.error("Migrations failed: %s", e)
         raise
 
     try:
@@ -87,8 +68,25 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning("Menu button setup skipped: %s", e)
 
+    dispatcher_stop = asyncio.Event()
+    dispatcher = None
+    if get_settings().TELEGRAM_BOT_TOKEN:
+        from .telegram.outbox import run_dispatcher
+        dispatcher = asyncio.create_task(run_dispatcher(dispatcher_stop))
+
+    logger.info("Startup finished in %.0f ms", (time.perf_counter() - started) * 1000)
     yield
     logger.info("Shutting down FamilyQuest API...")
+    dispatcher_stop.set()
+    if dispatcher is not None:
+        await dispatcher
+    from .telegram.bot import close_bot
+    await close_bot()
+    from .services.github_service import close_github_client
+    from .services.ai_service import close_ai_client
+    await close_github_client()
+    await close_ai_client()
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -104,6 +102,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -127,6 +126,7 @@ app.include_router(habits.router)
 app.include_router(baby.router)
 app.include_router(gamification.router)
 app.include_router(export.router)
+app.include_router(dashboard.router)
 
 
 @app.get("/")
@@ -136,10 +136,15 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health: process alive + DB reachable. No Telegram, no cron."""
+    """Health: process alive + DB reachable. No Telegram, no cron.
+    A successful pool checkout within HEALTH_DB_PROBE_INTERVAL counts as reachable, so probes don't take a connection."""
+    interval = get_settings().HEALTH_DB_PROBE_INTERVAL
+    if pool_metrics.last_checkout_at and time.monotonic() - pool_metrics.last_checkout_at < interval:
+        return {"status": "healthy"}
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        pool_metrics.last_checkout_at = time.monotonic()
         return {"status": "healthy"}
     except Exception as e:
         logger.exception("Health check failed")
@@ -147,3 +152,11 @@ async def health():
             content={"status": "unhealthy", "detail": str(e)},
             status_code=503,
         )
+
+
+@app.get("/health/pool")
+async def health_pool(_: models.User = Depends(users.get_app_admin)):
+    """Connection pool and auth cache counters (per worker process). Only for ADMIN_IDS: the counters describe
+    load and timing of the deployment."""
+    from .services.auth import auth_cache_stats
+    return {"pool": pool_status(), "auth_cache": auth_cache_stats()}
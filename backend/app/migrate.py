@@ -0,0 +1,113 @@
+"""Versioned schema migrations from backend/migrations/*.sql, serialized with a Postgres advisory lock.
+
+Run once per deploy (Railway preDeployCommand): python -m app.migrate
+Startup calls run_migrations() too; when nothing is pending that is one lock and one SELECT.
+
+Version 000_baseline is Base.metadata.create_all (creates missing tables on a fresh or old DB).
+Every later schema change ships as NNN_name.sql and must be idempotent (IF NOT EXISTS ...),
+because the baseline always reflects the current models.
+"""
+import argparse
+import asyncio
+import logging
+import re
+from pathlib import Path
+from typing import List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .database import engine, Base
+from . import models  # noqa: F401 - register models with Base
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+BASELINE_VERSION = "000_baseline"
+ADVISORY_LOCK_KEY = 4_716_530_190  # arbitrary, constant for this app
+_VERSION_RE = re.compile(r"^\d{3}_[a-z0-9_]+$")
+
+
+def migration_files() -> List[Tuple[str, Path]]:
+    """(version, path) for every NNN_name.sql in MIGRATIONS_DIR, in order."""
+    files = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        version = path.stem
+        if not _VERSION_RE.match(version):
+            raise ValueError(f"Bad migration file name: {path.name}")
+        files.append((version, path))
+    return files
+
+
+async def _applied_versions(raw) -> set:
+    await raw.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version TEXT PRIMARY KEY,"
+        " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    )
+    return {r["version"] for r in await raw.fetch("SELECT version FROM schema_migrations")}
+
+
+async def _apply_baseline(conn: AsyncConnection, raw) -> None:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.commit()
+    await raw.execute("INSERT INTO schema_migrations (version) VALUES ($1)", BASELINE_VERSION)
+
+
+async def _apply_file(raw, version: str, path: Path) -> None:
+    sql = path.read_text(encoding="utf-8")
+    # One simple-protocol message: all statements plus the bookkeeping row run in one implicit transaction.
+    await raw.execute(f"{sql}\n;\nINSERT INTO schema_migrations (version) VALUES ('{version}');")
+
+
+async def run_migrations() -> List[str]:
+    """Apply pending migrations under a session advisory lock. Returns versions applied by this call."""
+    applied_now: List[str] = []
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.execute(f"SELECT pg_advisory_lock({ADVISORY_LOCK_KEY})")
+        try:
+            applied = await _applied_versions(raw)
+            if BASELINE_VERSION not in applied:
+                await _apply_baseline(conn, raw)
+                applied_now.append(BASELINE_VERSION)
+            for version, path in migration_files():
+                if version in applied:
+                    continue
+                await _apply_file(raw, version, path)
+                applied_now.append(version)
+                logger.info("Migration applied: %s", version)
+        finally:
+            await raw.execute(f"SELECT pg_advisory_unlock({ADVISORY_LOCK_KEY})")
+    return applied_now
+
+
+async def pending_migrations() -> List[str]:
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        applied = await _applied_versions(raw)
+    versions = [BASELINE_VERSION] + [v for v, _ in migration_files()]
+    return [v for v in versions if v not in applied]
+
+
+async def _main(status_only: bool) -> None:
+    try:
+        if status_only:
+            pending = await pending_migrations()
+            print("pending:", ", ".join(pending) if pending else "none")
+        else:
+            applied = await run_migrations()
+            print("applied:", ", ".join(applied) if applied else "none (up to date)")
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database migrations from backend/migrations/.")
+    parser.add_argument("--status", action="store_true", help="only list pending migrations")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(_main(args.status))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 """SQLAlchemy models. No raw reserved column names (e.g. use event_extra instead of metadata)."""
 import uuid
 import enum
-from sqlalchemy import Column, String, Integer, Boolean, Date, DateTime, ForeignKey, UniqueConstraint, Enum as SQLEnum
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import (
+    Column, String, Integer, SmallInteger, BigInteger, Boolean, Date, DateTime, ForeignKey, UniqueConstraint, Index,
+    CheckConstraint, Computed, Enum as SQLEnum,
+)
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, text
 
 from .database import Base
 
@@ -41,6 +44,15 @@ class BabyEventType(str, enum.Enum):
     NOTE = "note"
 
 
+class XpSource(str, enum.Enum):
+    HABIT = "habit"  # habit reward for a counted completion
+    STREAK_BONUS = "streak_bonus"
+    WEEKLY_GOAL = "weekly_goal"  # times_per_week target reached
+    SHARED_HABIT = "shared_habit"  # family XP: every member completed a shared habit
+    LOG_REMOVED = "log_removed"  # negative; uncomplete takes XP out of periods, lifetime XP is never revoked
+    OPENING_BALANCE = "opening_balance"  # lifetime XP from before the ledger existed
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -51,7 +63,7 @@ class User(Base):
     role = Column(SQLEnum(UserRole), default=UserRole.PARTICIPANT, nullable=False)
     level = Column(Integer, default=1, nullable=False)
     total_xp = Column(Integer, default=0, nullable=False)
-    family_id = Column(UUID(as_uuid=True), ForeignKey("families.id"), nullable=True)
+    family_id = Column(UUID(as_uuid=True), ForeignKey("families.id"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     family = relationship("Family", back_populates="members")
@@ -68,6 +80,7 @@ class Family(Base):
     name = Column(String, nullable=True)
     level = Column(Integer, default=1, nullable=False)
     total_xp = Column(Integer, default=0, nullable=False)
+    data_version = Column(BigInteger, default=0, server_default=text("0"), nullable=False)  # bumped by every write
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     members = relationship("User", back_populates="family")
@@ -87,18 +100,23 @@ class Habit(Base):
     type = Column(SQLEnum(HabitType), nullable=False)
     schedule_type = Column(SQLEnum(ScheduleType), nullable=False)
     schedule_config = Column(JSONB, nullable=True)
+    # Weekdays the habit can be due on (bit 0 = Monday); see services.schedule.days_mask.
+    schedule_days_mask = Column(SmallInteger, nullable=False, server_default=text("127"))
     privacy = Column(SQLEnum(PrivacyType), nullable=False)
     xp_reward = Column(Integer, default=10, nullable=False)
     target_value = Column(JSONB, nullable=True)
     goal_effective_from = Column(Date, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     family = relationship("Family", back_populates="habits")
     owner = relationship("User", back_populates="owned_habits", foreign_keys=[owner_id])
     logs = relationship("HabitLog", back_populates="habit")
     streaks = relationship("Streak", back_populates="habit")
 
+    __table_args__ = (Index("ix_habits_family_active", "family_id", "is_active"),)
+
 
 class HabitLog(Base):
     __tablename__ = "habit_logs"
@@ -114,7 +132,10 @@ class HabitLog(Base):
     habit = relationship("Habit", back_populates="logs")
     user = relationship("User", back_populates="habit_logs")
 
-    __table_args__ = (UniqueConstraint("habit_id", "user_id", "date", name="unique_habit_user_date"),)
+    __table_args__ = (
+        UniqueConstraint("habit_id", "user_id", "date", name="unique_habit_user_date"),
+        Index("ix_habit_logs_user_habit_date_id", "user_id", "habit_id", "date", "id"),
+    )
 
 
 class BabyEvent(Base):
@@ -127,10 +148,17 @@ class BabyEvent(Base):
     event_extra = Column(JSONB, nullable=True)  # extra data, not reserved name "metadata"
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Full-text search (app.services.diary_search); computed by Postgres, not loaded with the event
+    content_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('russian', content)", persisted=True)))
 
     family = relationship("Family", back_populates="baby_events")
     created_by_user = relationship("User", back_populates="baby_events")
 
+    __table_args__ = (
+        Index("ix_baby_events_family_created_id", "family_id", "created_at", "id"),
+        Index("ix_baby_events_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
+
 
 class FamilyQuest(Base):
     __tablename__ = "family_quests"
@@ -147,6 +175,11 @@ class FamilyQuest(Base):
 
     family = relationship("Family", back_populates="quests")
 
+    __table_args__ = (
+        Index("ix_family_quests_active_family", "family_id", "end_date", postgresql_where=text("is_completed = false")),
+        Index("ix_family_quests_active_end", "end_date", postgresql_where=text("is_completed = false")),
+    )
+
 
 class Streak(Base):
     __tablename__ = "streaks"
@@ -162,3 +195,135 @@ class Streak(Base):
     user = relationship("User", back_populates="streaks")
 
     __table_args__ = (UniqueConstraint("habit_id", "user_id", name="unique_habit_user_streak"),)
+
+
+class StreakRun(Base):
+    """Maximal run of consecutive counted days for (habit, user). Streaks are derived from these."""
+    __tablename__ = "streak_runs"
+
+    habit_id = Column(UUID(as_uuid=True), ForeignKey("habits.id"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    start_date = Column(Date, primary_key=True)
+    end_date = Column(Date, nullable=False)
+
+    __table_args__ = (Index("ix_streak_runs_habit_user_end", "habit_id", "user_id", "end_date"),)
+
+
+class HabitWeekCounter(Base):
+    """Completions per ISO week (keyed by its Monday) for times_per_week habits, and whether weekly XP was given."""
+    __tablename__ = "habit_week_counters"
+
+    habit_id = Column(UUID(as_uuid=True), ForeignKey("habits.id"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    xp_awarded = Column(Boolean, default=False, nullable=False)
+
+
+class XpLedger(Base):
+    """Append-only record of every XP change, for a user or a family (exactly one of the two).
+    users/families.total_xp and the xp rollups below are projections of it (app.services.xp_ledger)."""
+    __tablename__ = "xp_ledger"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    family_id = Column(UUID(as_uuid=True), ForeignKey("families.id"), nullable=True)
+    source = Column(SQLEnum(XpSource), nullable=False)
+    amount = Column(Integer, nullable=False)
+    occurred_on = Column(Date, nullable=False)
+    habit_id = Column(UUID(as_uuid=True), nullable=True)  # no FKs: ledger rows outlive habits and logs
+    habit_log_id = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        CheckConstraint("num_nonnulls(user_id, family_id) = 1", name="ck_xp_ledger_owner"),
+        Index("ix_xp_ledger_user", "user_id", "occurred_on", postgresql_where=text("user_id IS NOT NULL")),
+        Index("ix_xp_ledger_family", "family_id", "occurred_on", postgresql_where=text("family_id IS NOT NULL")),
+    )
+
+
+class UserXpDaily(Base):
+    """A user's period XP per day of occurrence (ledger rollup, without opening balances)."""
+    __tablename__ = "user_xp_daily"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    xp = Column(Integer, default=0, server_default=text("0"), nullable=False)
+
+
+class UserXpWeekly(Base):
+    """A user's period XP per ISO week (Monday)."""
+    __tablename__ = "user_xp_weekly"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    xp = Column(Integer, default=0, server_default=text("0"), nullable=False)
+
+
+class FamilyXpDaily(Base):
+    """Family XP (shared habits) per day of occurrence."""
+    __tablename__ = "family_xp_daily"
+
+    family_id = Column(UUID(as_uuid=True), ForeignKey("families.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    xp = Column(Integer, default=0, server_default=text("0"), nullable=False)
+
+
+class FamilyXpWeekly(Base):
+    """Family XP per ISO week (Monday)."""
+    __tablename__ = "family_xp_weekly"
+
+    family_id = Column(UUID(as_uuid=True), ForeignKey("families.id"), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    xp = Column(Integer, default=0, server_default=text("0"), nullable=False)
+
+
+class IdempotencyKey(Base):
+    """Stored response for a client-supplied Idempotency-Key (retries get the same answer)."""
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    endpoint = Column(String, nullable=False)
+    response = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class NotificationOutbox(Base):
+    """Telegram message waiting for the background dispatcher (written in the business transaction)."""
+    __tablename__ = "notification_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, server_default=func.gen_random_uuid())
+    chat_id = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    attempts = Column(Integer, default=0, server_default=text("0"), nullable=False)
+    send_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_notification_outbox_pending", "send_after", postgresql_where=text("sent_at IS NULL")),
+    )
+
+
+class AiSummary(Base):
+    """Cached AI day summary; content_hash covers the model and the exact prompt, so edited days miss the cache."""
+    __tablename__ = "ai_summaries"
+
+    family_id = Column(UUID(as_uuid=True), ForeignKey("families.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    content_hash = Column(String(64), primary_key=True)
+    summary = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DiaryBackup(Base):
+    """Last diary file uploaded to GitHub for a family's day; blob_sha is the git blob id of its content."""
+    __tablename__ = "diary_backups"
+
+    family_id = Column(UUID(as_uuid=True), ForeignKey("families.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    blob_sha = Column(String(40), nullable=False)
+    commit_sha = Column(String(40), nullable=True)
+    backed_up_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,23 +1,28 @@
 """Baby diary events. event_extra in schema matches model."""
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..config import get_settings
 from ..database import get_db
 from ..models import User, BabyEvent, BabyEventType
-from ..schemas import BabyEventCreate, BabyEventUpdate, BabyEventResponse
+from ..schemas import BabyEventCreate, BabyEventUpdate, BabyEventResponse, BabyEventSearchResult
 from ..routers.users import get_current_user
+from ..services.data_version import bump_family_version, not_modified
+from ..services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_size
+from ..services.diary_search import search_events
 
 router = APIRouter(prefix="/api/baby", tags=["baby"])
 
 
-def _get_events_query(db: Session, family_id: UUID, start: date, end: date):
+def _get_events_query(family_id: UUID, start: date, end: date):
     start_dt = datetime.combine(start, datetime.min.time())
     end_dt = datetime.combine(end, datetime.max.time())
     return (
-        db.query(BabyEvent)
-        .filter(
+        select(BabyEvent)
+        .where(
             BabyEvent.family_id == family_id,
             BabyEvent.created_at >= start_dt,
             BabyEvent.created_at <= end_dt,
@@ -28,26 +33,69 @@ def _get_events_query(db: Session, family_id: UUID, start: date, end: date):
 
 @router.get("/events", response_model=list[BabyEventResponse])
 async def get_events(
+    request: Request,
+    response: Response,
     start: date | None = Query(None),
     end: date | None = Query(None),
+    cursor: str | None = Query(None),
+    limit: int | None = Query(None, ge=1),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
+    """Newest first, one page at a time (BABY_EVENTS_PAGE_SIZE or ?limit=). If older events remain, the
+    X-Next-Cursor header holds the cursor for the next page. start/end optionally bound the range by day."""
     if not current_user.family_id:
         return []
-    if not start:
-        start = date.today() - timedelta(days=30)
-    if not end:
-        end = date.today()
-    events = _get_events_query(db, current_user.family_id, start, end).all()
+    if (cached := await not_modified(request, response, current_user, db)) is not None:
+        return cached
+    size = page_size(limit, get_settings().BABY_EVENTS_PAGE_SIZE)
+    query = select(BabyEvent).where(BabyEvent.family_id == current_user.family_id)
+    if start:
+        query = query.where(BabyEvent.created_at >= datetime.combine(start, datetime.min.time()))
+    if end:
+        query = query.where(BabyEvent.created_at <= datetime.combine(end, datetime.max.time()))
+    if cursor:
+        try:
+            after = decode_cursor(cursor, datetime)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(BabyEvent.created_at, BabyEvent.id) < after)
+    events = (
+        await db.scalars(query.order_by(BabyEvent.created_at.desc(), BabyEvent.id.desc()).limit(size + 1))
+    ).all()
+    if len(events) > size:
+        events = events[:size]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(events[-1].created_at, events[-1].id)
     return [BabyEventResponse.model_validate(e) for e in events]
 
 
+@router.get("/search", response_model=list[BabyEventSearchResult])
+async def search_diary(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    event_type: BabyEventType | None = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Diary entries matching q (words, "phrases", OR, -word), best match first, with highlighted snippets."""
+    if not current_user.family_id:
+        return []
+    if (cached := await not_modified(request, response, current_user, db)) is not None:
+        return cached
+    results = await search_events(db, current_user.family_id, q, event_type, limit)
+    return [
+        BabyEventSearchResult(**BabyEventResponse.model_validate(e).model_dump(), rank=rank, snippet=snippet)
+        for e, rank, snippet in results
+    ]
+
+
 @router.post("/events", response_model=BabyEventResponse)
 async def create_event(
     data: BabyEventCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if not current_user.family_id:
         raise HTTPException(status_code=400, detail="User must belong to a family")
@@ -59,8 +107,9 @@ async def create_event(
         created_by=current_user.id,
     )
     db.add(event)
-    db.commit()
-    db.refresh(event)
+    await bump_family_version(db, current_user.family_id)
+    await db.commit()
+    await db.refresh(event)
     return BabyEventResponse.model_validate(event)
 
 
@@ -69,15 +118,16 @@ async def update_event(
     event_id: UUID,
     data: BabyEventUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    event = db.query(BabyEvent).filter(BabyEvent.id == event_id).first()
+    event = await db.get(BabyEvent, event_id)
     if not event or event.family_id != current_user.family_id:
         raise HTTPException(status_code=404, detail="Event not found")
     for k, v in data.model_dump(exclude_unset=True).items():
         setattr(event, k, v)
-    db.commit()
-    db.refresh(event)
+    await bump_family_version(db, event.family_id)
+    await db.commit()
+    await db.refresh(event)
     return BabyEventResponse.model_validate(event)
 
 
@@ -85,13 +135,14 @@ async def update_event(
 async def delete_event(
     event_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    event = db.query(BabyEvent).filter(BabyEvent.id == event_id).first()
+    event = await db.get(BabyEvent, event_id)
     if not event or event.family_id != current_user.family_id:
         raise HTTPException(status_code=404, detail="Event not found")
-    db.delete(event)
-    db.commit()
+    await db.delete(event)
+    await bump_family_version(db, event.family_id)
+    await db.commit()
     return {"ok": True}
 
 
@@ -99,12 +150,12 @@ async def delete_event(
 async def get_summary(
     day: date,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Optional AI summary. Returns simple concatenation if no OPENROUTER_API_KEY."""
     if not current_user.family_id:
         return {"summary": "", "date": str(day)}
-    events = _get_events_query(db, current_user.family_id, day, day).all()
+    events = (await db.scalars(_get_events_query(current_user.family_id, day, day))).all()
     from ..services.ai_service import summarize_events
-    summary = summarize_events(events, day)
+    summary = await summarize_events(events, day, current_user.family_id, db)
     return {"summary": summary, "date": str(day)}
@@ -0,0 +1,90 @@
+"""Main screen in one request: today's habits with the user's log, streaks, weekly progress and the family quest."""
+from datetime import date
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_db
+from ..models import User, Habit, HabitLog, Streak, PrivacyType, HabitType
+from ..schemas import DashboardTodayResponse, DashboardHabit, HabitResponse, HabitLogResponse, FamilyQuestResponse
+from ..routers.users import get_current_user
+from ..services.xp_service import calculate_xp_for_next_level, get_effective_weekly_target
+from ..services.schedule import is_scheduled_on, scheduled_on_clause
+from ..services.quest_service import ensure_active_quest
+from ..services.week_counters import get_week_counts
+
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
+
+
+@router.get("/today", response_model=DashboardTodayResponse)
+async def get_today_dashboard(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """A fixed number of queries regardless of habit count: habits, today's logs, streaks, week counters
+    (times_per_week habits only), active quest."""
+    today = date.today()
+    out = DashboardTodayResponse(
+        date=today,
+        level=current_user.level,
+        total_xp=current_user.total_xp,
+        xp_for_next_level=calculate_xp_for_next_level(current_user.level, current_user.total_xp),
+    )
+    if not current_user.family_id:
+        return out
+
+    habits = (
+        await db.scalars(
+            select(Habit)
+            .where(Habit.family_id == current_user.family_id, Habit.is_active == True, scheduled_on_clause(today))
+            .order_by(Habit.created_at)
+        )
+    ).all()
+    habits = [
+        h for h in habits
+        if (h.privacy != PrivacyType.PERSONAL or h.owner_id == current_user.id) and is_scheduled_on(h, today)
+    ]
+    if habits:
+        habit_ids = [h.id for h in habits]
+        today_logs = {
+            l.habit_id: l
+            for l in (
+                await db.scalars(
+                    select(HabitLog).where(
+                        HabitLog.user_id == current_user.id, HabitLog.habit_id.in_(habit_ids), HabitLog.date == today
+                    )
+                )
+            ).all()
+        }
+        # Same counters as /api/habits/{id}/stats.
+        weekly = [h.id for h in habits if h.type == HabitType.TIMES_PER_WEEK]
+        week_counts = await get_week_counts(weekly, current_user.id, today, db) if weekly else {}
+        streaks = {
+            s.habit_id: s
+            for s in (
+                await db.scalars(select(Streak).where(Streak.user_id == current_user.id, Streak.habit_id.in_(habit_ids)))
+            ).all()
+        }
+        for h in habits:
+            weekly_target = None
+            if h.type == HabitType.TIMES_PER_WEEK:
+                weekly_target = get_effective_weekly_target(h, current_user.id, today)
+            log = today_logs.get(h.id)
+            streak = streaks.get(h.id)
+            out.habits.append(
+                DashboardHabit(
+                    habit=HabitResponse.model_validate(h),
+                    today_log=HabitLogResponse.model_validate(log) if log else None,
+                    current_streak=streak.current_streak if streak else 0,
+                    longest_streak=streak.longest_streak if streak else 0,
+                    weekly_done=week_counts.get(h.id, 0) if weekly_target is not None else None,
+                    weekly_target=weekly_target,
+                )
+            )
+
+    quest, created = await ensure_active_quest(db, current_user.family_id)
+    if created:
+        await db.commit()
+    if quest:
+        out.family_quest = FamilyQuestResponse.model_validate(quest)
+    return out
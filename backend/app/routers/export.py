@@ -1,12 +1,14 @@
 """Export diary to Markdown / GitHub backup."""
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
-from ..models import User, BabyEvent
+from ..models import User
 from ..routers.users import get_current_user
-from ..services.github_service import generate_markdown, commit_to_github
+from ..services.diary_backup import sync_diary
+from ..services.diary_export import FORMATS, stream_export, stream_markdown_json
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
@@ -16,54 +18,59 @@ async def export_diary(
     start: date | None = None,
     end: date | None = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
 ):
-    """Return Markdown diary for date range."""
+    """Return Markdown diary for date range, as {"markdown", "start", "end"}. Streamed like /diary/download,
+    which new clients should use (it also offers ndjson and csv)."""
     if not current_user.family_id:
         return {"markdown": "# Нет данных\n", "start": None, "end": None}
     if not start:
         start = date.today() - timedelta(days=30)
     if not end:
         end = date.today()
-    start_dt = datetime.combine(start, datetime.min.time())
-    end_dt = datetime.combine(end, datetime.max.time())
-    events = (
-        db.query(BabyEvent)
-        .filter(
-            BabyEvent.family_id == current_user.family_id,
-            BabyEvent.created_at >= start_dt,
-            BabyEvent.created_at <= end_dt,
-        )
-        .order_by(BabyEvent.created_at.desc())
-        .all()
+    return StreamingResponse(
+        stream_markdown_json(current_user.family_id, start, end), media_type="application/json"
+    )
+
+
+@router.get("/diary/download")
+async def download_diary(
+    start: date | None = None,
+    end: date | None = None,
+    format: str = "markdown",
+    current_user: User = Depends(get_current_user),
+):
+    """Stream the diary as a file (markdown, ndjson or csv), read from the DB in batches; any range size."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+    if not current_user.family_id:
+        raise HTTPException(status_code=400, detail="No family")
+    if not start:
+        start = date.today() - timedelta(days=30)
+    if not end:
+        end = date.today()
+    media_type, ext = FORMATS[format]
+    return StreamingResponse(
+        stream_export(current_user.family_id, start, end, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="diary_{start}_{end}.{ext}"'},
     )
-    markdown = generate_markdown(events, start, end)
-    return {"markdown": markdown, "start": str(start), "end": str(end)}
 
 
 @router.post("/diary/backup")
 async def backup_diary_to_github(
     day: date | None = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Push today's (or given day's) diary to GitHub. Optional feature."""
+    """Push today's (or given day's) diary to GitHub if it changed since the last backup. Optional feature."""
     if not current_user.family_id:
         raise HTTPException(status_code=400, detail="No family")
     target = day or date.today()
-    start_dt = datetime.combine(target, datetime.min.time())
-    end_dt = datetime.combine(target, datetime.max.time())
-    events = (
-        db.query(BabyEvent)
-        .filter(
-            BabyEvent.family_id == current_user.family_id,
-            BabyEvent.created_at >= start_dt,
-            BabyEvent.created_at <= end_dt,
-        )
-        .all()
-    )
     try:
-        result = await commit_to_github(events, target)
-        return {"ok": True, "sha": result.get("sha")}
+        summary = await sync_diary(db, target, target, current_user.family_id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if summary.failed:
+        raise HTTPException(status_code=400, detail=next(iter(summary.failed.values())))
+    await db.commit()
+    return {"ok": True, "sha": summary.commits[-1] if summary.commits else None, "unchanged": summary.unchanged > 0}
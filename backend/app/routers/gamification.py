@@ -1,57 +1,32 @@
 """Gamification: stats, family quest, leaderboard."""
-from datetime import date, timedelta
-from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
 from ..models import User, Family, FamilyQuest, HabitLog
 from ..schemas import FamilyQuestCreate, FamilyQuestResponse, FamilyStatsResponse, StatsResponse, LeaderboardEntry
 from ..routers.users import get_current_user
 from ..services.xp_service import get_user_stats, get_family_stats, calculate_xp_for_next_level
+from ..services.xp_rollups import PERIODS, family_leaderboard
+from ..services.data_version import bump_family_version, not_modified
+from ..services.quest_service import ensure_active_quest
 from ..telegram.bot import notify_family_quest_completed
 
 router = APIRouter(prefix="/api/gamification", tags=["gamification"])
 
 
-def _ensure_active_quest(db: Session, family_id: UUID) -> FamilyQuest | None:
-    """Если у семьи нет активного квеста — создаём стартовый."""
-    quest = (
-        db.query(FamilyQuest)
-        .filter(
-            FamilyQuest.family_id == family_id,
-            FamilyQuest.is_completed == False,
-            FamilyQuest.end_date >= date.today(),
-        )
-        .first()
-    )
-    if quest:
-        return quest
-    start = date.today()
-    end = start + timedelta(days=7)
-    new_quest = FamilyQuest(
-        family_id=family_id,
-        name="Первый квест",
-        target_xp=100,
-        start_date=start,
-        end_date=end,
-    )
-    db.add(new_quest)
-    db.commit()
-    db.refresh(new_quest)
-    return new_quest
-
-
 @router.get("/stats", response_model=StatsResponse)
 async def get_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    stats = get_user_stats(current_user, db)
+    stats = await get_user_stats(current_user, db)
     quest = None
     if current_user.family_id:
-        quest = _ensure_active_quest(db, current_user.family_id)
+        quest, created = await ensure_active_quest(db, current_user.family_id)
+        if created:
+            await db.commit()
     family_quest_progress = None
     if quest:
         family_quest_progress = {
@@ -73,11 +48,13 @@ async def get_stats(
 @router.get("/family-quest", response_model=FamilyQuestResponse | None)
 async def get_family_quest(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if not current_user.family_id:
         return None
-    quest = _ensure_active_quest(db, current_user.family_id)
+    quest, created = await ensure_active_quest(db, current_user.family_id)
+    if created:
+        await db.commit()
     return FamilyQuestResponse.model_validate(quest) if quest else None
 
 
@@ -85,7 +62,7 @@ async def get_family_quest(
 async def create_family_quest(
     data: FamilyQuestCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if not current_user.family_id:
         raise HTTPException(status_code=400, detail="User must belong to a family")
@@ -97,24 +74,28 @@ async def create_family_quest(
         end_date=data.end_date,
     )
     db.add(quest)
-    db.commit()
-    db.refresh(quest)
+    await bump_family_version(db, current_user.family_id)
+    await db.commit()
+    await db.refresh(quest)
     return FamilyQuestResponse.model_validate(quest)
 
 
 @router.get("/leaderboard", response_model=list[LeaderboardEntry])
 async def get_leaderboard(
+    request: Request,
+    response: Response,
+    period: str = "all",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
+    """Family ranking by XP for period=week (since Monday), month (since the 1st) or all (lifetime)."""
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of: {', '.join(PERIODS)}")
     if not current_user.family_id:
         return []
-    members = (
-        db.query(User)
-        .filter(User.family_id == current_user.family_id)
-        .order_by(User.total_xp.desc())
-        .all()
-    )
+    if (cached := await not_modified(request, response, current_user, db)) is not None:
+        return cached
+    ranking = await family_leaderboard(current_user.family_id, period, db)
     return [
         LeaderboardEntry(
             user_id=m.id,
@@ -122,19 +103,20 @@ async def get_leaderboard(
             first_name=m.first_name,
             level=m.level,
             total_xp=m.total_xp,
+            period_xp=xp,
         )
-        for m in members
+        for m, xp in ranking
     ]
 
 
 @router.get("/family-stats", response_model=FamilyStatsResponse)
 async def get_family_stats_route(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if not current_user.family_id:
         raise HTTPException(status_code=400, detail="No family")
-    family = db.query(Family).filter(Family.id == current_user.family_id).first()
+    family = await db.get(Family, current_user.family_id)
     if not family:
         raise HTTPException(status_code=404, detail="Family not found")
     return FamilyStatsResponse(**get_family_stats(family, db))
@@ -1,24 +1,41 @@
 """Habit endpoints. Use ScheduleType/PrivacyType enums, not strings."""
-from datetime import date, datetime, timedelta
+import base64
+import uuid
+from datetime import date, timedelta
+from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, func, literal, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..config import get_settings
 from ..database import get_db
-from ..models import User, Habit, HabitLog, Streak, PrivacyType, ScheduleType, UserRole, HabitType
-from ..schemas import HabitCreate, HabitUpdate, HabitResponse, HabitLogResponse, HabitCompleteBody, HabitStatsResponse
+from ..models import User, Habit, HabitLog, Streak, PrivacyType, UserRole, HabitType, XpSource
+from ..schemas import (
+    HabitCreate, HabitUpdate, HabitResponse, HabitLogResponse, HabitCompleteBody, HabitStatsResponse,
+    HabitHeatmap, HeatmapResponse, HabitBatchCompleteBody, HabitBatchResult,
+)
 from ..routers.users import get_current_user
 from ..services.xp_service import (
     check_all_adults_completed_shared_habit,
-    update_family_xp,
-    update_user_xp,
-    update_streak,
+    streak_bonus,
     habit_completion_counts,
-    recalc_streak,
     get_effective_weekly_target,
 )
-from ..models import Family
-from ..telegram.bot import notify_level_up
+from ..services.streak_service import add_streak_day, add_streak_days, remove_streak_day, sync_streak_from_runs
+from ..services.week_counters import (
+    increment_week_counter, decrement_week_counter, claim_week_xp, get_week_count, week_start_of,
+)
+from ..services.idempotency import get_stored_response, store_response
+from ..services.data_version import bump_family_version, not_modified
+from ..services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_size
+from ..services.quest_service import add_quest_xp, remove_quest_xp
+from ..services.xp_ledger import XpEntry, award_family_xp, award_user_xp, remove_log_xp
+from ..services.schedule import days_mask, is_scheduled_on, scheduled_on_clause, schedule_for
+from ..telegram.bot import notify_level_up, notify_family_quest_completed
 
 router = APIRouter(prefix="/api/habits", tags=["habits"])
 
@@ -31,54 +48,44 @@ def _check_habit_access(habit: Habit, user: User) -> bool:
     return False
 
 
-def _habit_scheduled_today(habit: Habit, today: date) -> bool:
-    if habit.schedule_type == ScheduleType.DAILY:
-        return True
-    if habit.schedule_type == ScheduleType.WEEKLY:
-        weekday = today.weekday()
-        config = habit.schedule_config or {}
-        days = config.get("days", [])
-        return weekday in days
-    if habit.schedule_type == ScheduleType.WEEKLY_TARGET:
-        return True
-    if habit.schedule_type == ScheduleType.CUSTOM:
-        config = habit.schedule_config or {}
-        interval = config.get("interval", 1)
-        start_str = config.get("start_date", today.isoformat())
-        try:
-            start_date = datetime.fromisoformat(start_str).date()
-        except (TypeError, ValueError):
-            start_date = today
-        return (today - start_date).days % interval == 0
-    return False
-
-
 @router.get("", response_model=list[HabitResponse])
 async def get_habits(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     include_inactive: bool = False,
 ):
-    q = db.query(Habit).filter(Habit.family_id == current_user.family_id)
+    if (cached := await not_modified(request, response, current_user, db)) is not None:
+        return cached
+    q = select(Habit).where(Habit.family_id == current_user.family_id)
     if not include_inactive:
-        q = q.filter(Habit.is_active == True)
-    habits = q.all()
+        q = q.where(Habit.is_active == True)
+    habits = (await db.scalars(q)).all()
     accessible = [h for h in habits if h.privacy != PrivacyType.PERSONAL or h.owner_id == current_user.id]
     return [HabitResponse.model_validate(h) for h in accessible]
 
 
 @router.get("/today", response_model=list[HabitResponse])
 async def get_today_habits(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
+    if (cached := await not_modified(request, response, current_user, db)) is not None:
+        return cached
     today = date.today()
     habits = (
-        db.query(Habit)
-        .filter(Habit.family_id == current_user.family_id, Habit.is_active == True)
-        .all()
-    )
-    today_habits = [h for h in habits if _habit_scheduled_today(h, today)]
+        await db.scalars(
+            select(Habit).where(
+                Habit.family_id == current_user.family_id,
+                Habit.is_active == True,
+                scheduled_on_clause(today),
+            )
+        )
+    ).all()
+    today_habits = [h for h in habits if is_scheduled_on(h, today)]
     accessible = [h for h in today_habits if h.privacy != PrivacyType.PERSONAL or h.owner_id == current_user.id]
     return [HabitResponse.model_validate(h) for h in accessible]
 
@@ -87,7 +94,7 @@ async def get_today_habits(
 async def create_habit(
     data: HabitCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if not current_user.family_id:
         raise HTTPException(status_code=400, detail="User must belong to a family")
@@ -96,11 +103,13 @@ async def create_habit(
     habit = Habit(
         family_id=current_user.family_id,
         owner_id=current_user.id,
+        schedule_days_mask=days_mask(data.schedule_type, data.schedule_config),
         **data.model_dump(),
     )
     db.add(habit)
-    db.commit()
-    db.refresh(habit)
+    await bump_family_version(db, current_user.family_id)
+    await db.commit()
+    await db.refresh(habit)
     return HabitResponse.model_validate(habit)
 
 
@@ -109,259 +118,543 @@ async def update_habit(
     habit_id: UUID,
     data: HabitUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
+    habit = await db.get(Habit, habit_id)
     if not habit or not _check_habit_access(habit, current_user):
         raise HTTPException(status_code=404, detail="Habit not found")
     if data.privacy is not None and data.privacy == PrivacyType.SHARED and current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Only family admin can set habit to shared")
     for k, v in data.model_dump(exclude_unset=True).items():
         setattr(habit, k, v)
-    db.commit()
-    db.refresh(habit)
+    habit.schedule_days_mask = days_mask(habit.schedule_type, habit.schedule_config)
+    await bump_family_version(db, habit.family_id)
+    await db.commit()
+    await db.refresh(habit)
     return HabitResponse.model_validate(habit)
 
 
 @router.get("/{habit_id}/logs", response_model=list[HabitLogResponse])
 async def get_habit_logs(
     habit_id: UUID,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     from_date: date | None = None,
     to_date: date | None = None,
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1),
 ):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
+    """Oldest first, one page at a time (HABIT_LOGS_PAGE_SIZE or ?limit=); X-Next-Cursor continues the range."""
+    habit = await db.get(Habit, habit_id)
     if not habit or not _check_habit_access(habit, current_user):
         raise HTTPException(status_code=404, detail="Habit not found")
     today = date.today()
     from_d = from_date or (today - timedelta(days=14))
     to_d = to_date or (today + timedelta(days=7))
-    logs = (
-        db.query(HabitLog)
-        .filter(
-            HabitLog.habit_id == habit_id,
+    size = page_size(limit, get_settings().HABIT_LOGS_PAGE_SIZE)
+    query = select(HabitLog).where(
+        HabitLog.user_id == current_user.id,
+        HabitLog.habit_id == habit_id,
+        HabitLog.date >= from_d,
+        HabitLog.date <= to_d,
+    )
+    if cursor:
+        try:
+            after = decode_cursor(cursor, date)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(HabitLog.date, HabitLog.id) > after)
+    logs = (await db.scalars(query.order_by(HabitLog.date, HabitLog.id).limit(size + 1))).all()
+    if len(logs) > size:
+        logs = logs[:size]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(logs[-1].date, logs[-1].id)
+    return [HabitLogResponse.model_validate(l) for l in logs]
+
+
+def _build_stats(
+    habit: Habit,
+    user_id: UUID,
+    streak: Streak | None,
+    weekly_done: int | None,
+    logs_month: int,
+    today: date,
+) -> HabitStatsResponse:
+    """Shared by the per-habit and bulk stats endpoints so both report the same numbers."""
+    weekly_target = None
+    percent_week = None
+    if habit.type == HabitType.TIMES_PER_WEEK:
+        weekly_target = get_effective_weekly_target(habit, user_id, today)
+        if weekly_target is not None:
+            weekly_done = weekly_done or 0
+            percent_week = (weekly_done / weekly_target * 100) if weekly_target else None
+    if weekly_target is None:
+        weekly_done = None
+    month_start = today.replace(day=1)
+    if habit.type == HabitType.TIMES_PER_WEEK and weekly_target:
+        expected_month = max(1, weekly_target * 4)
+        percent_month = (logs_month / expected_month * 100) if expected_month else None
+    else:
+        expected_month = schedule_for(habit).occurrences_in_range(month_start, today)
+        percent_month = (logs_month / expected_month * 100) if expected_month else None
+    return HabitStatsResponse(
+        habit_id=habit.id,
+        current_streak=streak.current_streak if streak else 0,
+        longest_streak=streak.longest_streak if streak else 0,
+        weekly_done=weekly_done,
+        weekly_target=weekly_target,
+        percent_week=percent_week,
+        percent_month=percent_month,
+    )
+
+
+@router.get("/stats", response_model=list[HabitStatsResponse])
+async def get_all_habit_stats(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stats for every accessible active habit: one habits query, one streaks query, one grouped count query."""
+    habits = (
+        await db.scalars(
+            select(Habit).where(Habit.family_id == current_user.family_id, Habit.is_active == True)
+        )
+    ).all()
+    habits = [h for h in habits if h.privacy != PrivacyType.PERSONAL or h.owner_id == current_user.id]
+    if not habits:
+        return []
+    habit_ids = [h.id for h in habits]
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    month_start = today.replace(day=1)
+
+    streaks = {
+        s.habit_id: s
+        for s in (
+            await db.scalars(select(Streak).where(Streak.user_id == current_user.id, Streak.habit_id.in_(habit_ids)))
+        ).all()
+    }
+    counts = {
+        habit_id: (week_count, month_count)
+        for habit_id, week_count, month_count in (
+            await db.execute(
+                select(
+                    HabitLog.habit_id,
+                    func.count().filter(HabitLog.date.between(week_start, week_end)),
+                    func.count().filter(HabitLog.date >= month_start),
+                )
+                .where(
+                    HabitLog.user_id == current_user.id,
+                    HabitLog.habit_id.in_(habit_ids),
+                    HabitLog.date >= min(week_start, month_start),
+                )
+                .group_by(HabitLog.habit_id)
+            )
+        ).all()
+    }
+    return [
+        _build_stats(h, current_user.id, streaks.get(h.id), *counts.get(h.id, (0, 0)), today)
+        for h in habits
+    ]
+
+
+@router.get("/heatmap", response_model=HeatmapResponse)
+async def get_heatmap(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    year: int | None = None,
+):
+    """Completed days of the year per accessible habit, one bitset each (see HabitHeatmap.bits). Two queries."""
+    if year is None:
+        year = date.today().year
+    if not 1 <= year <= 9999:
+        raise HTTPException(status_code=400, detail="Invalid year")
+    jan1 = date(year, 1, 1)
+    days = (date(year, 12, 31) - jan1).days + 1
+    habits = (
+        await db.scalars(
+            select(Habit).where(Habit.family_id == current_user.family_id, Habit.is_active == True)
+        )
+    ).all()
+    habits = {h.id: h for h in habits if h.privacy != PrivacyType.PERSONAL or h.owner_id == current_user.id}
+    if not habits:
+        return HeatmapResponse(year=year, days=days)
+    bits = dict.fromkeys(habits, 0)
+    # date - date is an integer day count in Postgres, so the day index comes straight from SQL.
+    rows = await db.execute(
+        select(HabitLog.habit_id, HabitLog.date, HabitLog.date - jan1, HabitLog.value).where(
             HabitLog.user_id == current_user.id,
-            HabitLog.date >= from_d,
-            HabitLog.date <= to_d,
+            HabitLog.habit_id.in_(list(habits)),
+            HabitLog.date.between(jan1, date(year, 12, 31)),
         )
-        .order_by(HabitLog.date)
-        .all()
     )
-    return [HabitLogResponse.model_validate(l) for l in logs]
+    for habit_id, log_date, day, value in rows:
+        if habit_completion_counts(habits[habit_id], value, log_date, current_user.id, db):
+            bits[habit_id] |= 1 << day
+    size = (days + 7) // 8
+    return HeatmapResponse(
+        year=year,
+        days=days,
+        habits=[
+            HabitHeatmap(
+                habit_id=habit_id,
+                completed=b.bit_count(),
+                bits=base64.b64encode(b.to_bytes(size, "little")).decode("ascii"),
+            )
+            for habit_id, b in bits.items()
+        ],
+    )
 
 
 @router.get("/{habit_id}/stats", response_model=HabitStatsResponse)
 async def get_habit_stats(
     habit_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
+    habit = await db.get(Habit, habit_id)
     if not habit or not _check_habit_access(habit, current_user):
         raise HTTPException(status_code=404, detail="Habit not found")
 
-    streak = db.query(Streak).filter(Streak.habit_id == habit_id, Streak.user_id == current_user.id).first()
-    current_streak = streak.current_streak if streak else 0
-    longest_streak = streak.longest_streak if streak else 0
-
-    weekly_done = None
-    weekly_target = None
-    percent_week = None
-    percent_month = None
+    streak = await db.scalar(select(Streak).where(Streak.habit_id == habit_id, Streak.user_id == current_user.id))
     today = date.today()
+    weekly_done = None
     if habit.type == HabitType.TIMES_PER_WEEK:
-        weekly_target = get_effective_weekly_target(habit, current_user.id, today)
-        if weekly_target is not None:
-            week_start = today - timedelta(days=today.weekday())
-            week_end = week_start + timedelta(days=6)
-            weekly_done = (
-                db.query(HabitLog)
-                .filter(
-                    HabitLog.habit_id == habit_id,
-                    HabitLog.user_id == current_user.id,
-                    HabitLog.date >= week_start,
-                    HabitLog.date <= week_end,
-                )
-                .count()
-            )
-            percent_week = (weekly_done / weekly_target * 100) if weekly_target else None
-    week_start = today - timedelta(days=today.weekday())
+        weekly_done = await get_week_count(habit_id, current_user.id, today, db)
     month_start = today.replace(day=1)
-    logs_week = (
-        db.query(HabitLog)
-        .filter(
-            HabitLog.habit_id == habit_id,
-            HabitLog.user_id == current_user.id,
-            HabitLog.date >= week_start,
-        )
-        .count()
-    )
-    logs_month = (
-        db.query(HabitLog)
-        .filter(
+    logs_month = await db.scalar(
+        select(func.count())
+        .select_from(HabitLog)
+        .where(
             HabitLog.habit_id == habit_id,
             HabitLog.user_id == current_user.id,
             HabitLog.date >= month_start,
         )
-        .count()
-    )
-    if habit.type == HabitType.TIMES_PER_WEEK and weekly_target:
-        days_in_month = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        expected_month = max(1, weekly_target * 4)
-        percent_month = (logs_month / expected_month * 100) if expected_month else None
-    else:
-        days_so_far = (today - month_start).days + 1
-        percent_month = (logs_month / days_so_far * 100) if days_so_far else None
-
-    return HabitStatsResponse(
-        current_streak=current_streak,
-        longest_streak=longest_streak,
-        weekly_done=weekly_done,
-        weekly_target=weekly_target,
-        percent_week=percent_week,
-        percent_month=percent_month,
     )
+    return _build_stats(habit, current_user.id, streak, weekly_done, logs_month, today)
 
 
 @router.delete("/{habit_id}")
 async def delete_habit(
     habit_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
+    habit = await db.get(Habit, habit_id)
     if not habit or not _check_habit_access(habit, current_user):
         raise HTTPException(status_code=404, detail="Habit not found")
     habit.is_active = False
-    db.commit()
+    await bump_family_version(db, habit.family_id)
+    await db.commit()
     return {"ok": True}
 
 
+async def _insert_log_or_get_existing(
+    db: AsyncSession, habit_id: UUID, user_id: UUID, day: date, value
+) -> tuple[HabitLog, bool]:
+    """
+    INSERT ... ON CONFLICT DO NOTHING on (habit, user, date); the same statement falls back to the
+    existing row, so a duplicate tap costs one round trip. Returns (log, inserted).
+    """
+    table = HabitLog.__table__
+    ins = (
+        pg_insert(table)
+        .values(id=uuid.uuid4(), habit_id=habit_id, user_id=user_id, date=day, value=value, xp_earned=0)
+        .on_conflict_do_nothing(constraint="unique_habit_user_date")
+        .returning(*table.c, literal(True).label("inserted"))
+        .cte("ins")
+    )
+    existing = select(*table.c, literal(False).label("inserted")).where(
+        table.c.habit_id == habit_id,
+        table.c.user_id == user_id,
+        table.c.date == day,
+        ~select(ins.c.id).exists(),
+    )
+    rows = union_all(select(*ins.c), existing).subquery()
+    log_alias = aliased(HabitLog, rows)
+    row = (await db.execute(select(log_alias, rows.c.inserted))).first()
+    if row is None:
+        # Conflicting insert committed after this statement's snapshot was taken.
+        log = await db.scalar(
+            select(HabitLog).where(HabitLog.habit_id == habit_id, HabitLog.user_id == user_id, HabitLog.date == day)
+        )
+        return log, False
+    return row[0], row[1]
+
+
 @router.post("/{habit_id}/complete", response_model=HabitLogResponse)
 async def complete_habit(
     habit_id: UUID,
     body: HabitCompleteBody,
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
+    habit = await db.get(Habit, habit_id)
     if not habit or not _check_habit_access(habit, current_user):
         raise HTTPException(status_code=404, detail="Habit not found")
+    if idempotency_key:
+        stored = await _stored_response(db, current_user, idempotency_key, request)
+        if stored is not None:
+            return HabitLogResponse.model_validate(stored)
     completion_date = body.date
+    if habit.privacy == PrivacyType.SHARED:
+        # Serialize completions of one shared habit so the all-members check sees concurrent logs.
+        await db.execute(select(Habit.id).where(Habit.id == habit_id).with_for_update())
 
-    existing = (
-        db.query(HabitLog)
-        .filter(
-            HabitLog.habit_id == habit_id,
-            HabitLog.user_id == current_user.id,
-            HabitLog.date == completion_date,
-        )
-        .first()
-    )
-    if existing:
-        db.refresh(existing)
-        out = HabitLogResponse.model_validate(existing)
+    log, inserted = await _insert_log_or_get_existing(db, habit_id, current_user.id, completion_date, body.value)
+    if not inserted:
+        out = HabitLogResponse.model_validate(log)
         out.family_xp_awarded = False
         out.family_xp_amount = None
-        return out
+        return await _respond(db, out, current_user, idempotency_key, request)
 
     counts = habit_completion_counts(habit, body.value, completion_date, current_user.id, db)
-    xp = 0
-    streak_info = {}
+    grown = []
+    if counts:
+        grown = await add_streak_day(habit, current_user.id, completion_date, db)
+        await sync_streak_from_runs(habit_id, current_user.id, db)
+    entries = []
     if counts and habit.type != HabitType.TIMES_PER_WEEK:
-        xp = habit.xp_reward
-        streak_info = update_streak(habit_id, current_user.id, db)
-        xp += streak_info.get("bonus_xp", 0)
-
-    log = HabitLog(
-        habit_id=habit_id,
-        user_id=current_user.id,
-        date=completion_date,
-        value=body.value,
-        xp_earned=xp,
-    )
-    db.add(log)
-    db.flush()
+        bonus = sum(streak_bonus(before, after) for _, before, after in grown)
+        entries.append(XpEntry(XpSource.HABIT, habit.xp_reward, completion_date, habit_id, log.id))
+        entries.append(XpEntry(XpSource.STREAK_BONUS, bonus, completion_date, habit_id, log.id))
 
     if habit.type == HabitType.TIMES_PER_WEEK:
-        week_start = completion_date - timedelta(days=completion_date.weekday())
-        week_end = week_start + timedelta(days=6)
+        await increment_week_counter(habit_id, current_user.id, completion_date, db)
         target = get_effective_weekly_target(habit, current_user.id, completion_date)
-        if target is not None:
-            count_in_week = (
-                db.query(HabitLog)
-                .filter(
-                    HabitLog.habit_id == habit_id,
-                    HabitLog.user_id == current_user.id,
-                    HabitLog.date >= week_start,
-                    HabitLog.date <= week_end,
-                )
-                .count()
-            )
-            already_awarded = (
-                db.query(HabitLog)
-                .filter(
-                    HabitLog.habit_id == habit_id,
-                    HabitLog.user_id == current_user.id,
-                    HabitLog.date >= week_start,
-                    HabitLog.date <= week_end,
-                    HabitLog.xp_earned > 0,
-                )
-                .first()
-            )
-            if count_in_week >= target and not already_awarded:
-                log.xp_earned = habit.xp_reward
-                xp = habit.xp_reward
+        if target is not None and await claim_week_xp(habit_id, current_user.id, completion_date, target, db):
+            entries.append(XpEntry(XpSource.WEEKLY_GOAL, habit.xp_reward, completion_date, habit_id, log.id))
+    xp = sum(e.amount for e in entries)
+    log.xp_earned = xp
 
+    xp_result = {}
+    completed_quests = []
     if xp > 0:
-        xp_result = update_user_xp(current_user, xp, db)
-        if xp_result.get("level_up"):
-            try:
-                await notify_level_up(current_user, xp_result["new_level"], db)
-            except Exception:
-                pass
+        xp_result = await award_user_xp(current_user, entries, db)
+        completed_quests = await add_quest_xp(habit.family_id, completion_date, xp, db)
 
     family_xp_awarded = False
     family_xp_amount = None
-    if counts and check_all_adults_completed_shared_habit(habit, completion_date, db):
-        family = db.query(Family).filter(Family.id == habit.family_id).first()
-        if family:
-            family_xp_amount = habit.xp_reward
-            update_family_xp(family, family_xp_amount, db)
-            family_xp_awarded = True
-
-    db.commit()
-    db.refresh(log)
+    if counts and await check_all_adults_completed_shared_habit(habit, completion_date, db):
+        family_xp_amount = habit.xp_reward
+        await award_family_xp(
+            habit.family_id, [XpEntry(XpSource.SHARED_HABIT, family_xp_amount, completion_date, habit_id)], db
+        )
+        family_xp_awarded = True
+
+    # Notifications are queued in this transaction; the outbox dispatcher sends them after commit.
+    if xp_result.get("level_up"):
+        await notify_level_up(current_user, xp_result["new_level"], db)
+    for family_id, quest_name in completed_quests:
+        await notify_family_quest_completed(str(family_id), quest_name, db)
+
+    await bump_family_version(db, habit.family_id)
     out = HabitLogResponse.model_validate(log)
     out.family_xp_awarded = family_xp_awarded
     out.family_xp_amount = family_xp_amount
-    return out
+    return await _respond(db, out, current_user, idempotency_key, request)
+
+
+async def _insert_logs_or_get_existing(db: AsyncSession, user_id: UUID, values: dict) -> dict:
+    """Batch form of _insert_log_or_get_existing: values maps (habit_id, day) -> value. One multi-row
+    INSERT ... ON CONFLICT DO NOTHING, then one SELECT for the rows that already existed.
+    Returns (habit_id, day) -> (log, inserted)."""
+    rows = [
+        {"id": uuid.uuid4(), "habit_id": h, "user_id": user_id, "date": d, "value": v, "xp_earned": 0}
+        for (h, d), v in values.items()
+    ]
+    stmt = pg_insert(HabitLog).values(rows).on_conflict_do_nothing(constraint="unique_habit_user_date")
+    inserted = (await db.scalars(stmt.returning(HabitLog))).all()
+    logs = {(log.habit_id, log.date): (log, True) for log in inserted}
+    missing = [key for key in values if key not in logs]
+    if missing:
+        existing = await db.scalars(
+            select(HabitLog).where(HabitLog.user_id == user_id, tuple_(HabitLog.habit_id, HabitLog.date).in_(missing))
+        )
+        logs.update({(log.habit_id, log.date): (log, False) for log in existing})
+    return logs
+
+
+@router.post("/complete-batch", response_model=list[HabitBatchResult])
+async def complete_habits_batch(
+    body: HabitBatchCompleteBody,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """Apply many completions in one transaction (offline catch-up, backfilling a day). Same rules as
+    /{habit_id}/complete, but streak runs and week counters are updated once per habit (per week), XP goes to
+    the ledger in one award, quests once per day and the shared-habit check once per habit and day (or week).
+    Returns one result per item, in request order; unknown habits are reported, not fatal."""
+    if idempotency_key:
+        stored = await _stored_response(db, current_user, idempotency_key, request)
+        if stored is not None:
+            return [HabitBatchResult.model_validate(r) for r in stored]
+    habit_ids = {item.habit_id for item in body.items}
+    habits = {
+        h.id: h
+        for h in (await db.scalars(select(Habit).where(Habit.id.in_(habit_ids)))).all()
+        if _check_habit_access(h, current_user)
+    }
+    shared = sorted(h.id for h in habits.values() if h.privacy == PrivacyType.SHARED)
+    if shared:
+        # Same lock as a single completion, taken in id order so concurrent batches cannot deadlock.
+        await db.execute(select(Habit.id).where(Habit.id.in_(shared)).order_by(Habit.id).with_for_update())
+
+    values = {}
+    for item in body.items:
+        if item.habit_id in habits:
+            values.setdefault((item.habit_id, item.date), item.value)  # first occurrence wins
+    logs = await _insert_logs_or_get_existing(db, current_user.id, values) if values else {}
+
+    new_logs: dict = {}  # habit_id -> its inserted logs, oldest first
+    for (habit_id, _), (log, inserted) in sorted(logs.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+        if inserted:
+            new_logs.setdefault(habit_id, []).append(log)
+    entries = []
+    log_xp: dict = {}  # log id -> XP earned
+    shared_days = []  # (habit, day) to check for the all-members bonus
+    for habit_id in sorted(new_logs, key=str):
+        habit = habits[habit_id]
+        counted = [
+            l for l in new_logs[habit_id] if habit_completion_counts(habit, l.value, l.date, current_user.id, db)
+        ]
+        grown = []
+        if counted:
+            grown = await add_streak_days(habit, current_user.id, [l.date for l in counted], db)
+            await sync_streak_from_runs(habit_id, current_user.id, db)
+        if counted and habit.type != HabitType.TIMES_PER_WEEK:
+            shared_days.extend((habit, l.date) for l in counted)
+            for l in counted:
+                entries.append(XpEntry(XpSource.HABIT, habit.xp_reward, l.date, habit_id, l.id))
+                log_xp[l.id] = habit.xp_reward
+            by_date = {l.date: l for l in counted}
+            for day, before, after in grown:
+                bonus = streak_bonus(before, after)
+                if bonus:
+                    # Credit the day that reached the milestone, as one-by-one completions in date order would.
+                    hit = by_date[day]
+                    entries.append(XpEntry(XpSource.STREAK_BONUS, bonus, day, habit_id, hit.id))
+                    log_xp[hit.id] += bonus
+        if habit.type == HabitType.TIMES_PER_WEEK:
+            weeks: dict = {}
+            for l in new_logs[habit_id]:
+                weeks.setdefault(week_start_of(l.date), []).append(l)
+            for week_logs in weeks.values():
+                last = week_logs[-1]
+                shared_days.append((habit, last.date))  # the all-members check is per week for these habits
+                count, _ = await increment_week_counter(habit_id, current_user.id, last.date, db, by=len(week_logs))
+                target = get_effective_weekly_target(habit, current_user.id, last.date)
+                if target is not None and await claim_week_xp(habit_id, current_user.id, last.date, target, db):
+                    # Credit the log that reached the target, as one-by-one completions would.
+                    hit = week_logs[min(max(target - (count - len(week_logs)) - 1, 0), len(week_logs) - 1)]
+                    entries.append(XpEntry(XpSource.WEEKLY_GOAL, habit.xp_reward, hit.date, habit_id, hit.id))
+                    log_xp[hit.id] = habit.xp_reward
+    for logs_of_habit in new_logs.values():
+        for l in logs_of_habit:
+            l.xp_earned = log_xp.get(l.id, 0)
+
+    xp_result = {}
+    completed_quests = []
+    if any(e.amount for e in entries):
+        xp_result = await award_user_xp(current_user, entries, db)
+        quest_xp: dict = {}
+        for logs_of_habit in new_logs.values():
+            for l in logs_of_habit:
+                if l.xp_earned > 0:
+                    key = (habits[l.habit_id].family_id, l.date)
+                    quest_xp[key] = quest_xp.get(key, 0) + l.xp_earned
+        for (family_id, day), xp in sorted(quest_xp.items(), key=lambda kv: kv[0][1]):
+            completed_quests += await add_quest_xp(family_id, day, xp, db)
+
+    family_awards: dict = {}  # (habit_id, day) -> family XP
+    family_entries: dict = {}  # family_id -> entries
+    for habit, day in shared_days:
+        if await check_all_adults_completed_shared_habit(habit, day, db):
+            family_awards[(habit.id, day)] = habit.xp_reward
+            family_entries.setdefault(habit.family_id, []).append(
+                XpEntry(XpSource.SHARED_HABIT, habit.xp_reward, day, habit.id)
+            )
+    for family_id, fam_entries in family_entries.items():
+        await award_family_xp(family_id, fam_entries, db)
+
+    if xp_result.get("level_up"):
+        await notify_level_up(current_user, xp_result["new_level"], db)
+    for family_id, quest_name in completed_quests:
+        await notify_family_quest_completed(str(family_id), quest_name, db)
+
+    if new_logs:
+        await bump_family_version(db, *{habits[h].family_id for h in new_logs})
+    results = []
+    reported = set()
+    for item in body.items:
+        key = (item.habit_id, item.date)
+        if key not in logs:
+            results.append(HabitBatchResult(habit_id=item.habit_id, date=item.date, status="not_found"))
+            continue
+        log, inserted = logs[key]
+        completed = inserted and key not in reported  # repeats within the batch report already_completed
+        reported.add(key)
+        out = HabitLogResponse.model_validate(log)
+        out.family_xp_awarded = completed and key in family_awards
+        out.family_xp_amount = family_awards.get(key) if completed else None
+        status = "completed" if completed else "already_completed"
+        results.append(HabitBatchResult(habit_id=item.habit_id, date=item.date, status=status, log=out))
+    return await _respond(db, results, current_user, idempotency_key, request)
 
 
 @router.post("/{habit_id}/uncomplete")
 async def uncomplete_habit(
     habit_id: UUID,
     body: HabitCompleteBody,
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    """Remove completion for the given date; recalc streak. XP is not revoked."""
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
+    """Remove completion for the given date; recalc streak. Lifetime XP is not revoked; quest and period XP are."""
+    habit = await db.get(Habit, habit_id)
     if not habit or not _check_habit_access(habit, current_user):
         raise HTTPException(status_code=404, detail="Habit not found")
-    log = (
-        db.query(HabitLog)
-        .filter(
+    if idempotency_key:
+        stored = await _stored_response(db, current_user, idempotency_key, request)
+        if stored is not None:
+            return stored
+    log = await db.scalar(
+        select(HabitLog).where(
             HabitLog.habit_id == habit_id,
             HabitLog.user_id == current_user.id,
             HabitLog.date == body.date,
         )
-        .first()
     )
     if not log:
-        return {"ok": True, "message": "No log for this date"}
-    db.delete(log)
-    db.commit()
-    recalc_streak(habit_id, current_user.id, db)
-    return {"ok": True}
+        return await _respond(db, {"ok": True, "message": "No log for this date"}, current_user, idempotency_key, request)
+    await remove_streak_day(habit, current_user.id, body.date, db)
+    # Rollups before quests, the lock order of the completion paths (see award_user_xp).
+    await remove_log_xp(log, db)
+    await remove_quest_xp(habit.family_id, body.date, log.xp_earned, db)
+    await db.delete(log)
+    await db.flush()
+    await sync_streak_from_runs(habit_id, current_user.id, db)
+    if habit.type == HabitType.TIMES_PER_WEEK:
+        await decrement_week_counter(habit_id, current_user.id, body.date, db)
+    await bump_family_version(db, habit.family_id)
+    return await _respond(db, {"ok": True}, current_user, idempotency_key, request)
+
+
+async def _stored_response(db: AsyncSession, user: User, key: str, request: Request):
+    try:
+        return await get_stored_response(db, user.id, key, request.url.path)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+async def _respond(db: AsyncSession, out, user: User, key: Optional[str], request: Request):
+    """Commit the unit of work, storing the response under the idempotency key in the same transaction."""
+    if key:
+        await store_response(db, user.id, key, request.url.path, jsonable_encoder(out))
+    await db.commit()
+    return out
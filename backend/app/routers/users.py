@@ -1,35 +1,46 @@
 """User and auth endpoints. Single auth source: services.auth.verify_and_get_user."""
 from typing import Optional, List
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..config import get_settings
 from ..database import get_db
 from ..models import User, Family
 from ..schemas import UserResponse, TelegramAuth, AuthResponse, InviteUserRequest, JoinFamilyRequest
-from ..services.auth import verify_and_get_user
+from ..services.auth import verify_and_get_user, invalidate_user_auth
+from ..services.data_version import bump_family_version, not_modified
 
 router = APIRouter(prefix="/api", tags=["users"])
 
 
-def get_current_user(
+async def get_current_user(
     x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> User:
     """Dependency: verify initData and return current user. Uses single auth service."""
     if not x_telegram_init_data:
         raise HTTPException(status_code=401, detail="Missing Telegram init data")
     try:
-        return verify_and_get_user(x_telegram_init_data, db)
+        return await verify_and_get_user(x_telegram_init_data, db)
     except ValueError as e:
         raise HTTPException(status_code=401, detail=str(e))
 
 
+async def get_app_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Dependency: current user if their Telegram ID is in ADMIN_IDS (operators of the app, not family admins)."""
+    admin_ids = {i.strip() for i in (get_settings().ADMIN_IDS or "").split(",") if i.strip()}
+    if current_user.telegram_id not in admin_ids:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return current_user
+
+
 @router.post("/auth/verify", response_model=AuthResponse)
-async def verify_auth(auth: TelegramAuth, db: Session = Depends(get_db)):
+async def verify_auth(auth: TelegramAuth, db: AsyncSession = Depends(get_db)):
     """Verify Telegram WebApp initData and return user (create if new)."""
     try:
-        user = verify_and_get_user(auth.init_data, db)
+        user = await verify_and_get_user(auth.init_data, db)
         return AuthResponse(user=UserResponse.model_validate(user))
     except ValueError as e:
         raise HTTPException(status_code=401, detail=str(e))
@@ -42,12 +53,16 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 @router.get("/users/family", response_model=List[UserResponse])
 async def get_family(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if not current_user.family_id:
         return []
-    members = db.query(User).filter(User.family_id == current_user.family_id).all()
+    if (cached := await not_modified(request, response, current_user, db)) is not None:
+        return cached
+    members = (await db.scalars(select(User).where(User.family_id == current_user.family_id))).all()
     return [UserResponse.model_validate(m) for m in members]
 
 
@@ -55,7 +70,7 @@ async def get_family(
 async def invite_user(
     body: InviteUserRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Placeholder: in full flow would link user to family by telegram_id."""
     if not current_user.family_id:
@@ -67,12 +82,15 @@ async def invite_user(
 async def join_family(
     body: JoinFamilyRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    family = db.query(Family).filter(Family.id == body.family_id).first()
+    family = await db.get(Family, body.family_id)
     if not family:
         raise HTTPException(status_code=404, detail="Family not found")
+    previous_family_id = current_user.family_id
     current_user.family_id = family.id
-    db.commit()
-    db.refresh(current_user)
+    await bump_family_version(db, previous_family_id, family.id)
+    await db.commit()
+    invalidate_user_auth(current_user.id)
+    await db.refresh(current_user)
     return UserResponse.model_validate(current_user)
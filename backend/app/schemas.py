@@ -1,5 +1,5 @@
 """Pydantic schemas for request/response validation."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime
 from uuid import UUID
@@ -109,7 +109,26 @@ class HabitLogResponse(BaseModel):
         from_attributes = True
 
 
+class HabitBatchItem(BaseModel):
+    habit_id: UUID
+    date: date
+    value: Optional[Dict[str, Any]] = None
+
+
+class HabitBatchCompleteBody(BaseModel):
+    """Body for POST /habits/complete-batch: completions to apply in one transaction."""
+    items: List[HabitBatchItem] = Field(..., min_length=1, max_length=200)
+
+
+class HabitBatchResult(BaseModel):
+    habit_id: UUID
+    date: date
+    status: str  # completed, already_completed (incl. repeats within the batch), not_found
+    log: Optional[HabitLogResponse] = None
+
+
 class HabitStatsResponse(BaseModel):
+    habit_id: Optional[UUID] = None
     current_streak: int = 0
     longest_streak: int = 0
     weekly_done: Optional[int] = None
@@ -118,6 +137,18 @@ class HabitStatsResponse(BaseModel):
     percent_month: Optional[float] = None
 
 
+class HabitHeatmap(BaseModel):
+    habit_id: UUID
+    completed: int
+    bits: str  # base64, bit i (LSB first within each byte) = day i of the year
+
+
+class HeatmapResponse(BaseModel):
+    year: int
+    days: int
+    habits: List[HabitHeatmap] = []
+
+
 # Baby (event_extra matches model column)
 class BabyEventCreate(BaseModel):
     event_type: BabyEventType
@@ -144,6 +175,11 @@ class BabyEventResponse(BaseModel):
         from_attributes = True
 
 
+class BabyEventSearchResult(BabyEventResponse):
+    rank: float
+    snippet: str  # matched words wrapped in ** (content is not HTML-escaped)
+
+
 # FamilyQuest
 class FamilyQuestCreate(BaseModel):
     name: str
@@ -188,3 +224,23 @@ class LeaderboardEntry(BaseModel):
     first_name: Optional[str] = None
     level: int
     total_xp: int
+    period_xp: int = 0  # XP from logs dated in the requested period (lifetime total for "all")
+
+
+# Dashboard
+class DashboardHabit(BaseModel):
+    habit: HabitResponse
+    today_log: Optional[HabitLogResponse] = None
+    current_streak: int = 0
+    longest_streak: int = 0
+    weekly_done: Optional[int] = None
+    weekly_target: Optional[int] = None
+
+
+class DashboardTodayResponse(BaseModel):
+    date: date
+    level: int
+    total_xp: int
+    xp_for_next_level: int
+    habits: List[DashboardHabit] = []
+    family_quest: Optional[FamilyQuestResponse] = None
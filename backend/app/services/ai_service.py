@@ -1,43 +1,136 @@
-"""Optional AI summary via OpenRouter. Graceful fallback if no key."""
+"""Optional AI summary via OpenRouter. Graceful fallback if no key, on errors, or when the upstream is slow.
+
+Summaries are cached in ai_summaries by (family, day, hash of model + prompt). Concurrent requests for the
+same key share one upstream call, which keeps running (and fills the cache) after a request stops waiting.
+"""
+import asyncio
+import hashlib
+import logging
 from datetime import date
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+import httpx
+from sqlalchemy import select, delete
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import get_settings
-from ..models import BabyEvent
+from ..database import session_scope
+from ..models import AiSummary, BabyEvent
+
+logger = logging.getLogger(__name__)
+
+MODEL = "openai/gpt-3.5-turbo"
+
+_client: Optional[httpx.AsyncClient] = None
+_in_flight: Dict[Tuple[UUID, date, str], "asyncio.Task[Optional[str]]"] = {}
+
+
+def _prompt(events: List[BabyEvent], day: date) -> str:
+    text = "\n".join(f"{e.event_type.value}: {e.content}" for e in events)
+    return f"Кратко резюмируй день малыша ({day}):\n{text}"
+
+
+def content_hash(prompt: str) -> str:
+    return hashlib.sha256(f"{MODEL}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        settings = get_settings()
+        _client = httpx.AsyncClient(
+            base_url=settings.OPENROUTER_API_URL.rstrip("/"),
+            headers={"Authorization": f"Bearer {settings.OPENROUTER_API_KEY}"},
+            timeout=settings.AI_SUMMARY_TIMEOUT_SECONDS,
+        )
+    return _client
+
+
+async def close_ai_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _request_summary(prompt: str) -> Optional[str]:
+    """One OpenRouter call; None on any failure (never cached)."""
+    try:
+        r = await _get_client().post(
+            "/chat/completions",
+            json={"model": MODEL, "messages": [{"role": "user", "content": prompt}], "max_tokens": 200},
+        )
+        if r.status_code != 200:
+            logger.warning("AI summary failed: %s %s", r.status_code, r.text[:200])
+            return None
+        choice = (r.json().get("choices") or [None])[0]
+        if not choice:
+            return None
+        return (choice.get("message") or {}).get("content", "").strip() or None
+    except Exception as e:
+        logger.warning("AI summary failed: %s", str(e) or type(e).__name__)
+        return None
 
 
-def summarize_events(events: List[BabyEvent], day: date) -> str:
-    """Return AI summary if OPENROUTER_API_KEY set, else simple text."""
+async def _store_summary(key: Tuple[UUID, date, str], summary: str) -> None:
+    family_id, day, digest = key
+    async with session_scope() as db:
+        # Older versions of this day (events edited since) are no longer reachable.
+        await db.execute(
+            delete(AiSummary).where(
+                AiSummary.family_id == family_id, AiSummary.day == day, AiSummary.content_hash != digest
+            )
+        )
+        await db.execute(
+            pg_insert(AiSummary)
+            .values(family_id=family_id, day=day, content_hash=digest, summary=summary)
+            .on_conflict_do_nothing()
+        )
+
+
+async def _generate_and_store(key: Tuple[UUID, date, str], prompt: str) -> Optional[str]:
+    """Shared task behind summarize_events: never raises, so waiting requests always get text or None."""
+    try:
+        summary = await _request_summary(prompt)
+        if summary:
+            try:
+                await _store_summary(key, summary)
+            except (SQLAlchemyError, OSError) as e:
+                # DB down or family deleted meanwhile: callers still get the text, it is just not cached.
+                logger.warning("AI summary cache write failed: %s", str(e) or type(e).__name__)
+        return summary
+    finally:
+        _in_flight.pop(key, None)
+
+
+async def summarize_events(events: List[BabyEvent], day: date, family_id: UUID, db: AsyncSession) -> str:
+    """Return AI summary if OPENROUTER_API_KEY set, else simple text. Waits at most AI_SUMMARY_WAIT_SECONDS."""
     settings = get_settings()
     if not events:
         return ""
     if not settings.OPENROUTER_API_KEY:
-        parts = [f"- [{e.event_type.value}] {e.content}" for e in events]
-        return "\n".join(parts)
-    try:
-        import httpx
-        text = "\n".join(f"{e.event_type.value}: {e.content}" for e in events)
-        r = httpx.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {settings.OPENROUTER_API_KEY}"},
-            json={
-                "model": "openai/gpt-3.5-turbo",
-                "messages": [
-                    {"role": "user", "content": f"Кратко резюмируй день малыша ({day}):\n{text}"}
-                ],
-                "max_tokens": 200,
-            },
-            timeout=15.0,
+        return _fallback_summary(events)
+    prompt = _prompt(events, day)
+    key = (family_id, day, content_hash(prompt))
+    cached = await db.scalar(
+        select(AiSummary.summary).where(
+            AiSummary.family_id == key[0], AiSummary.day == key[1], AiSummary.content_hash == key[2]
         )
-        if r.status_code != 200:
-            return _fallback_summary(events)
-        data = r.json()
-        choice = (data.get("choices") or [None])[0]
-        if not choice:
-            return _fallback_summary(events)
-        return (choice.get("message") or {}).get("content", "").strip() or _fallback_summary(events)
-    except Exception:
+    )
+    if cached:
+        return cached
+    task = _in_flight.get(key)
+    if task is None:
+        task = _in_flight[key] = asyncio.create_task(_generate_and_store(key, prompt))
+    try:
+        # shield: a request that stops waiting must not cancel the shared call.
+        summary = await asyncio.wait_for(asyncio.shield(task), timeout=settings.AI_SUMMARY_WAIT_SECONDS)
+    except asyncio.TimeoutError:
         return _fallback_summary(events)
+    return summary or _fallback_summary(events)
 
 
 def _fallback_summary(events: List[BabyEvent]) -> str:
@@ -1,17 +1,146 @@
-"""Single place: verify initData + get or create user."""
+"""Single place: verify initData + get or create user. Verified initData is cached per process."""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import date, timedelta
-from sqlalchemy.orm import Session
+from typing import Dict, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import get_settings
 from ..models import User, Family, FamilyQuest, UserRole
-from ..utils.telegram_auth import verify_telegram_webapp_data, parse_telegram_user_data
+from .data_version import bump_family_version
+from ..utils.telegram_auth import (
+    verify_telegram_webapp_data,
+    parse_telegram_user_data,
+    parse_telegram_auth_date,
+    init_data_digest,
+)
+
+
+@dataclass(frozen=True)
+class _CachedAuth:
+    user_id: UUID
+    role: UserRole
+    family_id: Optional[UUID]
+    expires_at: float
+
+
+class AuthCache:
+    """Bounded LRU of verified initData -> resolved user. Entries expire by auth_date and TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, max_age_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _CachedAuth]" = OrderedDict()
+        self._keys_by_user: Dict[UUID, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[_CachedAuth]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, user: User, auth_date: Optional[int]) -> None:
+        """Cache a verified user. Stale or undated initData is never cached (always re-verified)."""
+        if self.max_entries <= 0 or auth_date is None:
+            return
+        now = time.time()
+        expires_at = min(auth_date + self.max_age_seconds, now + self.ttl_seconds)
+        if expires_at <= now:
+            return
+        entry = _CachedAuth(user_id=user.id, role=user.role, family_id=user.family_id, expires_at=expires_at)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._keys_by_user.setdefault(entry.user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        """Drop every cached initData of this user (call on role or family change)."""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
 
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        keys = self._keys_by_user.get(entry.user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry.user_id]
 
-def verify_and_get_user(init_data: str, db: Session) -> User:
+
+_settings = get_settings()
+auth_cache = AuthCache(
+    max_entries=_settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=_settings.AUTH_CACHE_TTL_SECONDS,
+    max_age_seconds=_settings.INIT_DATA_MAX_AGE_SECONDS,
+)
+
+
+def invalidate_user_auth(user_id: UUID) -> None:
+    """Evict cached auth for user after role or family change."""
+    auth_cache.invalidate_user(user_id)
+
+
+def auth_cache_stats() -> Dict[str, int]:
+    return auth_cache.stats()
+
+
+async def verify_and_get_user(init_data: str, db: AsyncSession) -> User:
     """
     Verify Telegram initData, parse user, return existing or create new user.
     Raises ValueError if init_data invalid or missing.
+    A repeated initData within its lifetime skips verification and costs one primary-key lookup.
     """
+    key = init_data_digest(init_data)
+    cached = auth_cache.get(key)
+    if cached is not None:
+        user = await db.get(User, cached.user_id)
+        if user is not None and user.role == cached.role and user.family_id == cached.family_id:
+            return user
+        auth_cache.discard(key)
+
+    user = await _verify_and_load_user(init_data, db)
+    auth_cache.put(key, user, parse_telegram_auth_date(init_data))
+    return user
+
+
+async def _verify_and_load_user(init_data: str, db: AsyncSession) -> User:
     settings = get_settings()
     if not settings.TELEGRAM_BOT_TOKEN:
         raise ValueError("Bot token not configured")
@@ -24,18 +153,19 @@ def verify_and_get_user(init_data: str, db: Session) -> User:
     if not telegram_id:
         raise ValueError("Missing user id")
 
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if user:
         if user.username != user_data.get("username") or user.first_name != user_data.get("first_name"):
             user.username = user_data.get("username")
             user.first_name = user_data.get("first_name")
-            db.commit()
-            db.refresh(user)
+            await bump_family_version(db, user.family_id)
+            await db.commit()
+            await db.refresh(user)
         return user
 
     family = Family()
     db.add(family)
-    db.flush()
+    await db.flush()
     user = User(
         telegram_id=telegram_id,
         username=user_data.get("username"),
@@ -44,7 +174,7 @@ def verify_and_get_user(init_data: str, db: Session) -> User:
         role=UserRole.ADMIN,
     )
     db.add(user)
-    db.flush()
+    await db.flush()
     # Стартовый квест для новой семьи, чтобы не было пусто
     start = date.today()
     end = start + timedelta(days=7)
@@ -56,6 +186,6 @@ def verify_and_get_user(init_data: str, db: Session) -> User:
         end_date=end,
     )
     db.add(quest)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
@@ -0,0 +1,55 @@
+"""Per-family data version for conditional GETs. Shared by all workers because it lives in families.data_version.
+
+Every write to a family's habits, logs, baby diary, members or quests bumps the version in the writing
+transaction, so it becomes visible exactly when the data does. Read endpoints derive their ETag from it and
+answer If-None-Match with 304 after one primary-key lookup, before any query or serialization.
+"""
+import hashlib
+from datetime import date
+from typing import Optional
+from uuid import UUID
+
+from fastapi import Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Family, User
+
+
+async def bump_family_version(db: AsyncSession, *family_ids: Optional[UUID]) -> None:
+    """Mark the families' data as changed. Call late in the transaction: it holds the family row lock until commit."""
+    ids = {fid for fid in family_ids if fid is not None}
+    if not ids:
+        return
+    await db.execute(
+        update(Family)
+        .where(Family.id.in_(ids))
+        .values(data_version=Family.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _etag(request: Request, user: User, version: int) -> str:
+    # Responses differ per user (personal habits), per query string and per day (schedules, periods).
+    scope = f"{user.id}|{user.family_id}|{date.today()}|{request.url.path}?{request.url.query}"
+    return f'"{version}-{hashlib.sha1(scope.encode()).hexdigest()[:16]}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+async def not_modified(request: Request, response: Response, user: User, db: AsyncSession) -> Optional[Response]:
+    """Set ETag on the response; return a 304 to send instead if the client already has this version.
+    Users without a family get no ETag (nothing to version by)."""
+    if user.family_id is None:
+        return None
+    version = await db.scalar(select(Family.data_version).where(Family.id == user.family_id))
+    etag = _etag(request, user, version or 0)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "X-Telegram-Init-Data"}
+    if _matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,132 @@
+"""Incremental GitHub diary backup: a family's day file is uploaded only when its content changed.
+
+diary_backups keeps the git blob sha of every uploaded file. A run renders each (family, day) in range,
+skips files whose sha matches, and uploads the rest: a single file via the Contents API (passing the stored
+sha), several via the Git Data API, GITHUB_BACKUP_FILES_PER_COMMIT files per commit. A failed commit leaves
+its days unrecorded, so the next run picks them up again.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import httpx
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import BabyEvent, DiaryBackup
+from .github_service import blob_sha, check_configured, commit_files, diary_path, generate_markdown, put_file
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DayFile:
+    family_id: UUID
+    day: date
+    content: str
+    sha: str
+    previous_sha: Optional[str]
+
+    @property
+    def path(self) -> str:
+        return diary_path(self.family_id, self.day)
+
+
+@dataclass
+class BackupSummary:
+    start: date
+    end: date
+    uploaded: int = 0
+    unchanged: int = 0
+    commits: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)  # path -> error
+    seconds: float = 0.0
+
+
+async def _day_files(db: AsyncSession, day: date, family_id: Optional[UUID]) -> List[DayFile]:
+    """Render every family's file for one day, with the sha last uploaded for it (if any)."""
+    conditions = [
+        BabyEvent.created_at >= datetime.combine(day, datetime.min.time()),
+        BabyEvent.created_at <= datetime.combine(day, datetime.max.time()),
+    ]
+    stored_q = select(DiaryBackup.family_id, DiaryBackup.blob_sha).where(DiaryBackup.day == day)
+    if family_id is not None:
+        conditions.append(BabyEvent.family_id == family_id)
+        stored_q = stored_q.where(DiaryBackup.family_id == family_id)
+    events = (
+        await db.scalars(
+            select(BabyEvent)
+            .where(*conditions)
+            .order_by(BabyEvent.family_id, BabyEvent.created_at.desc(), BabyEvent.id)
+        )
+    ).all()
+    by_family: Dict[UUID, List[BabyEvent]] = {}
+    for e in events:
+        by_family.setdefault(e.family_id, []).append(e)
+    stored = dict((await db.execute(stored_q)).all())
+    files = []
+    for fid, family_events in by_family.items():
+        content = generate_markdown(family_events, day, day)
+        files.append(DayFile(fid, day, content, blob_sha(content), stored.get(fid)))
+    return files
+
+
+async def _upload(db: AsyncSession, files: List[DayFile], summary: BackupSummary) -> None:
+    """Upload one batch and record it; on failure record the error per path and leave diary_backups as is."""
+    try:
+        if len(files) == 1:
+            f = files[0]
+            commit = await put_file(f.path, f.content, f"Diary {f.day}", f.previous_sha)
+        else:
+            first, last = min(f.day for f in files), max(f.day for f in files)
+            period = str(first) if first == last else f"{first}..{last}"
+            commit = await commit_files({f.path: f.content for f in files}, f"Diary {period} ({len(files)} files)")
+    except (ValueError, httpx.HTTPError) as e:
+        for f in files:
+            summary.failed[f.path] = str(e) or type(e).__name__
+        return
+    stmt = pg_insert(DiaryBackup).values(
+        [{"family_id": f.family_id, "day": f.day, "blob_sha": f.sha, "commit_sha": commit or None} for f in files]
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DiaryBackup.family_id, DiaryBackup.day],
+            set_={"blob_sha": stmt.excluded.blob_sha, "commit_sha": stmt.excluded.commit_sha, "backed_up_at": func.now()},
+        )
+    )
+    summary.uploaded += len(files)
+    summary.commits.append(commit)
+
+
+async def sync_diary(
+    db: AsyncSession, start: date, end: date, family_id: Optional[UUID] = None, force: bool = False
+) -> BackupSummary:
+    """Back up every (family, day) in [start, end] whose file changed since it was last uploaded.
+
+    force re-uploads unchanged files too (e.g. after the repository was replaced). Raises ValueError if
+    GitHub is not configured; upload errors are collected in summary.failed. Caller commits.
+    """
+    settings = check_configured()
+    per_commit = max(1, settings.GITHUB_BACKUP_FILES_PER_COMMIT)
+    summary = BackupSummary(start=start, end=end)
+    started = time.perf_counter()
+    pending: List[DayFile] = []
+    day = start
+    while day <= end:
+        for f in await _day_files(db, day, family_id):
+            if f.sha == f.previous_sha and not force:
+                summary.unchanged += 1
+            else:
+                pending.append(f)
+        while len(pending) >= per_commit:
+            await _upload(db, pending[:per_commit], summary)
+            pending = pending[per_commit:]
+        day += timedelta(days=1)
+    if pending:
+        await _upload(db, pending, summary)
+    summary.seconds = time.perf_counter() - started
+    return summary
@@ -0,0 +1,118 @@
+"""Diary export formats, streamed from a server-side cursor so memory stays flat for any date range."""
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterator, Iterable, Iterator, Optional
+from uuid import UUID
+
+from sqlalchemy import select, func, case
+
+from ..database import SessionLocal
+from ..models import BabyEvent, BabyEventType
+
+FORMATS = {
+    "markdown": ("text/markdown; charset=utf-8", "md"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+KIND_ORDER = (BabyEventType.FOOD, BabyEventType.SKILL, BabyEventType.NOTE)
+CSV_COLUMNS = ["id", "created_at", "event_type", "content", "event_extra", "created_by"]
+BATCH_SIZE = 500
+
+
+def _kind_rank(event_type: BabyEventType) -> int:
+    return KIND_ORDER.index(event_type) if event_type in KIND_ORDER else len(KIND_ORDER)
+
+
+class MarkdownWriter:
+    """Diary Markdown line by line. Feed events ordered by day (newest first), then kind (food, skill, note);
+    state carries over between calls, so batches can be written one after another."""
+
+    def __init__(self, start: date, end: date):
+        self.start = start
+        self.end = end
+        self._day: Optional[date] = None
+        self._kind = None
+
+    def header(self) -> str:
+        return f"# Дневник развития малыша\n\nПериод: {self.start} — {self.end}\n\n---\n"
+
+    def lines(self, events: Iterable[BabyEvent]) -> Iterator[str]:
+        for e in events:
+            d = e.created_at.date()
+            if d != self._day:
+                self._day, self._kind = d, None
+                yield f"\n## {d}\n"
+            if e.event_type != self._kind:
+                self._kind = e.event_type
+                yield f"### {self._kind.value}\n"
+            yield f"- {e.content}\n"
+
+
+def markdown_order(events: Iterable[BabyEvent]) -> list:
+    """Sort in memory into the order MarkdownWriter expects (stable, keeps the input order within a kind)."""
+    return sorted(events, key=lambda e: (-e.created_at.date().toordinal(), _kind_rank(e.event_type)))
+
+
+def _event_dict(e: BabyEvent) -> dict:
+    return {
+        "id": str(e.id),
+        "created_at": e.created_at.isoformat() if e.created_at else None,
+        "event_type": e.event_type.value,
+        "content": e.content,
+        "event_extra": e.event_extra,
+        "created_by": str(e.created_by),
+    }
+
+
+def _query(family_id: UUID, start: date, end: date, fmt: str):
+    q = select(BabyEvent).where(
+        BabyEvent.family_id == family_id,
+        BabyEvent.created_at >= datetime.combine(start, datetime.min.time()),
+        BabyEvent.created_at <= datetime.combine(end, datetime.max.time()),
+    )
+    if fmt == "markdown":
+        # Same grouping as generate_markdown: UTC day desc, kind, newest first within a kind.
+        rank = case(*((BabyEvent.event_type == t, i) for i, t in enumerate(KIND_ORDER)), else_=len(KIND_ORDER))
+        q = q.order_by(func.date(func.timezone("UTC", BabyEvent.created_at)).desc(), rank, BabyEvent.created_at.desc())
+    else:
+        q = q.order_by(BabyEvent.created_at)
+    return q.execution_options(yield_per=BATCH_SIZE)
+
+
+async def stream_export(family_id: UUID, start: date, end: date, fmt: str) -> AsyncIterator[str]:
+    """Yield the export in chunks of up to BATCH_SIZE events. Uses its own session for the response's lifetime."""
+    async with SessionLocal() as db:
+        result = await db.stream_scalars(_query(family_id, start, end, fmt))
+        markdown = MarkdownWriter(start, end)
+        if fmt == "csv":
+            buf = io.StringIO()
+            csv.writer(buf).writerow(CSV_COLUMNS)
+            yield buf.getvalue()
+        elif fmt == "markdown":
+            yield markdown.header()
+        async for batch in result.partitions():
+            if fmt == "ndjson":
+                yield "".join(json.dumps(_event_dict(e), ensure_ascii=False) + "\n" for e in batch)
+            elif fmt == "csv":
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for e in batch:
+                    row = _event_dict(e)
+                    if row["event_extra"] is not None:
+                        row["event_extra"] = json.dumps(row["event_extra"], ensure_ascii=False)
+                    writer.writerow([row[c] for c in CSV_COLUMNS])
+                yield buf.getvalue()
+            else:
+                # Same bytes as "\n".join(lines): every line after the header is preceded by a newline.
+                yield "".join("\n" + line for line in markdown.lines(batch))
+
+
+async def stream_markdown_json(family_id: UUID, start: date, end: date) -> AsyncIterator[str]:
+    """The Markdown export in the {"markdown", "start", "end"} body of GET /api/export/diary, streamed: each
+    chunk is JSON-escaped on its own, so the document is never held whole."""
+    yield '{"markdown": "'
+    async for chunk in stream_export(family_id, start, end, "markdown"):
+        yield json.dumps(chunk, ensure_ascii=False)[1:-1]
+    yield f'", "start": "{start}", "end": "{end}"}}'
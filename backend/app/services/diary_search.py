@@ -0,0 +1,46 @@
+"""Full-text search over a family's baby diary (baby_events.content_tsv, GIN-indexed, Russian config).
+
+The query string is parsed with websearch_to_tsquery, so users can type plain words, "quoted phrases", OR and
+-exclusions without syntax errors. It is parsed once per statement (a scalar subquery): passed inline as a
+bind parameter, the generic plan of the prepared statement re-parses it for every matching row. Matches are
+ranked with ts_rank (ts_rank_cd costs 3x on "-word" queries) and ties go to the newest entry; ts_headline
+re-parses the content, so snippets are built only for the page of results returned.
+"""
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import BabyEvent, BabyEventType
+
+TS_CONFIG = literal_column("'russian'::regconfig")  # must match the content_tsv expression
+HEADLINE_OPTIONS = "StartSel=**, StopSel=**, MaxWords=30, MinWords=10, MaxFragments=2, FragmentDelimiter=\" … \""
+
+
+async def search_events(
+    db: AsyncSession,
+    family_id: UUID,
+    q: str,
+    event_type: Optional[BabyEventType] = None,
+    limit: int = 20,
+) -> List[Tuple[BabyEvent, float, str]]:
+    """(event, rank, snippet) for the best matches of q, best first. A query of only stop words matches nothing."""
+    query = select(func.websearch_to_tsquery(TS_CONFIG, q)).scalar_subquery()
+    rank = func.ts_rank(BabyEvent.content_tsv, query)
+    conditions = [BabyEvent.family_id == family_id, BabyEvent.content_tsv.op("@@")(query)]
+    if event_type is not None:
+        conditions.append(BabyEvent.event_type == event_type)
+    top = (
+        select(BabyEvent.id, rank.label("rank"))
+        .where(*conditions)
+        .order_by(rank.desc(), BabyEvent.created_at.desc(), BabyEvent.id.desc())
+        .limit(limit)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(BabyEvent, top.c.rank, func.ts_headline(TS_CONFIG, BabyEvent.content, query, HEADLINE_OPTIONS))
+        .join(top, top.c.id == BabyEvent.id)
+        .order_by(top.c.rank.desc(), BabyEvent.created_at.desc(), BabyEvent.id.desc())
+    )
+    return [(event, float(r), snippet) for event, r, snippet in rows]
@@ -1,53 +1,158 @@
-"""GitHub diary export. Optional: skip if no token/repo."""
+"""GitHub diary export. Optional: skip if no token/repo. One pooled client per process, closed on shutdown.
+
+One file goes through the Contents API (a single call); many go through the Git Data API as one commit.
+"""
+import asyncio
 import base64
+import hashlib
+import logging
+import random
 from datetime import date
-from typing import List
+from typing import Dict, List, Optional
+from uuid import UUID
 
 import httpx
 from ..config import get_settings
 from ..models import BabyEvent
+from .diary_export import MarkdownWriter, markdown_order
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 
 def generate_markdown(events: List[BabyEvent], start: date, end: date) -> str:
-    by_date = {}
-    for e in events:
-        d = e.created_at.date()
-        if d not in by_date:
-            by_date[d] = {"food": [], "skill": [], "note": []}
-        by_date[d][e.event_type.value].append(e)
-    lines = [f"# Дневник развития малыша\n\nПериод: {start} — {end}\n\n---\n"]
-    for d in sorted(by_date.keys(), reverse=True):
-        lines.append(f"\n## {d}\n")
-        for kind in ("food", "skill", "note"):
-            items = by_date[d][kind]
-            if items:
-                lines.append(f"### {kind}\n")
-                for e in items:
-                    lines.append(f"- {e.content}\n")
-    return "\n".join(lines)
-
-
-async def commit_to_github(events: List[BabyEvent], event_date: date) -> dict:
-    """Commit day's events to GitHub via Contents API. Raises ValueError if not configured."""
+    writer = MarkdownWriter(start, end)
+    return "\n".join([writer.header(), *writer.lines(markdown_order(events))])
+
+
+def blob_sha(content: str) -> str:
+    """Git blob id of the file GitHub stores for this content (the Contents API "sha" of that file)."""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def diary_path(family_id: UUID, day: date) -> str:
+    """One file per family and day; diary_backups tracks each of them separately."""
+    return f"{family_id}/{day.strftime('%Y')}/{day.strftime('%m')}/{day}.md"
+
+
+def check_configured():
     settings = get_settings()
     if not settings.GITHUB_ACCESS_TOKEN or not settings.GITHUB_REPO:
         raise ValueError("GitHub not configured")
-    content = generate_markdown(events, event_date, event_date)
-    path = f"{event_date.strftime('%Y')}/{event_date.strftime('%m')}/{event_date}.md"
-    async with httpx.AsyncClient() as client:
-        r = await client.put(
-            f"https://api.github.com/repos/{settings.GITHUB_REPO}/contents/{path}",
+    return settings
+
+
+def get_github_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for the GitHub API (connections reused across calls and runs)."""
+    global _client
+    if _client is None or _client.is_closed:
+        settings = check_configured()
+        _client = httpx.AsyncClient(
+            base_url=settings.GITHUB_API_URL.rstrip("/"),
             headers={
                 "Authorization": f"Bearer {settings.GITHUB_ACCESS_TOKEN}",
                 "Accept": "application/vnd.github.v3+json",
             },
-            json={
-                "message": f"Diary {event_date}",
-                "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
-            },
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
             timeout=15.0,
         )
-        if r.status_code not in (200, 201):
-            raise ValueError(f"GitHub contents API failed: {r.status_code} {r.text[:200]}")
-        data = r.json()
-        return {"sha": data.get("commit", {}).get("sha", "")}
+    return _client
+
+
+async def close_github_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    """Exponential backoff with jitter; honours Retry-After from rate limiting."""
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return float(response.headers["Retry-After"])
+    return 0.5 * (2 ** attempt) * (0.5 + random.random())
+
+
+def _repo_url(suffix: str) -> str:
+    return f"/repos/{check_configured().GITHUB_REPO}/{suffix}"
+
+
+async def _request(method: str, url: str, **kwargs) -> httpx.Response:
+    """One API call, retried on network errors, 429 and 5xx. Other responses are returned to the caller."""
+    retries = max(0, check_configured().GITHUB_BACKUP_RETRIES)
+    client = get_github_client()
+    for attempt in range(retries + 1):
+        response = None
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code not in _RETRY_STATUSES:
+                return response
+            error = ValueError(f"GitHub API {method} {url} failed: {response.status_code}")
+        except httpx.TransportError as e:
+            error = e
+        if attempt == retries:
+            raise error
+        await asyncio.sleep(_retry_delay(attempt, response))
+
+
+async def _json(method: str, url: str, **kwargs) -> dict:
+    response = await _request(method, url, **kwargs)
+    if response.status_code not in (200, 201):
+        raise ValueError(f"GitHub API {method} {url} failed: {response.status_code} {response.text[:200]}")
+    return response.json()
+
+
+async def put_file(path: str, content: str, message: str, sha: Optional[str] = None) -> str:
+    """Create or update one file via the Contents API; returns the commit sha.
+
+    Updates need the current blob sha. If ours is missing or stale (the file was changed outside the backup),
+    it is read from GitHub and the PUT retried once.
+    """
+    settings = check_configured()
+    url = _repo_url(f"contents/{path}")
+    body = {
+        "message": message,
+        "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+        "branch": settings.GITHUB_BRANCH,
+    }
+    for refreshed in (False, True):
+        if sha:
+            body["sha"] = sha
+        else:
+            body.pop("sha", None)
+        response = await _request("PUT", url, json=body)
+        if response.status_code in (200, 201):
+            return response.json().get("commit", {}).get("sha", "")
+        if response.status_code not in (409, 422) or refreshed:
+            break
+        current = await _request("GET", url, params={"ref": settings.GITHUB_BRANCH})
+        sha = current.json().get("sha") if current.status_code == 200 else None
+    raise ValueError(f"GitHub contents API failed: {response.status_code} {response.text[:200]}")
+
+
+async def commit_files(files: Dict[str, str], message: str, attempts: int = 3) -> str:
+    """Commit many files (path -> content) at once via the Git Data API; returns the commit sha.
+
+    Five calls whatever the file count: read the branch head, its tree, create a tree on top of it with
+    the files inline, a commit, then fast-forward the branch. If the branch moved in between, start over.
+    """
+    settings = check_configured()
+    branch = settings.GITHUB_BRANCH
+    entries = [{"path": p, "mode": "100644", "type": "blob", "content": c} for p, c in files.items()]
+    for _ in range(attempts):
+        head = (await _json("GET", _repo_url(f"git/ref/heads/{branch}")))["object"]["sha"]
+        base_tree = (await _json("GET", _repo_url(f"git/commits/{head}")))["tree"]["sha"]
+        tree = (await _json("POST", _repo_url("git/trees"), json={"base_tree": base_tree, "tree": entries}))["sha"]
+        commit = (
+            await _json("POST", _repo_url("git/commits"), json={"message": message, "tree": tree, "parents": [head]})
+        )["sha"]
+        response = await _request("PATCH", _repo_url(f"git/refs/heads/{branch}"), json={"sha": commit, "force": False})
+        if response.status_code == 200:
+            return commit
+        if response.status_code != 422:
+            raise ValueError(f"GitHub ref update failed: {response.status_code} {response.text[:200]}")
+        logger.info("Branch %s moved during backup commit, retrying", branch)
+    raise ValueError(f"GitHub branch {branch} kept moving; commit not applied")
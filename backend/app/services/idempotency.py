@@ -0,0 +1,45 @@
+"""Client idempotency keys: replay the stored response for a retried request."""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import IdempotencyKey
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 200
+
+
+async def get_stored_response(db: AsyncSession, user_id: UUID, key: str, endpoint: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the stored response for (user, key), or None if the key is new.
+    Raises ValueError if the key is too long or was used for a different endpoint.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError("Idempotency-Key is too long")
+    row = await db.scalar(select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+    if row is None:
+        return None
+    if row.endpoint != endpoint:
+        raise ValueError("Idempotency-Key was already used for a different request")
+    return row.response
+
+
+async def store_response(db: AsyncSession, user_id: UUID, key: str, endpoint: str, response: Dict[str, Any]) -> None:
+    """Save response in the caller's transaction. A concurrent retry that stored first wins."""
+    stmt = (
+        pg_insert(IdempotencyKey)
+        .values(user_id=user_id, key=key, endpoint=endpoint, response=response)
+        .on_conflict_do_nothing(index_elements=[IdempotencyKey.user_id, IdempotencyKey.key])
+    )
+    await db.execute(stmt)
+
+
+async def purge_expired(db: AsyncSession) -> int:
+    """Delete keys older than IDEMPOTENCY_KEY_TTL. Returns number of rows removed."""
+    cutoff = datetime.now(timezone.utc) - IDEMPOTENCY_KEY_TTL
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    return result.rowcount or 0
@@ -0,0 +1,35 @@
+"""Keyset pagination: list endpoints return one page and, if more rows follow, an opaque cursor in X-Next-Cursor.
+
+A cursor encodes the sort key and id of the last row served; the next page continues strictly after it with a
+row comparison such as (created_at, id) < (:key, :id), which a composite index on the same columns answers
+without scanning the rows already sent (unlike OFFSET).
+"""
+import base64
+from datetime import date, datetime
+from typing import Optional, Tuple, Type, Union
+from uuid import UUID
+
+from ..config import get_settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+Key = Union[date, datetime]
+
+
+def page_size(limit: Optional[int], default: int) -> int:
+    """Requested page size, or the endpoint's default; capped at PAGE_SIZE_MAX."""
+    return max(1, min(limit or default, get_settings().PAGE_SIZE_MAX))
+
+
+def encode_cursor(key: Key, row_id: UUID) -> str:
+    return base64.urlsafe_b64encode(f"{key.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_type: Type[Key]) -> Tuple[Key, UUID]:
+    """Inverse of encode_cursor. Raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        key, row_id = raw.split("|")
+        return key_type.fromisoformat(key), UUID(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,123 @@
+"""Family quest progress: incremented in the completing transaction, reconciled hourly. Callers own the commit."""
+from datetime import date, timedelta
+from typing import List, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, update, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import FamilyQuest, HabitLog, User
+from .data_version import bump_family_version
+
+
+async def ensure_active_quest(db: AsyncSession, family_id: UUID) -> Tuple[FamilyQuest, bool]:
+    """(quest, created): the family's open quest, or a new starter quest when it has none. Does not commit;
+    callers commit when created is true."""
+    quest = await db.scalar(
+        select(FamilyQuest)
+        .where(
+            FamilyQuest.family_id == family_id,
+            FamilyQuest.is_completed == False,
+            FamilyQuest.end_date >= date.today(),
+        )
+        .limit(1)
+    )
+    if quest:
+        return quest, False
+    start = date.today()
+    quest = FamilyQuest(
+        family_id=family_id,
+        name="Первый квест",
+        target_xp=100,
+        start_date=start,
+        end_date=start + timedelta(days=7),
+    )
+    db.add(quest)
+    await bump_family_version(db, family_id)
+    await db.flush()
+    await db.refresh(quest)  # created_at is a server default
+    return quest, True
+
+
+def _active_for_log_date(family_id: UUID, log_date: date):
+    """Quests the hourly sum would count this log toward: open, not ended, log date within the quest."""
+    return and_(
+        FamilyQuest.family_id == family_id,
+        FamilyQuest.is_completed == False,
+        FamilyQuest.end_date >= date.today(),
+        FamilyQuest.start_date <= log_date,
+        FamilyQuest.end_date >= log_date,
+    )
+
+
+async def add_quest_xp(family_id: UUID, log_date: date, xp: int, db: AsyncSession) -> List[Tuple[UUID, str]]:
+    """Add a log's XP to the family's matching quests. Returns (family_id, name) of quests completed by this call.
+    Lock order: call after the user's XP is recorded (xp_ledger.award_user_xp locks rollups before quests)."""
+    if not family_id or xp <= 0:
+        return []
+    new_xp = FamilyQuest.current_xp + xp
+    rows = await db.execute(
+        update(FamilyQuest)
+        .where(_active_for_log_date(family_id, log_date))
+        .values(
+            current_xp=func.least(new_xp, FamilyQuest.target_xp),
+            is_completed=new_xp >= FamilyQuest.target_xp,
+        )
+        .returning(FamilyQuest.family_id, FamilyQuest.name, FamilyQuest.is_completed)
+        .execution_options(synchronize_session=False)
+    )
+    return [(fid, name) for fid, name, completed in rows if completed]
+
+
+async def remove_quest_xp(family_id: UUID, log_date: date, xp: int, db: AsyncSession) -> None:
+    """Take a deleted log's XP back out of open quests (completed quests stay completed). Call after
+    xp_ledger.remove_log_xp (same lock order as add_quest_xp)."""
+    if not family_id or xp <= 0:
+        return
+    await db.execute(
+        update(FamilyQuest)
+        .where(_active_for_log_date(family_id, log_date))
+        .values(current_xp=func.greatest(FamilyQuest.current_xp - xp, 0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reconcile_quests(db: AsyncSession) -> List[Tuple[UUID, str]]:
+    """
+    Recompute every open quest from habit logs in one grouped UPDATE; only rows that drifted are written.
+    Returns (family_id, name) of quests this statement marked completed.
+    """
+    today = date.today()
+    sums = (
+        select(
+            FamilyQuest.id.label("quest_id"),
+            func.coalesce(func.sum(HabitLog.xp_earned), 0).label("xp"),
+        )
+        .outerjoin(User, User.family_id == FamilyQuest.family_id)
+        .outerjoin(
+            HabitLog,
+            and_(
+                HabitLog.user_id == User.id,
+                HabitLog.date >= FamilyQuest.start_date,
+                HabitLog.date <= FamilyQuest.end_date,
+            ),
+        )
+        .where(FamilyQuest.is_completed == False, FamilyQuest.end_date >= today)
+        .group_by(FamilyQuest.id)
+        .subquery()
+    )
+    capped = func.least(sums.c.xp, FamilyQuest.target_xp)
+    rows = await db.execute(
+        update(FamilyQuest)
+        .where(
+            FamilyQuest.id == sums.c.quest_id,
+            # Rechecked on the latest row version after a lock wait: a quest that add_quest_xp or another
+            # worker completed meanwhile is left alone, so RETURNING holds only quests completed here.
+            FamilyQuest.is_completed.is_(False),
+            (FamilyQuest.current_xp != capped) | (sums.c.xp >= FamilyQuest.target_xp),
+        )
+        .values(current_xp=capped, is_completed=sums.c.xp >= FamilyQuest.target_xp)
+        .returning(FamilyQuest.family_id, FamilyQuest.name, FamilyQuest.is_completed)
+        .execution_options(synchronize_session=False)
+    )
+    return [(fid, name) for fid, name, completed in rows if completed]
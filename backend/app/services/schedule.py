@@ -0,0 +1,106 @@
+"""Habit schedules compiled once per habit version. WEEKLY day sets are also stored as habits.schedule_days_mask for SQL filtering."""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from ..models import Habit, ScheduleType
+
+ALL_DAYS_MASK = 0b1111111
+_CACHE_MAX_ENTRIES = 4096
+
+
+def days_mask(schedule_type: ScheduleType, config: Optional[Dict[str, Any]]) -> int:
+    """Weekdays (bit 0 = Monday) on which the habit can be due. Only WEEKLY narrows it down."""
+    if schedule_type != ScheduleType.WEEKLY:
+        return ALL_DAYS_MASK
+    mask = 0
+    for d in (config or {}).get("days") or []:
+        if isinstance(d, int) and 0 <= d <= 6:
+            mask |= 1 << d
+    return mask
+
+
+def scheduled_on_clause(day: date):
+    """SQL condition: habit's weekday mask includes day. CUSTOM habits still need is_due()."""
+    return Habit.schedule_days_mask.op("&")(1 << day.weekday()) != 0
+
+
+@dataclass(frozen=True)
+class CompiledSchedule:
+    """mask: allowed weekdays. interval/anchor: every interval-th day counted from anchor (CUSTOM only)."""
+    mask: int = ALL_DAYS_MASK
+    interval: int = 1
+    anchor: Optional[date] = None
+
+    def is_due(self, day: date) -> bool:
+        if not self.mask >> day.weekday() & 1:
+            return False
+        if self.interval == 1 or self.anchor is None:
+            return True
+        return (day - self.anchor).days % self.interval == 0
+
+    def occurrences_in_range(self, start: date, end: date) -> int:
+        """Number of due days in [start, end], without iterating over the days."""
+        if end < start:
+            return 0
+        if self.interval > 1 and self.anchor is not None:
+            offset = (start - self.anchor).days % self.interval
+            first = start + timedelta(days=(self.interval - offset) % self.interval)
+            if first > end:
+                return 0
+            return (end - first).days // self.interval + 1
+        total = (end - start).days + 1
+        if self.mask == ALL_DAYS_MASK:
+            return total
+        weeks, rest = divmod(total, 7)
+        count = weeks * bin(self.mask).count("1")
+        weekday = start.weekday()
+        for i in range(rest):
+            count += self.mask >> ((weekday + i) % 7) & 1
+        return count
+
+
+def compile_schedule(schedule_type: ScheduleType, config: Optional[Dict[str, Any]]) -> CompiledSchedule:
+    if schedule_type == ScheduleType.WEEKLY:
+        return CompiledSchedule(mask=days_mask(schedule_type, config))
+    if schedule_type == ScheduleType.CUSTOM:
+        config = config or {}
+        interval = config.get("interval", 1)
+        if not isinstance(interval, int) or interval < 1:
+            interval = 1
+        try:
+            anchor = datetime.fromisoformat(config["start_date"]).date()
+        except (KeyError, TypeError, ValueError):
+            # No usable start date: every day counts as the start, i.e. always due.
+            anchor = None
+        return CompiledSchedule(interval=interval, anchor=anchor)
+    if schedule_type in (ScheduleType.DAILY, ScheduleType.WEEKLY_TARGET):
+        return CompiledSchedule()
+    return CompiledSchedule(mask=0)
+
+
+_cache: "OrderedDict[Tuple[UUID, Optional[datetime]], CompiledSchedule]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def schedule_for(habit: Habit) -> CompiledSchedule:
+    """Compiled schedule for habit, cached by (id, updated_at) so edits get a fresh entry."""
+    key = (habit.id, habit.updated_at)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+    compiled = compile_schedule(habit.schedule_type, habit.schedule_config)
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > _CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def is_scheduled_on(habit: Habit, day: date) -> bool:
+    return schedule_for(habit).is_due(day)
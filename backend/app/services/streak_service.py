@@ -0,0 +1,212 @@
+"""Streaks from stored run boundaries. A change on one date only touches the runs next to it."""
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, func, case, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Habit, HabitLog, Streak, StreakRun
+from .xp_service import habit_completion_counts
+
+Run = Tuple[date, date]
+
+
+def runs_from_dates(dates: Iterable[date]) -> List[Run]:
+    """Collapse completed dates into maximal (start, end) runs, oldest first."""
+    runs: List[Run] = []
+    for d in sorted(set(dates)):
+        if runs and (d - runs[-1][1]).days == 1:
+            runs[-1] = (runs[-1][0], d)
+        else:
+            runs.append((d, d))
+    return runs
+
+
+async def _lock_pair(habit_id: UUID, user_id: UUID, db: AsyncSession) -> None:
+    """Serialize run edits for one (habit, user) until the transaction ends."""
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:k))"),
+        {"k": f"streak:{habit_id}:{user_id}"},
+    )
+
+
+async def _counted_dates(habit: Habit, user_id: UUID, db: AsyncSession) -> List[date]:
+    """Dates whose log counts toward the streak. Loads (date, value) columns only."""
+    rows = (
+        await db.execute(
+            select(HabitLog.date, HabitLog.value).where(HabitLog.habit_id == habit.id, HabitLog.user_id == user_id)
+        )
+    ).all()
+    return [d for d, value in rows if habit_completion_counts(habit, value, d, user_id, db)]
+
+
+async def rebuild_streak_runs(habit: Habit, user_id: UUID, db: AsyncSession, exclude: Iterable[date] = ()) -> None:
+    """Full recompute of runs from logs (bootstrap and repair), leaving out the dates in exclude."""
+    await db.execute(delete(StreakRun).where(StreakRun.habit_id == habit.id, StreakRun.user_id == user_id))
+    exclude = set(exclude)
+    for start, end in runs_from_dates(d for d in await _counted_dates(habit, user_id, db) if d not in exclude):
+        db.add(StreakRun(habit_id=habit.id, user_id=user_id, start_date=start, end_date=end))
+    await db.flush()
+
+
+async def _ensure_runs(habit: Habit, user_id: UUID, db: AsyncSession, adding: Iterable[date] = ()) -> None:
+    """Pairs completed before runs existed get their runs built once from logs. The days being added are left
+    out (their logs are already written) so the caller sees them as new."""
+    has_runs = await db.scalar(
+        select(StreakRun.start_date).where(StreakRun.habit_id == habit.id, StreakRun.user_id == user_id).limit(1)
+    )
+    if has_runs is None:
+        await rebuild_streak_runs(habit, user_id, db, exclude=adding)
+
+
+async def _runs_touching(habit_id: UUID, user_id: UUID, lo: date, hi: date, db: AsyncSession) -> List[StreakRun]:
+    return list(
+        (
+            await db.scalars(
+                select(StreakRun).where(
+                    StreakRun.habit_id == habit_id,
+                    StreakRun.user_id == user_id,
+                    StreakRun.start_date <= hi,
+                    StreakRun.end_date >= lo,
+                )
+            )
+        ).all()
+    )
+
+
+def add_days_to_runs(runs: Iterable[Run], days: Iterable[date]) -> List[Run]:
+    """Runs after marking days as counted: a day inside a run changes nothing, a day next to a run extends it
+    and a day bridging two runs merges them. Oldest first."""
+    merged: List[Run] = []
+    for start, end in sorted(set(runs) | {(d, d) for d in days}):
+        if merged and (start - merged[-1][1]).days <= 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def day_growth(runs: Iterable[Run], days: Iterable[date]) -> List[Tuple[date, int, int]]:
+    """Adds days one at a time in date order, as separate completions would. For each day not already counted:
+    (day, before, after), after being the length of the run that now covers it and before the longest run it
+    absorbed (0 if none)."""
+    runs = sorted(set(runs))
+    grown = []
+    for day in sorted(set(days)):
+        if any(start <= day <= end for start, end in runs):
+            continue
+        before = max(
+            ((end - start).days + 1 for start, end in runs if (day - end).days == 1 or (start - day).days == 1),
+            default=0,
+        )
+        runs = add_days_to_runs(runs, [day])
+        start, end = next(r for r in runs if r[0] <= day <= r[1])
+        grown.append((day, before, (end - start).days + 1))
+    return grown
+
+
+def remove_day_from_runs(runs: Iterable[Run], day: date) -> List[Run]:
+    """Runs after unmarking day: the run containing it is shortened, split in two or dropped. Oldest first."""
+    out: List[Run] = []
+    for start, end in sorted(runs):
+        if not start <= day <= end:
+            out.append((start, end))
+            continue
+        if start < day:
+            out.append((start, day - timedelta(days=1)))
+        if day < end:
+            out.append((day + timedelta(days=1), end))
+    return out
+
+
+async def _replace_runs(habit_id: UUID, user_id: UUID, old: List[StreakRun], new: List[Run], db: AsyncSession) -> None:
+    """Turn the loaded rows old into new: rows keeping their start date are updated in place, the rest are
+    deleted before the inserts (start_date is part of the primary key)."""
+    ends = dict(new)
+    stale = []
+    for r in old:
+        if r.start_date in ends:
+            end = ends.pop(r.start_date)
+            if r.end_date != end:
+                r.end_date = end
+        else:
+            stale.append(r)
+    for r in stale:
+        await db.delete(r)
+    if stale:
+        await db.flush()
+    for start, end in ends.items():
+        db.add(StreakRun(habit_id=habit_id, user_id=user_id, start_date=start, end_date=end))
+    await db.flush()
+
+
+async def add_streak_day(habit: Habit, user_id: UUID, day: date, db: AsyncSession) -> List[Tuple[date, int, int]]:
+    """Mark day as counted: extend or merge the neighbouring runs. Call after the log row is written.
+    Returns how its run grew, see day_growth."""
+    return await add_streak_days(habit, user_id, [day], db)
+
+
+async def add_streak_days(habit: Habit, user_id: UUID, days: Iterable[date], db: AsyncSession) -> List[Tuple[date, int, int]]:
+    """add_streak_day for several days at once: one lock, one read of the runs around them, merged in memory."""
+    days = sorted(set(days))
+    if not days:
+        return []
+    await _lock_pair(habit.id, user_id, db)
+    await _ensure_runs(habit, user_id, db, adding=days)
+    near = await _runs_touching(habit.id, user_id, days[0] - timedelta(days=1), days[-1] + timedelta(days=1), db)
+    old = [(r.start_date, r.end_date) for r in near]
+    merged = add_days_to_runs(old, days)
+    await _replace_runs(habit.id, user_id, near, merged, db)
+    return day_growth(old, days)
+
+
+async def remove_streak_day(habit: Habit, user_id: UUID, day: date, db: AsyncSession) -> None:
+    """Unmark day: split the run containing it. Call before the log row is deleted."""
+    await _lock_pair(habit.id, user_id, db)
+    await _ensure_runs(habit, user_id, db)
+    near = await _runs_touching(habit.id, user_id, day, day, db)
+    if not near:
+        return
+    split = remove_day_from_runs([(r.start_date, r.end_date) for r in near], day)
+    await _replace_runs(habit.id, user_id, near, split, db)
+
+
+async def sync_streak_from_runs(habit_id: UUID, user_id: UUID, db: AsyncSession, today: Optional[date] = None) -> None:
+    """Set Streak current/longest/last_completed from runs with one aggregate query (same rules as a full recompute)."""
+    today = today or date.today()
+    length = StreakRun.end_date - StreakRun.start_date + 1
+    last_completed, current, longest = (
+        await db.execute(
+            select(
+                func.max(StreakRun.end_date),
+                func.coalesce(func.max(case((StreakRun.end_date == today, length), else_=0)), 0),
+                func.coalesce(func.max(length), 0),
+            ).where(StreakRun.habit_id == habit_id, StreakRun.user_id == user_id)
+        )
+    ).one()
+    streak = await db.scalar(select(Streak).where(Streak.habit_id == habit_id, Streak.user_id == user_id))
+    if streak:
+        streak.current_streak = current
+        streak.longest_streak = max(streak.longest_streak, longest)
+        streak.last_completed_date = last_completed
+    elif last_completed is not None:
+        db.add(
+            Streak(
+                habit_id=habit_id,
+                user_id=user_id,
+                current_streak=current,
+                longest_streak=longest,
+                last_completed_date=last_completed,
+            )
+        )
+
+
+async def recalc_streak(habit_id: UUID, user_id: UUID, db: AsyncSession) -> None:
+    """Full recompute from logs: rebuild runs, then Streak row. Repair path; routes use add/remove_streak_day."""
+    habit = await db.get(Habit, habit_id)
+    if not habit:
+        return
+    await _lock_pair(habit_id, user_id, db)
+    await rebuild_streak_runs(habit, user_id, db)
+    await sync_streak_from_runs(habit_id, user_id, db)
@@ -0,0 +1,160 @@
+"""Weekly completion counters for times_per_week habits, updated in the caller's transaction."""
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, func, update, delete, and_, cast, Date, Boolean, Integer, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Habit, HabitLog, HabitType, HabitWeekCounter
+
+
+def week_start_of(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def _logs_in_week(habit_id: UUID, user_id: UUID, week_start: date):
+    return and_(
+        HabitLog.habit_id == habit_id,
+        HabitLog.user_id == user_id,
+        HabitLog.date >= week_start,
+        HabitLog.date <= week_start + timedelta(days=6),
+    )
+
+
+def _seed_from_logs(habit_id: UUID, user_id: UUID, week_start: date):
+    """SELECT that seeds a missing counter row from logs (weeks logged before counters existed)."""
+    return select(
+        literal(habit_id, HabitLog.habit_id.type),
+        literal(user_id, HabitLog.user_id.type),
+        literal(week_start, Date),
+        func.count(HabitLog.id),
+        func.coalesce(func.bool_or(HabitLog.xp_earned > 0), False),
+    ).where(_logs_in_week(habit_id, user_id, week_start))
+
+
+async def increment_week_counter(
+    habit_id: UUID, user_id: UUID, day: date, db: AsyncSession, by: int = 1
+) -> Tuple[int, bool]:
+    """Count `by` new logs for day's week. Call after the log rows are written. Returns (count, xp_awarded)."""
+    ws = week_start_of(day)
+    table = HabitWeekCounter.__table__
+    stmt = pg_insert(table).from_select(
+        ["habit_id", "user_id", "week_start", "count", "xp_awarded"], _seed_from_logs(habit_id, user_id, ws)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["habit_id", "user_id", "week_start"],
+        set_={"count": table.c.count + by},
+    ).returning(table.c.count, table.c.xp_awarded)
+    count, awarded = (await db.execute(stmt)).one()
+    return count, awarded
+
+
+async def decrement_week_counter(habit_id: UUID, user_id: UUID, day: date, db: AsyncSession) -> None:
+    """Uncount a removed log. Call after the log row is deleted and flushed."""
+    ws = week_start_of(day)
+    table = HabitWeekCounter.__table__
+    stmt = pg_insert(table).from_select(
+        ["habit_id", "user_id", "week_start", "count", "xp_awarded"], _seed_from_logs(habit_id, user_id, ws)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["habit_id", "user_id", "week_start"],
+        set_={"count": func.greatest(table.c.count - 1, 0)},
+    )
+    await db.execute(stmt)
+
+
+async def claim_week_xp(habit_id: UUID, user_id: UUID, day: date, target: int, db: AsyncSession) -> bool:
+    """Atomically flag the week's XP as awarded if the target is reached and it was not awarded yet."""
+    result = await db.execute(
+        update(HabitWeekCounter)
+        .where(
+            HabitWeekCounter.habit_id == habit_id,
+            HabitWeekCounter.user_id == user_id,
+            HabitWeekCounter.week_start == week_start_of(day),
+            HabitWeekCounter.count >= target,
+            HabitWeekCounter.xp_awarded == False,
+        )
+        .values(xp_awarded=True)
+        .returning(HabitWeekCounter.count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first() is not None
+
+
+async def get_week_count(habit_id: UUID, user_id: UUID, day: date, db: AsyncSession) -> int:
+    """Primary-key lookup; weeks without a counter row fall back to counting logs."""
+    ws = week_start_of(day)
+    count = await db.scalar(
+        select(HabitWeekCounter.count).where(
+            HabitWeekCounter.habit_id == habit_id,
+            HabitWeekCounter.user_id == user_id,
+            HabitWeekCounter.week_start == ws,
+        )
+    )
+    if count is not None:
+        return count
+    return await db.scalar(select(func.count(HabitLog.id)).where(_logs_in_week(habit_id, user_id, ws))) or 0
+
+
+async def get_week_counts(habit_ids: Sequence[UUID], user_id: UUID, day: date, db: AsyncSession) -> Dict[UUID, int]:
+    """get_week_count for several habits: one lookup of the counter rows, plus one grouped log count only if
+    some habit has no counter row for the week."""
+    ws = week_start_of(day)
+    counts = dict(
+        (
+            await db.execute(
+                select(HabitWeekCounter.habit_id, HabitWeekCounter.count).where(
+                    HabitWeekCounter.habit_id.in_(habit_ids),
+                    HabitWeekCounter.user_id == user_id,
+                    HabitWeekCounter.week_start == ws,
+                )
+            )
+        ).all()
+    )
+    missing = [h for h in habit_ids if h not in counts]
+    if missing:
+        counts.update(
+            (
+                await db.execute(
+                    select(HabitLog.habit_id, func.count(HabitLog.id))
+                    .where(
+                        HabitLog.habit_id.in_(missing),
+                        HabitLog.user_id == user_id,
+                        HabitLog.date >= ws,
+                        HabitLog.date <= ws + timedelta(days=6),
+                    )
+                    .group_by(HabitLog.habit_id)
+                )
+            ).all()
+        )
+    return {h: counts.get(h, 0) for h in habit_ids}
+
+
+async def rebuild_week_counters(db: AsyncSession, habit_id: Optional[UUID] = None) -> int:
+    """Recreate counters from habit_logs (all times_per_week habits, or one habit). Returns rows written."""
+    week = cast(func.date_trunc("week", HabitLog.date), Date)
+    source = (
+        select(
+            HabitLog.habit_id,
+            HabitLog.user_id,
+            week,
+            cast(func.count(HabitLog.id), Integer),
+            cast(func.bool_or(HabitLog.xp_earned > 0), Boolean),
+        )
+        .join(Habit, Habit.id == HabitLog.habit_id)
+        .where(Habit.type == HabitType.TIMES_PER_WEEK)
+        .group_by(HabitLog.habit_id, HabitLog.user_id, week)
+    )
+    clear = delete(HabitWeekCounter)
+    if habit_id is not None:
+        source = source.where(HabitLog.habit_id == habit_id)
+        clear = clear.where(HabitWeekCounter.habit_id == habit_id)
+    await db.execute(clear)
+    result = await db.execute(
+        pg_insert(HabitWeekCounter.__table__).from_select(
+            ["habit_id", "user_id", "week_start", "count", "xp_awarded"], source
+        )
+    )
+    return result.rowcount or 0
@@ -0,0 +1,206 @@
+"""Append-only XP ledger. Every award or removal is a row; totals and rollups are projections of it, updated in
+the same transaction as the append. Callers own the commit.
+
+Lifetime totals (users/families.total_xp and level) count every source except LOG_REMOVED: uncompleting a habit
+never revokes earned XP. Period rollups (daily, weekly) count every source except OPENING_BALANCE, which is
+pre-ledger XP without a meaningful date.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import select, func, insert, update, cast, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import (
+    User, Family, HabitLog, XpLedger, XpSource, UserXpDaily, UserXpWeekly, FamilyXpDaily, FamilyXpWeekly,
+)
+from .data_version import bump_family_version
+from .xp_service import calculate_level, update_user_xp, update_family_xp
+
+LIFETIME_EXCLUDED = XpSource.LOG_REMOVED
+PERIOD_EXCLUDED = XpSource.OPENING_BALANCE
+
+
+@dataclass(frozen=True)
+class XpEntry:
+    source: XpSource
+    amount: int
+    occurred_on: date
+    habit_id: Optional[UUID] = None
+    habit_log_id: Optional[UUID] = None
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+async def _add_to_rollup(db: AsyncSession, model, owner_col, period_col, owner_id: UUID, amounts: Dict[date, int]):
+    rows = [{owner_col.key: owner_id, period_col.key: d, "xp": xp} for d, xp in amounts.items() if xp]
+    if not rows:
+        return
+    stmt = pg_insert(model).values(rows)
+    await db.execute(
+        stmt.on_conflict_do_update(index_elements=[owner_col, period_col], set_={"xp": model.xp + stmt.excluded.xp})
+    )
+
+
+async def _append(
+    db: AsyncSession, entries: Sequence[XpEntry], user_id: Optional[UUID] = None, family_id: Optional[UUID] = None
+) -> int:
+    """Insert the ledger rows and bump the owner's daily and weekly rollups. Returns the lifetime delta."""
+    entries = [e for e in entries if e.amount]
+    if not entries:
+        return 0
+    await db.execute(
+        insert(XpLedger).values(
+            [
+                {
+                    "user_id": user_id,
+                    "family_id": family_id,
+                    "source": e.source,
+                    "amount": e.amount,
+                    "occurred_on": e.occurred_on,
+                    "habit_id": e.habit_id,
+                    "habit_log_id": e.habit_log_id,
+                }
+                for e in entries
+            ]
+        )
+    )
+    daily: Dict[date, int] = defaultdict(int)
+    weekly: Dict[date, int] = defaultdict(int)
+    for e in entries:
+        if e.source != PERIOD_EXCLUDED:
+            daily[e.occurred_on] += e.amount
+            weekly[week_start(e.occurred_on)] += e.amount
+    if user_id is not None:
+        await _add_to_rollup(db, UserXpDaily, UserXpDaily.user_id, UserXpDaily.day, user_id, daily)
+        await _add_to_rollup(db, UserXpWeekly, UserXpWeekly.user_id, UserXpWeekly.week_start, user_id, weekly)
+    else:
+        await _add_to_rollup(db, FamilyXpDaily, FamilyXpDaily.family_id, FamilyXpDaily.day, family_id, daily)
+        await _add_to_rollup(db, FamilyXpWeekly, FamilyXpWeekly.family_id, FamilyXpWeekly.week_start, family_id, weekly)
+    return sum(e.amount for e in entries if e.source != LIFETIME_EXCLUDED)
+
+
+async def award_user_xp(user: User, entries: Sequence[XpEntry], db: AsyncSession) -> Dict[str, Any]:
+    """Record the user's XP entries, then move the cached total/level (same result dict as update_user_xp).
+
+    Lock order: this locks the user's rollup rows, so callers touch them before the family's quest rows
+    (add_quest_xp / remove_quest_xp); taking the two in the other order can deadlock a concurrent completion."""
+    delta = await _append(db, entries, user_id=user.id)
+    return await update_user_xp(user, delta, db)
+
+
+async def award_family_xp(family_id: UUID, entries: Sequence[XpEntry], db: AsyncSession) -> Dict[str, Any]:
+    delta = await _append(db, entries, family_id=family_id)
+    return await update_family_xp(family_id, delta, db)
+
+
+async def remove_log_xp(log: HabitLog, db: AsyncSession) -> None:
+    """Take a deleted log's XP out of the periods it was counted in; the lifetime total keeps it.
+    Call before remove_quest_xp (lock order, see award_user_xp)."""
+    await _append(
+        db,
+        [XpEntry(XpSource.LOG_REMOVED, -log.xp_earned, log.date, log.habit_id, log.id)],
+        user_id=log.user_id,
+    )
+
+
+@dataclass
+class Mismatch:
+    kind: str  # user_total, family_total, user_daily, user_weekly, family_daily, family_weekly
+    owner_id: UUID
+    period: Optional[date]
+    stored: int
+    expected: int
+
+
+async def _total_mismatches(db: AsyncSession, model, owner_col, kind: str) -> List[Mismatch]:
+    expected = (
+        select(owner_col.label("owner_id"), func.sum(XpLedger.amount).label("xp"))
+        .where(owner_col.is_not(None), XpLedger.source != LIFETIME_EXCLUDED)
+        .group_by(owner_col)
+        .subquery()
+    )
+    xp = func.coalesce(expected.c.xp, 0)
+    rows = await db.execute(
+        select(model.id, model.total_xp, xp)
+        .outerjoin(expected, expected.c.owner_id == model.id)
+        .where(model.total_xp != xp)
+    )
+    return [Mismatch(kind, oid, None, stored, int(exp)) for oid, stored, exp in rows]
+
+
+async def _rollup_mismatches(
+    db: AsyncSession, model, owner_col, period_col, ledger_owner, kind: str
+) -> List[Mismatch]:
+    if period_col.key == "day":
+        period = XpLedger.occurred_on
+    else:
+        period = cast(func.date_trunc("week", XpLedger.occurred_on), Date)
+    expected = (
+        select(ledger_owner.label("owner_id"), period.label("period"), func.sum(XpLedger.amount).label("xp"))
+        .where(ledger_owner.is_not(None), XpLedger.source != PERIOD_EXCLUDED)
+        .group_by(ledger_owner, period)
+        .subquery()
+    )
+    stored = select(owner_col.label("owner_id"), period_col.label("period"), model.xp.label("xp")).subquery()
+    rows = await db.execute(
+        select(
+            func.coalesce(stored.c.owner_id, expected.c.owner_id),
+            func.coalesce(stored.c.period, expected.c.period),
+            func.coalesce(stored.c.xp, 0),
+            func.coalesce(expected.c.xp, 0),
+        )
+        .select_from(stored)
+        .join(
+            expected,
+            (stored.c.owner_id == expected.c.owner_id) & (stored.c.period == expected.c.period),
+            full=True,
+        )
+        .where(func.coalesce(stored.c.xp, 0) != func.coalesce(expected.c.xp, 0))
+    )
+    return [Mismatch(kind, oid, p, int(s), int(e)) for oid, p, s, e in rows]
+
+
+_ROLLUPS = {
+    "user_daily": (UserXpDaily, UserXpDaily.user_id, UserXpDaily.day, XpLedger.user_id),
+    "user_weekly": (UserXpWeekly, UserXpWeekly.user_id, UserXpWeekly.week_start, XpLedger.user_id),
+    "family_daily": (FamilyXpDaily, FamilyXpDaily.family_id, FamilyXpDaily.day, XpLedger.family_id),
+    "family_weekly": (FamilyXpWeekly, FamilyXpWeekly.family_id, FamilyXpWeekly.week_start, XpLedger.family_id),
+}
+
+
+async def verify_ledger(db: AsyncSession, fix: bool = False) -> List[Mismatch]:
+    """Compare stored totals and rollups with the ledger. With fix, overwrite the stored side with the ledger's
+    value (the ledger itself is never changed). Returns what differed."""
+    mismatches = await _total_mismatches(db, User, XpLedger.user_id, "user_total")
+    mismatches += await _total_mismatches(db, Family, XpLedger.family_id, "family_total")
+    for kind, (model, owner_col, period_col, ledger_owner) in _ROLLUPS.items():
+        mismatches += await _rollup_mismatches(db, model, owner_col, period_col, ledger_owner, kind)
+    if fix:
+        for m in mismatches:
+            if m.kind in ("user_total", "family_total"):
+                model = User if m.kind == "user_total" else Family
+                await db.execute(
+                    update(model)
+                    .where(model.id == m.owner_id)
+                    .values(total_xp=m.expected, level=calculate_level(max(0, m.expected)))
+                    .execution_options(synchronize_session=False)
+                )
+            else:
+                model, owner_col, period_col, _ = _ROLLUPS[m.kind]
+                stmt = pg_insert(model).values({owner_col.key: m.owner_id, period_col.key: m.period, "xp": m.expected})
+                await db.execute(
+                    stmt.on_conflict_do_update(index_elements=[owner_col, period_col], set_={"xp": stmt.excluded.xp})
+                )
+        user_ids = {m.owner_id for m in mismatches if m.kind.startswith("user_")}
+        family_ids = {m.owner_id for m in mismatches if m.kind.startswith("family_")}
+        if user_ids:
+            family_ids.update(await db.scalars(select(User.family_id).where(User.id.in_(user_ids))))
+        await bump_family_version(db, *family_ids)
+    return mismatches
@@ -0,0 +1,48 @@
+"""Period leaderboards, served from the XP rollups that app.services.xp_ledger maintains."""
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import User, UserXpDaily, UserXpWeekly
+
+PERIODS = ("week", "month", "all")
+
+
+def period_range(period: str, today: date) -> Optional[Tuple[date, date]]:
+    """Current ISO week or calendar month up to today; None for all-time. ValueError for unknown periods."""
+    if period == "week":
+        return today - timedelta(days=today.weekday()), today
+    if period == "month":
+        return today.replace(day=1), today
+    if period == "all":
+        return None
+    raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+
+
+async def family_leaderboard(
+    family_id: UUID, period: str, db: AsyncSession, today: Optional[date] = None
+) -> List[Tuple[User, int]]:
+    """Family members with their XP for the period, best first. A week reads one weekly rollup row per member,
+    a month at most 31 daily rows; all-time uses the lifetime total on users."""
+    bounds = period_range(period, today or date.today())
+    if bounds is None:
+        members = (
+            await db.scalars(select(User).where(User.family_id == family_id).order_by(User.total_xp.desc()))
+        ).all()
+        return [(m, m.total_xp) for m in members]
+    start, end = bounds
+    if period == "week":
+        rollup = and_(UserXpWeekly.user_id == User.id, UserXpWeekly.week_start == start)
+        period_xp = func.coalesce(func.sum(UserXpWeekly.xp), 0).label("period_xp")
+        query = select(User, period_xp).outerjoin(UserXpWeekly, rollup)
+    else:
+        rollup = and_(UserXpDaily.user_id == User.id, UserXpDaily.day >= start, UserXpDaily.day <= end)
+        period_xp = func.coalesce(func.sum(UserXpDaily.xp), 0).label("period_xp")
+        query = select(User, period_xp).outerjoin(UserXpDaily, rollup)
+    rows = await db.execute(
+        query.where(User.family_id == family_id).group_by(User.id).order_by(period_xp.desc(), User.total_xp.desc())
+    )
+    return [(user, int(xp)) for user, xp in rows]
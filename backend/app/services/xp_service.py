@@ -1,11 +1,13 @@
-"""XP and level calculation. Uses enums for comparisons."""
+"""XP and level calculation. Uses enums for comparisons. Nothing here commits: callers own the transaction."""
 from math import sqrt
 from datetime import date, timedelta
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, update, cast, and_, Integer
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, Optional
 
-from ..models import User, HabitLog, Streak, Habit, PrivacyType, HabitType
+from ..models import User, Family, HabitLog, HabitWeekCounter, Streak, Habit, PrivacyType, HabitType
 
 
 def calculate_level(total_xp: int) -> int:
@@ -17,22 +19,38 @@ def calculate_xp_for_next_level(level: int, total_xp: int) -> int:
     return max(0, xp_for_level - total_xp)
 
 
-def update_user_xp(user: User, xp_amount: int, db: Session) -> Dict[str, Any]:
-    old_level = user.level
-    user.total_xp += xp_amount
-    new_level = calculate_level(user.total_xp)
-    level_up = new_level > old_level
-    user.level = new_level
-    db.commit()
+async def _increment_xp(model, row_id, xp_amount: int, db: AsyncSession) -> Dict[str, Any]:
+    """Atomic total_xp += xp_amount with level recomputed in the same UPDATE (no read-modify-write)."""
+    new_total_expr = model.total_xp + xp_amount
+    stmt = (
+        update(model)
+        .where(model.id == row_id)
+        .values(
+            total_xp=new_total_expr,
+            level=cast(func.floor(func.sqrt(new_total_expr / 100.0)), Integer) + 1,
+        )
+        .returning(model.total_xp, model.level)
+        .execution_options(synchronize_session=False)
+    )
+    total_xp, new_level = (await db.execute(stmt)).one()
+    old_level = calculate_level(total_xp - xp_amount)
     return {
-        "level_up": level_up,
+        "level_up": new_level > old_level,
         "old_level": old_level,
         "new_level": new_level,
-        "total_xp": user.total_xp,
-        "xp_for_next_level": calculate_xp_for_next_level(new_level, user.total_xp),
+        "total_xp": total_xp,
+        "xp_for_next_level": calculate_xp_for_next_level(new_level, total_xp),
     }
 
 
+async def update_user_xp(user: User, xp_amount: int, db: AsyncSession) -> Dict[str, Any]:
+    """Move the cached lifetime total; XP is awarded through xp_ledger.award_user_xp, which calls this."""
+    result = await _increment_xp(User, user.id, xp_amount, db)
+    set_committed_value(user, "total_xp", result["total_xp"])
+    set_committed_value(user, "level", result["new_level"])
+    return result
+
+
 def get_effective_daily_target(habit: Habit, user_id: UUID, log_date: date) -> Optional[float]:
     """For quantity habits: return the target number for this user on this date (by_user + goal_effective_from)."""
     tv = habit.target_value or {}
@@ -66,7 +84,7 @@ def get_effective_weekly_target(habit: Habit, user_id: UUID, log_date: date) ->
     return int(default)
 
 
-def habit_completion_counts(habit: Habit, value: Optional[Dict], log_date: date, user_id: UUID, db: Session) -> bool:
+def habit_completion_counts(habit: Habit, value: Optional[Dict], log_date: date, user_id: UUID, db: AsyncSession) -> bool:
     """True if this completion counts toward XP/streak (goal met for quantity/scale; always for boolean)."""
     if habit.type == HabitType.BOOLEAN:
         return True
@@ -102,107 +120,24 @@ def habit_completion_counts(habit: Habit, value: Optional[Dict], log_date: date,
     return True
 
 
-def recalc_streak(habit_id: UUID, user_id: UUID, db: Session) -> None:
-    """Recompute streak from logs after uncomplete or backdate. Updates Streak row."""
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
-    if not habit:
-        return
-    logs = (
-        db.query(HabitLog)
-        .filter(HabitLog.habit_id == habit_id, HabitLog.user_id == user_id)
-        .order_by(HabitLog.date.desc())
-        .all()
-    )
-    completed_dates = set()
-    for log in logs:
-        if habit_completion_counts(habit, log.value, log.date, user_id, db):
-            completed_dates.add(log.date)
-    today = date.today()
-    current = 0
-    d = today
-    while d in completed_dates:
-        current += 1
-        d -= timedelta(days=1)
-    longest = current
-    run = 0
-    sorted_dates = sorted(completed_dates, reverse=True)
-    for i, d in enumerate(sorted_dates):
-        if i == 0 or (sorted_dates[i - 1] - d).days == 1:
-            run += 1
-        else:
-            run = 1
-        longest = max(longest, run)
-    streak = db.query(Streak).filter(Streak.habit_id == habit_id, Streak.user_id == user_id).first()
-    if streak:
-        streak.current_streak = current
-        streak.longest_streak = max(streak.longest_streak, longest)
-        streak.last_completed_date = max(completed_dates) if completed_dates else None
-    else:
-        if completed_dates:
-            streak = Streak(
-                habit_id=habit_id,
-                user_id=user_id,
-                current_streak=current,
-                longest_streak=longest,
-                last_completed_date=max(completed_dates),
-            )
-            db.add(streak)
-    db.commit()
+def streak_milestone_bonus(length: int) -> int:
+    """Bonus XP for a streak reaching exactly length days: 3, 7, 30 and every further 30."""
+    if length == 3:
+        return 10
+    if length == 7:
+        return 25
+    if length and length % 30 == 0:
+        return 100
+    return 0
 
 
-def update_streak(habit_id, user_id, db: Session) -> Dict[str, Any]:
-    today = date.today()
-    yesterday = today - timedelta(days=1)
-    streak = db.query(Streak).filter(Streak.habit_id == habit_id, Streak.user_id == user_id).first()
-    if not streak:
-        streak = Streak(
-            habit_id=habit_id,
-            user_id=user_id,
-            current_streak=1,
-            longest_streak=1,
-            last_completed_date=today,
-        )
-        db.add(streak)
-    else:
-        if streak.last_completed_date == yesterday:
-            streak.current_streak += 1
-        elif streak.last_completed_date == today:
-            db.commit()
-            return {
-                "current_streak": streak.current_streak,
-                "bonus_xp": 0,
-                "milestone": None,
-            }
-        else:
-            streak.current_streak = 1
-        streak.last_completed_date = today
-        streak.longest_streak = max(streak.longest_streak, streak.current_streak)
-    db.commit()
-
-    bonus_xp = 0
-    milestone = None
-    if streak.current_streak == 3:
-        bonus_xp = 10
-        milestone = "3-day streak!"
-    elif streak.current_streak == 7:
-        bonus_xp = 25
-        milestone = "7-day streak!"
-    elif streak.current_streak == 30:
-        bonus_xp = 100
-        milestone = "30-day streak!"
-    elif streak.current_streak and streak.current_streak % 30 == 0:
-        bonus_xp = 100
-        milestone = f"{streak.current_streak}-day streak!"
-    return {
-        "current_streak": streak.current_streak,
-        "longest_streak": streak.longest_streak,
-        "bonus_xp": bonus_xp,
-        "milestone": milestone,
-    }
+def streak_bonus(before: int, after: int) -> int:
+    """Bonus XP for a run growing from before to after days: every milestone passed on the way, once."""
+    return sum(streak_milestone_bonus(n) for n in range(before + 1, after + 1))
 
 
-def get_user_stats(user: User, db: Session) -> Dict[str, Any]:
-    streaks = db.query(Streak).filter(Streak.user_id == user.id).all()
+async def get_user_stats(user: User, db: AsyncSession) -> Dict[str, Any]:
+    streaks = (await db.scalars(select(Streak).where(Streak.user_id == user.id))).all()
     return {
         "level": user.level,
         "total_xp": user.total_xp,
@@ -214,70 +149,61 @@ def get_user_stats(user: User, db: Session) -> Dict[str, Any]:
     }
 
 
-def update_family_xp(family, xp_amount: int, db: Session) -> Dict[str, Any]:
-    old_level = family.level
-    family.total_xp += xp_amount
-    new_level = calculate_level(family.total_xp)
-    level_up = new_level > old_level
-    family.level = new_level
-    db.commit()
-    return {
-        "level_up": level_up,
-        "old_level": old_level,
-        "new_level": new_level,
-        "total_xp": family.total_xp,
-        "xp_for_next_level": calculate_xp_for_next_level(new_level, family.total_xp),
-    }
+async def update_family_xp(family_id: UUID, xp_amount: int, db: AsyncSession) -> Dict[str, Any]:
+    return await _increment_xp(Family, family_id, xp_amount, db)
 
 
-def check_all_adults_completed_shared_habit(habit: Habit, completion_date: date, db: Session) -> bool:
-    """True if habit is SHARED and every family member has met their own goal for this date (or week for times_per_week)."""
+async def check_all_adults_completed_shared_habit(habit: Habit, completion_date: date, db: AsyncSession) -> bool:
+    """True if habit is SHARED and every family member has met their own goal for this date (or week for times_per_week).
+    One query returns every member with their log (or weekly counter); goals are checked in memory."""
     if habit.privacy != PrivacyType.SHARED:
         return False
-    family_members = db.query(User).filter(User.family_id == habit.family_id).all()
-    if not family_members:
-        return False
     if habit.type == HabitType.TIMES_PER_WEEK:
-        for member in family_members:
-            if not _shared_member_weekly_goal_met(habit, member.id, completion_date, db):
+        week_start = completion_date - timedelta(days=completion_date.weekday())
+        rows = (
+            await db.execute(
+                select(User.id, func.coalesce(HabitWeekCounter.count, 0))
+                .outerjoin(
+                    HabitWeekCounter,
+                    and_(
+                        HabitWeekCounter.user_id == User.id,
+                        HabitWeekCounter.habit_id == habit.id,
+                        HabitWeekCounter.week_start == week_start,
+                    ),
+                )
+                .where(User.family_id == habit.family_id)
+            )
+        ).all()
+        if not rows:
+            return False
+        for member_id, count in rows:
+            target = get_effective_weekly_target(habit, member_id, completion_date)
+            if target is None or count < target:
                 return False
         return True
-    for member in family_members:
-        log = (
-            db.query(HabitLog)
-            .filter(
-                HabitLog.habit_id == habit.id,
-                HabitLog.user_id == member.id,
-                HabitLog.date == completion_date,
+    rows = (
+        await db.execute(
+            select(User.id, HabitLog.id, HabitLog.value)
+            .outerjoin(
+                HabitLog,
+                and_(
+                    HabitLog.user_id == User.id,
+                    HabitLog.habit_id == habit.id,
+                    HabitLog.date == completion_date,
+                ),
             )
-            .first()
+            .where(User.family_id == habit.family_id)
         )
-        if not log or not habit_completion_counts(habit, log.value, completion_date, member.id, db):
+    ).all()
+    if not rows:
+        return False
+    for member_id, log_id, value in rows:
+        if log_id is None or not habit_completion_counts(habit, value, completion_date, member_id, db):
             return False
     return True
 
 
-def _shared_member_weekly_goal_met(habit: Habit, user_id: UUID, any_date_in_week: date, db: Session) -> bool:
-    """For TIMES_PER_WEEK SHARED: whether this user reached their weekly target in the week of any_date_in_week."""
-    target = get_effective_weekly_target(habit, user_id, any_date_in_week)
-    if target is None:
-        return False
-    week_start = any_date_in_week - timedelta(days=any_date_in_week.weekday())
-    week_end = week_start + timedelta(days=6)
-    count = (
-        db.query(HabitLog)
-        .filter(
-            HabitLog.habit_id == habit.id,
-            HabitLog.user_id == user_id,
-            HabitLog.date >= week_start,
-            HabitLog.date <= week_end,
-        )
-        .count()
-    )
-    return count >= target
-
-
-def get_family_stats(family, db: Session) -> Dict[str, Any]:
+def get_family_stats(family, db: AsyncSession) -> Dict[str, Any]:
     return {
         "level": family.level,
         "total_xp": family.total_xp,
@@ -0,0 +1,59 @@
+"""Back up a range of diary days to GitHub, many day files per commit; unchanged days are skipped.
+
+Usage (from backend/): python -m app.tasks.backfill_diary --start 2025-01-01 [--end 2025-03-31]
+                       [--family-id UUID] [--force]
+"""
+import argparse
+import asyncio
+import logging
+from datetime import date, timedelta
+from uuid import UUID
+
+from ..database import session_scope, engine
+from ..services.github_service import close_github_client
+from ..services.diary_backup import sync_diary
+
+logger = logging.getLogger(__name__)
+
+WINDOW_DAYS = 31  # each window is recorded in its own transaction, so an interrupted backfill keeps its progress
+
+
+async def backfill(start: date, end: date, family_id: UUID | None = None, force: bool = False) -> int:
+    failed = 0
+    try:
+        window_start = start
+        while window_start <= end:
+            window_end = min(end, window_start + timedelta(days=WINDOW_DAYS - 1))
+            async with session_scope() as db:
+                summary = await sync_diary(db, window_start, window_end, family_id, force)
+            logger.info(
+                "%s..%s: %s uploaded in %s commits, %s unchanged, %s failed in %.1fs",
+                window_start, window_end, summary.uploaded, len(summary.commits), summary.unchanged,
+                len(summary.failed), summary.seconds,
+            )
+            for path, error in summary.failed.items():
+                logger.warning("%s failed: %s", path, error)
+            failed += len(summary.failed)
+            window_start = window_end + timedelta(days=1)
+    finally:
+        await close_github_client()
+        await engine.dispose()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up diary days to GitHub (changed days only).")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="inclusive (default: today)")
+    parser.add_argument("--family-id", type=UUID, default=None, help="only this family (default: all)")
+    parser.add_argument("--force", action="store_true", help="re-upload days whose content did not change")
+    args = parser.parse_args()
+    if args.end < args.start:
+        parser.error("--end is before --start")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    failed = asyncio.run(backfill(args.start, args.end, args.family_id, args.force))
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,91 @@
 """Optional cron jobs. One session per job, always closed in finally. Do not block startup on failure."""
 import logging
-from datetime import date, datetime
+from datetime import date, timedelta
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from ..database import session_scope
-from ..models import BabyEvent, FamilyQuest, User, HabitLog
 
 logger = logging.getLogger(__name__)
 
 
 async def daily_backup_job():
-    """Export today's baby events to GitHub per family. Optional: skip if GitHub not configured."""
+    """Back up the last GITHUB_BACKUP_CATCHUP_DAYS days to GitHub; unchanged days are skipped, so late edits
+    and missed nights are picked up. Optional: skip if GitHub not configured."""
     logger.info("Daily backup job starting...")
-    with session_scope() as db:
+    async with session_scope() as db:
         try:
-            family_ids = [f[0] for f in db.query(User.family_id).distinct().all() if f[0]]
+            from ..config import get_settings
+            from ..services.diary_backup import sync_diary
             today = date.today()
-            start_dt = datetime.combine(today, datetime.min.time())
-            end_dt = datetime.combine(today, datetime.max.time())
-            for fid in family_ids:
-                try:
-                    events = (
-                        db.query(BabyEvent)
-                        .filter(
-                            BabyEvent.family_id == fid,
-                            BabyEvent.created_at >= start_dt,
-                            BabyEvent.created_at <= end_dt,
-                        )
-                        .all()
-                    )
-                    if events:
-                        from ..services.github_service import commit_to_github
-                        result = await commit_to_github(events, today)
-                        logger.info("Backed up family %s: %s", fid, result.get("sha", "N/A"))
-                except ValueError:
-                    pass
-                except Exception as e:
-                    logger.warning("Backup family %s failed: %s", fid, e)
+            start = today - timedelta(days=max(1, get_settings().GITHUB_BACKUP_CATCHUP_DAYS) - 1)
+            try:
+                summary = await sync_diary(db, start, today)
+            except ValueError:
+                return
+            logger.info(
+                "Daily backup %s..%s: %s uploaded in %s commits, %s unchanged, %s failed in %.1fs",
+                start, today, summary.uploaded, len(summary.commits), summary.unchanged, len(summary.failed),
+                summary.seconds,
+            )
+            for path, error in summary.failed.items():
+                logger.warning("Backup %s failed: %s", path, error)
         except Exception as e:
             logger.warning("Daily backup job failed: %s", e)
 
 
 async def update_family_quests_job():
-    """Recalc family quest progress and mark completed; notify if just completed."""
+    """Reconcile quest progress with habit logs (completions update it live); notify quests this run completed."""
     logger.info("Update family quests job starting...")
-    with session_scope() as db:
+    async with session_scope() as db:
         try:
-            today = date.today()
-            active = (
-                db.query(FamilyQuest)
-                .filter(FamilyQuest.is_completed == False, FamilyQuest.end_date >= today)
-                .all()
-            )
-            from sqlalchemy import func
-            for quest in active:
-                try:
-                    sum_xp = db.query(func.coalesce(func.sum(HabitLog.xp_earned), 0)).join(
-                        User, HabitLog.user_id == User.id
-                    ).filter(
-                        User.family_id == quest.family_id,
-                        HabitLog.date >= quest.start_date,
-                        HabitLog.date <= quest.end_date,
-                    ).scalar() or 0
-                    quest.current_xp = min(int(sum_xp), quest.target_xp)
-                    if quest.current_xp >= quest.target_xp:
-                        quest.is_completed = True
-                        from ..telegram.bot import notify_family_quest_completed
-                        await notify_family_quest_completed(str(quest.family_id), quest.name, db)
-                except Exception as e:
-                    logger.warning("Quest %s update failed: %s", quest.id, e)
+            from ..services.quest_service import reconcile_quests
+            completed = await reconcile_quests(db)
+            from ..telegram.bot import notify_family_quest_completed
+            for family_id, quest_name in completed:
+                await notify_family_quest_completed(str(family_id), quest_name, db)
         except Exception as e:
             logger.warning("Update quests job failed: %s", e)
 
 
+async def purge_idempotency_keys_job():
+    """Drop stored idempotency responses older than a day."""
+    async with session_scope() as db:
+        try:
+            from ..services.idempotency import purge_expired
+            removed = await purge_expired(db)
+            logger.info("Purged %s idempotency keys", removed)
+        except Exception as e:
+            logger.warning("Purge idempotency keys failed: %s", e)
+
+
+async def purge_notifications_job():
+    """Drop sent or abandoned outbox rows older than a week."""
+    async with session_scope() as db:
+        try:
+            from ..telegram.outbox import purge_sent
+            removed = await purge_sent(db)
+            logger.info("Purged %s outbox notifications", removed)
+        except Exception as e:
+            logger.warning("Purge outbox failed: %s", e)
+
+
+async def verify_xp_ledger_job():
+    """Report XP totals or rollups that drifted from the ledger (repair: python -m app.tasks.verify_xp_ledger --fix)."""
+    async with session_scope() as db:
+        try:
+            from ..services.xp_ledger import verify_ledger
+            mismatches = await verify_ledger(db)
+            for m in mismatches[:20]:
+                logger.warning(
+                    "XP %s %s %s: stored %s, ledger %s", m.kind, m.owner_id, m.period or "", m.stored, m.expected
+                )
+            logger.info("XP ledger verified: %s mismatches", len(mismatches))
+        except Exception as e:
+            logger.warning("XP ledger verification failed: %s", e)
+
+
 def setup_scheduler() -> AsyncIOScheduler:
     """Start scheduler. Call from lifespan; on failure log and continue."""
     scheduler = AsyncIOScheduler()
@@ -90,6 +101,24 @@ def setup_scheduler() -> AsyncIOScheduler:
         id="update_quests",
         replace_existing=True,
     )
+    scheduler.add_job(
+        purge_idempotency_keys_job,
+        trigger=CronTrigger(hour=3, minute=30),
+        id="purge_idempotency_keys",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        purge_notifications_job,
+        trigger=CronTrigger(hour=3, minute=45),
+        id="purge_notifications",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        verify_xp_ledger_job,
+        trigger=CronTrigger(hour=4, minute=0),
+        id="verify_xp_ledger",
+        replace_existing=True,
+    )
     scheduler.start()
     logger.info("Scheduler started")
     return scheduler
@@ -0,0 +1,33 @@
+"""Rebuild habit_week_counters from habit_logs.
+
+Usage (from backend/): python -m app.tasks.repair_week_counters [--habit-id UUID]
+"""
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from ..database import session_scope, engine
+from ..services.week_counters import rebuild_week_counters
+
+logger = logging.getLogger(__name__)
+
+
+async def repair(habit_id: UUID | None = None) -> int:
+    async with session_scope() as db:
+        rows = await rebuild_week_counters(db, habit_id)
+    await engine.dispose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild weekly counters for times_per_week habits from logs.")
+    parser.add_argument("--habit-id", type=UUID, default=None, help="only this habit (default: all)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    rows = asyncio.run(repair(args.habit_id))
+    logger.info("Rebuilt %s week counter rows", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Check users/families.total_xp and the XP rollups against the xp_ledger.
+
+Usage (from backend/): python -m app.tasks.verify_xp_ledger [--fix]
+Exits 1 if anything differed (after fixing, with --fix).
+"""
+import argparse
+import asyncio
+import logging
+
+from ..database import session_scope, engine
+from ..services.xp_ledger import Mismatch, verify_ledger
+
+logger = logging.getLogger(__name__)
+
+
+async def verify(fix: bool = False) -> list[Mismatch]:
+    async with session_scope() as db:
+        mismatches = await verify_ledger(db, fix=fix)
+    await engine.dispose()
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify XP totals and rollups against the ledger.")
+    parser.add_argument("--fix", action="store_true", help="overwrite differing totals/rollups with the ledger's value")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    mismatches = asyncio.run(verify(args.fix))
+    for m in mismatches:
+        logger.warning("%s %s %s: stored %s, ledger %s", m.kind, m.owner_id, m.period or "", m.stored, m.expected)
+    logger.info("%s mismatches%s", len(mismatches), " fixed" if args.fix and mismatches else "")
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
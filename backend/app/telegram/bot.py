@@ -1,46 +1,60 @@
 """Telegram bot: /start, menu button, notifications. Uses config, no os.getenv in handlers."""
 import asyncio
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import get_settings
 
 logger = logging.getLogger(__name__)
 
 
-async def notify_level_up(user, new_level: int, db: Session):
-    """Send level-up message to user. Optional: skip if no token."""
+_bot = None
+
+
+def get_bot():
+    """One Bot (and HTTP connection pool) per process, shared by the outbox dispatcher and startup calls."""
+    global _bot
+    if _bot is None:
+        from telegram import Bot
+        from telegram.request import HTTPXRequest
+        settings = get_settings()
+        kwargs = {}
+        if settings.TELEGRAM_API_URL:
+            kwargs["base_url"] = settings.TELEGRAM_API_URL.rstrip("/") + "/bot"
+        _bot = Bot(
+            token=settings.TELEGRAM_BOT_TOKEN,
+            request=HTTPXRequest(connection_pool_size=16),
+            **kwargs,
+        )
+    return _bot
+
+
+async def close_bot():
+    global _bot
+    if _bot is not None:
+        try:
+            await _bot.shutdown()
+        except Exception as e:
+            logger.warning("Bot shutdown failed: %s", e)
+        _bot = None
+
+
+async def notify_level_up(user, new_level: int, db: AsyncSession):
+    """Queue level-up message to user in the caller's transaction. Optional: skip if no token."""
     settings = get_settings()
     if not settings.TELEGRAM_BOT_TOKEN:
         return
-    try:
-        from telegram import Bot
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-        await bot.send_message(
-            chat_id=user.telegram_id,
-            text=f"🎉 Поздравляем! Вы достигли {new_level} уровня!",
-        )
-    except Exception as e:
-        logger.warning("Failed to send level-up notification: %s", e)
+    from .outbox import enqueue
+    await enqueue(db, [user.telegram_id], f"🎉 Поздравляем! Вы достигли {new_level} уровня!")
 
 
-async def notify_family_quest_completed(family_id: str, quest_name: str, db: Session):
+async def notify_family_quest_completed(family_id: str, quest_name: str, db: AsyncSession):
+    """Queue the quest message for every family member in the caller's transaction."""
     settings = get_settings()
     if not settings.TELEGRAM_BOT_TOKEN:
         return
-    try:
-        from telegram import Bot
-        from ..models import User
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-        members = db.query(User).filter(User.family_id == family_id).all()
-        text = f"🏆 Семейный квест '{quest_name}' выполнен! Отличная работа!"
-        for member in members:
-            try:
-                await bot.send_message(chat_id=member.telegram_id, text=text)
-            except Exception as e:
-                logger.warning("Notify member %s failed: %s", member.telegram_id, e)
-    except Exception as e:
-        logger.warning("Notify family quest failed: %s", e)
+    from .outbox import enqueue_family
+    await enqueue_family(db, family_id, f"🏆 Семейный квест '{quest_name}' выполнен! Отличная работа!")
 
 
 async def notify_deploy_complete():
@@ -52,8 +66,7 @@ async def notify_deploy_complete():
     if not chat_id:
         return
     try:
-        from telegram import Bot
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        bot = get_bot()
         await bot.send_message(chat_id=chat_id, text="✅ Деплой завершён. Бот готов к работе.")
         logger.info("Deploy notification sent to %s", chat_id)
     except Exception as e:
@@ -65,8 +78,8 @@ async def setup_menu_button():
     if not settings.TELEGRAM_BOT_TOKEN or not settings.MINI_APP_URL:
         return
     try:
-        from telegram import Bot, BotCommand
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        from telegram import BotCommand
+        bot = get_bot()
         await bot.set_chat_menu_button(
             menu_button={"type": "web_app", "text": "Открыть Трекер", "web_app": {"url": settings.MINI_APP_URL}}
         )
@@ -99,7 +112,7 @@ def create_bot_application():
 async def run_bot():
     """
     Run bot polling. Do NOT call from FastAPI lifespan: run_polling() conflicts with uvicorn.
-    In production we only use setup_menu_button() at startup and Bot().send_message() from API.
+    In production we only use setup_menu_button() at startup; notifications go through the outbox dispatcher.
     """
     # Safeguard: if we're already inside an event loop (e.g. uvicorn), run_polling() would crash.
     # Return immediately so old deployments that still call create_task(run_bot()) don't break.
@@ -0,0 +1,243 @@
+"""Notification outbox: rows are written in the caller's transaction, a background task sends them.
+
+The dispatcher claims due rows with FOR UPDATE SKIP LOCKED, sends them through the shared Bot under a global
+and a per-chat token bucket, then marks them sent or schedules a retry. One worker per deployment runs it
+(session advisory lock), so the buckets' rates are the deployment's rates.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, update, insert, delete, func, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import engine, session_scope
+from ..models import NotificationOutbox, User
+
+logger = logging.getLogger(__name__)
+
+DISPATCHER_LOCK_KEY = 4_716_530_191  # one dispatcher per deployment; next to migrate.ADVISORY_LOCK_KEY
+CLAIM_LEASE_SECONDS = 60  # margin for send latency on top of the pacing time of a full batch
+
+
+def _claim_lease(batch_size: int, global_rate: float, chat_rate: float) -> float:
+    """How long claimed rows stay leased; they become due again only if their worker died mid-send.
+    Worst case a whole batch goes to one chat, paced at chat_rate, so the lease must outlast that:
+    otherwise rows still waiting for their chat's token are re-claimed and sent twice."""
+    return CLAIM_LEASE_SECONDS + batch_size / max(chat_rate, 1e-3) + batch_size / max(global_rate, 1e-3)
+
+
+async def enqueue(db: AsyncSession, chat_ids: Iterable[str], message: str) -> None:
+    """Queue one message per chat. Does not commit."""
+    rows = [{"chat_id": str(c), "message": message} for c in chat_ids if c]
+    if rows:
+        await db.execute(insert(NotificationOutbox), rows)
+
+
+async def enqueue_family(db: AsyncSession, family_id, message: str) -> None:
+    """Queue a message for every family member with a single INSERT ... SELECT. Does not commit."""
+    await db.execute(
+        insert(NotificationOutbox).from_select(
+            ["chat_id", "message"],
+            select(User.telegram_id, literal(message)).where(User.family_id == family_id),
+            include_defaults=False,  # the Python-side id default would give every row the same uuid
+        )
+    )
+
+
+class TokenBucket:
+    """Tokens refill at rate per second up to capacity. acquire() reserves a token first, then sleeps off any debt,
+    so concurrent callers are spaced out without a lock."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        self._refill()
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """Telegram limits: about 30 messages/s per bot and 1 message/s per chat."""
+
+    def __init__(self, global_rate: float, chat_rate: float):
+        # Capacity 1: no bursts, so any one-second window holds at most global_rate + 1 sends.
+        self.global_bucket = TokenBucket(global_rate, 1.0)
+        self.chat_rate = chat_rate
+        self._chats: Dict[str, TokenBucket] = {}
+
+    async def acquire(self, chat_id: str) -> None:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle()}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1.0)
+        # Per-chat first, so a chat that is waiting does not hold a global token.
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(600.0, 5.0 * 2 ** (attempts - 1))
+
+
+async def _claim(batch_size: int, max_attempts: int, lease_seconds: float) -> List[Tuple[UUID, str, str, int]]:
+    async with session_scope() as db:
+        due = (
+            select(NotificationOutbox.id)
+            .where(
+                NotificationOutbox.sent_at.is_(None),
+                NotificationOutbox.send_after <= func.now(),
+                NotificationOutbox.attempts < max_attempts,
+            )
+            .order_by(NotificationOutbox.created_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        rows = await db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(due.scalar_subquery()))
+            .values(
+                attempts=NotificationOutbox.attempts + 1,
+                send_after=func.now() + timedelta(seconds=lease_seconds),
+            )
+            .returning(NotificationOutbox.id, NotificationOutbox.chat_id, NotificationOutbox.message, NotificationOutbox.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        return [tuple(r) for r in rows]
+
+
+async def _send(bot, limiter: RateLimiter, chat_id: str, message: str) -> Tuple[Optional[str], Optional[float], bool]:
+    """Returns (error, retry_after_seconds, permanent)."""
+    from telegram.error import Forbidden, BadRequest, RetryAfter
+    await limiter.acquire(chat_id)
+    try:
+        await bot.send_message(chat_id=chat_id, text=message)
+        return None, None, False
+    except RetryAfter as e:
+        retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+        return str(e), retry_after, False
+    except (Forbidden, BadRequest) as e:
+        # Bot blocked by the user, chat not found, etc.: retrying will not help.
+        return str(e), None, True
+    except Exception as e:
+        return str(e) or type(e).__name__, None, False
+
+
+async def dispatch_once(bot, limiter: RateLimiter) -> int:
+    """Send one batch of due notifications. Returns how many rows were claimed."""
+    settings = get_settings()
+    lease = _claim_lease(settings.NOTIFY_BATCH_SIZE, settings.NOTIFY_GLOBAL_RATE, settings.NOTIFY_CHAT_RATE)
+    claimed = await _claim(settings.NOTIFY_BATCH_SIZE, settings.NOTIFY_MAX_ATTEMPTS, lease)
+    if not claimed:
+        return 0
+    results = await asyncio.gather(*(_send(bot, limiter, chat_id, message) for _, chat_id, message, _ in claimed))
+    sent = [row[0] for row, (error, _, _) in zip(claimed, results) if error is None]
+    async with session_scope() as db:
+        if sent:
+            await db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(sent))
+                .values(sent_at=func.now(), last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+        for (row_id, chat_id, _, attempts), (error, retry_after, permanent) in zip(claimed, results):
+            if error is None:
+                continue
+            logger.warning("Notification to %s failed (attempt %s): %s", chat_id, attempts, error)
+            values = {"last_error": error[:500]}
+            if permanent:
+                values["attempts"] = settings.NOTIFY_MAX_ATTEMPTS
+            else:
+                delay = retry_after if retry_after is not None else _retry_delay(attempts)
+                values["send_after"] = func.now() + timedelta(seconds=delay)
+            await db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id == row_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+    return len(claimed)
+
+
+async def _wait(stop: asyncio.Event, seconds: float) -> None:
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _drain(stop: asyncio.Event, bot, limiter: RateLimiter, lock_conn) -> None:
+    """Dispatch until stop is set or the connection holding the dispatcher lock is gone."""
+    settings = get_settings()
+    while not stop.is_set():
+        try:
+            await lock_conn.fetchval("SELECT 1")
+        except Exception as e:
+            logger.warning("Notification dispatcher lost its lock connection: %s", e)
+            return
+        claimed = 0
+        try:
+            claimed = await dispatch_once(bot, limiter)
+        except Exception as e:
+            logger.warning("Notification dispatch failed: %s", e)
+        if not claimed:
+            await _wait(stop, settings.NOTIFY_POLL_SECONDS)
+
+
+async def run_dispatcher(stop: asyncio.Event) -> None:
+    """Drain the outbox until stop is set; polls every NOTIFY_POLL_SECONDS when idle.
+    The token buckets live in one process, so only the worker holding a session advisory lock dispatches and
+    the configured rates hold per deployment. The other workers retry the lock every NOTIFY_POLL_SECONDS and
+    take over when the holder stops or its connection drops."""
+    from .bot import get_bot
+    settings = get_settings()
+    bot = get_bot()
+    limiter = RateLimiter(settings.NOTIFY_GLOBAL_RATE, settings.NOTIFY_CHAT_RATE)
+    while not stop.is_set():
+        try:
+            async with engine.connect() as conn:
+                raw = (await conn.get_raw_connection()).driver_connection
+                if await raw.fetchval(f"SELECT pg_try_advisory_lock({DISPATCHER_LOCK_KEY})"):
+                    logger.info("Notification dispatcher active in this worker")
+                    try:
+                        await _drain(stop, bot, limiter, raw)
+                    finally:
+                        try:
+                            await raw.execute(f"SELECT pg_advisory_unlock({DISPATCHER_LOCK_KEY})")
+                        except Exception:
+                            await conn.invalidate()  # never return a connection that may still hold the lock
+        except Exception as e:
+            logger.warning("Notification dispatcher lock failed: %s", e)
+        await _wait(stop, settings.NOTIFY_POLL_SECONDS)
+
+
+async def purge_sent(db: AsyncSession, older_than_days: int = 7) -> int:
+    """Delete sent (or abandoned) notifications older than older_than_days. Caller commits."""
+    cutoff = func.now() - timedelta(days=older_than_days)
+    result = await db.execute(
+        delete(NotificationOutbox).where(
+            NotificationOutbox.created_at < cutoff,
+            (NotificationOutbox.sent_at.is_not(None))
+            | (NotificationOutbox.attempts >= get_settings().NOTIFY_MAX_ATTEMPTS),
+        )
+    )
+    return result.rowcount or 0
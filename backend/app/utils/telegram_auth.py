@@ -3,9 +3,20 @@ import hmac
 import hashlib
 import urllib.parse
 import json
+from functools import lru_cache
 from typing import Optional, Dict
 
 
+@lru_cache(maxsize=8)
+def _webapp_secret_key(bot_token: str) -> bytes:
+    """HMAC key derived from the bot token; constant per token, so derive it once."""
+    return hmac.new(
+        key=b"WebAppData",
+        msg=bot_token.encode(),
+        digestmod=hashlib.sha256,
+    ).digest()
+
+
 def verify_telegram_webapp_data(init_data: str, bot_token: str) -> bool:
     """Verify Telegram WebApp initData signature."""
     if not init_data or not bot_token:
@@ -17,17 +28,12 @@ def verify_telegram_webapp_data(init_data: str, bot_token: str) -> bool:
         if not received_hash:
             return False
         data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(data_dict.items()))
-        secret_key = hmac.new(
-            key=b"WebAppData",
-            msg=bot_token.encode(),
-            digestmod=hashlib.sha256,
-        ).digest()
         calculated = hmac.new(
-            key=secret_key,
+            key=_webapp_secret_key(bot_token),
             msg=data_check_string.encode(),
             digestmod=hashlib.sha256,
         ).hexdigest()
-        return calculated == received_hash
+        return hmac.compare_digest(calculated, received_hash)
     except Exception:
         return False
 
@@ -43,3 +49,17 @@ def parse_telegram_user_data(init_data: str) -> Optional[Dict]:
         return json.loads(user_str)
     except Exception:
         return None
+
+
+def parse_telegram_auth_date(init_data: str) -> Optional[int]:
+    """Parse auth_date (unix seconds) from initData. Returns None if absent or malformed."""
+    try:
+        data_dict = dict(urllib.parse.parse_qsl(init_data))
+        return int(data_dict["auth_date"])
+    except Exception:
+        return None
+
+
+def init_data_digest(init_data: str) -> str:
+    """Stable cache key for a raw initData string (covers every field, not just the hash)."""
+    return hashlib.sha256(init_data.encode()).hexdigest()
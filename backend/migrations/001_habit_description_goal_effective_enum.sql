@@ -1,5 +1,5 @@
 -- Add description and goal_effective_from to habits; add new enum values for HabitType and ScheduleType.
--- Run manually: psql $DATABASE_URL -f migrations/001_habit_description_goal_effective_enum.sql
+-- Applied by app.migrate (python -m app.migrate).
 
 -- New habit type: times_per_week
 ALTER TYPE habittype ADD VALUE IF NOT EXISTS 'times_per_week';
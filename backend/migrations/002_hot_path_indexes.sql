@@ -0,0 +1,12 @@
+-- Indexes for the hot filters: habit logs per user, diary by family and time,
+-- active habits per family, family members, active quests.
+-- Applied by app.migrate.
+
+CREATE INDEX IF NOT EXISTS ix_habit_logs_user_habit_date ON habit_logs (user_id, habit_id, date);
+CREATE INDEX IF NOT EXISTS ix_baby_events_family_created ON baby_events (family_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_habits_family_active ON habits (family_id, is_active);
+CREATE INDEX IF NOT EXISTS ix_users_family_id ON users (family_id);
+
+-- Active (not completed) quests: per-family lookup and the hourly scan by end_date.
+CREATE INDEX IF NOT EXISTS ix_family_quests_active_family ON family_quests (family_id, end_date) WHERE is_completed = false;
+CREATE INDEX IF NOT EXISTS ix_family_quests_active_end ON family_quests (end_date) WHERE is_completed = false;
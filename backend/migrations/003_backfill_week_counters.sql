@@ -0,0 +1,11 @@
+-- Seed habit_week_counters from existing logs of times_per_week habits (weeks logged before counters existed).
+-- Same result as: python -m app.tasks.repair_week_counters. Applied by app.migrate.
+
+INSERT INTO habit_week_counters (habit_id, user_id, week_start, count, xp_awarded)
+SELECT l.habit_id, l.user_id, date_trunc('week', l.date)::date, count(*), bool_or(l.xp_earned > 0)
+FROM habit_logs l
+JOIN habits h ON h.id = l.habit_id
+-- Compared as text: databases created before the enum gained this label (see 001) would reject the literal.
+WHERE upper(h.type::text) = 'TIMES_PER_WEEK'
+GROUP BY l.habit_id, l.user_id, date_trunc('week', l.date)::date
+ON CONFLICT (habit_id, user_id, week_start) DO NOTHING;
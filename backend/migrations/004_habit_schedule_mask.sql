@@ -0,0 +1,17 @@
+-- Compiled schedules: habits.updated_at versions the cached evaluator,
+-- schedule_days_mask (bit 0 = Monday) lets /today filter WEEKLY habits in SQL.
+-- Applied by app.migrate.
+
+ALTER TABLE habits ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+ALTER TABLE habits ADD COLUMN IF NOT EXISTS schedule_days_mask SMALLINT NOT NULL DEFAULT 127;
+
+-- Same rule as services.schedule.days_mask: integer days 0..6 from schedule_config.days.
+UPDATE habits h
+SET schedule_days_mask = COALESCE((
+    SELECT bit_or(1 << (d::text)::int)
+    FROM jsonb_array_elements(
+        CASE WHEN jsonb_typeof(h.schedule_config -> 'days') = 'array' THEN h.schedule_config -> 'days' ELSE '[]'::jsonb END
+    ) AS d
+    WHERE jsonb_typeof(d) = 'number' AND d::text ~ '^[0-6]$'
+), 0)
+WHERE upper(h.schedule_type::text) = 'WEEKLY';  -- as text, see 003
@@ -0,0 +1,16 @@
+-- Telegram notifications are queued in the request's transaction and sent by the
+-- background dispatcher (app.telegram.outbox).
+-- Applied by app.migrate.
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    chat_id VARCHAR NOT NULL,
+    message VARCHAR NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    send_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+    sent_at TIMESTAMPTZ,
+    last_error VARCHAR,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_notification_outbox_pending ON notification_outbox (send_after) WHERE sent_at IS NULL;
@@ -0,0 +1,11 @@
+-- Persistent cache for AI day summaries, keyed by (family, day, hash of model + prompt).
+-- Applied by app.migrate.
+
+CREATE TABLE IF NOT EXISTS ai_summaries (
+    family_id UUID NOT NULL REFERENCES families (id),
+    day DATE NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    summary VARCHAR NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (family_id, day, content_hash)
+);
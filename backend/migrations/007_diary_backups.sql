@@ -0,0 +1,12 @@
+-- What the GitHub diary backup last uploaded per (family, day): the git blob sha of the file, so
+-- unchanged days are skipped and updates can pass the sha the Contents API requires.
+-- Applied by app.migrate.
+
+CREATE TABLE IF NOT EXISTS diary_backups (
+    family_id UUID NOT NULL REFERENCES families (id),
+    day DATE NOT NULL,
+    blob_sha VARCHAR(40) NOT NULL,
+    commit_sha VARCHAR(40),
+    backed_up_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (family_id, day)
+);
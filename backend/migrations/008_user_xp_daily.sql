@@ -0,0 +1,16 @@
+-- Daily XP rollup per user for period leaderboards, seeded from habit logs. Kept current by
+-- complete/uncomplete (app.services.xp_rollups). Applied by app.migrate.
+
+CREATE TABLE IF NOT EXISTS user_xp_daily (
+    user_id UUID NOT NULL REFERENCES users (id),
+    day DATE NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+INSERT INTO user_xp_daily (user_id, day, xp)
+SELECT user_id, date, sum(xp_earned)
+FROM habit_logs
+WHERE xp_earned <> 0
+GROUP BY user_id, date
+ON CONFLICT (user_id, day) DO UPDATE SET xp = EXCLUDED.xp;
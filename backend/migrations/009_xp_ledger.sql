@@ -0,0 +1,76 @@
+-- Append-only XP ledger with daily/weekly rollups (app.services.xp_ledger). Seeds the ledger from
+-- existing data so it agrees with users/families.total_xp: one HABIT row per log that earned XP, plus
+-- an OPENING_BALANCE row for lifetime XP the logs no longer show (uncompleted logs, family XP).
+-- Applied by app.migrate.
+
+DO $$ BEGIN
+    CREATE TYPE xpsource AS ENUM (
+        'HABIT', 'STREAK_BONUS', 'WEEKLY_GOAL', 'SHARED_HABIT', 'LOG_REMOVED', 'OPENING_BALANCE'
+    );
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE TABLE IF NOT EXISTS xp_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID REFERENCES users (id),
+    family_id UUID REFERENCES families (id),
+    source xpsource NOT NULL,
+    amount INTEGER NOT NULL,
+    occurred_on DATE NOT NULL,
+    habit_id UUID,
+    habit_log_id UUID,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    CONSTRAINT ck_xp_ledger_owner CHECK (num_nonnulls(user_id, family_id) = 1)
+);
+CREATE INDEX IF NOT EXISTS ix_xp_ledger_user ON xp_ledger (user_id, occurred_on) WHERE user_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_xp_ledger_family ON xp_ledger (family_id, occurred_on) WHERE family_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS user_xp_weekly (
+    user_id UUID NOT NULL REFERENCES users (id),
+    week_start DATE NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, week_start)
+);
+CREATE TABLE IF NOT EXISTS family_xp_daily (
+    family_id UUID NOT NULL REFERENCES families (id),
+    day DATE NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (family_id, day)
+);
+CREATE TABLE IF NOT EXISTS family_xp_weekly (
+    family_id UUID NOT NULL REFERENCES families (id),
+    week_start DATE NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (family_id, week_start)
+);
+
+-- Seed (only into an empty ledger).
+INSERT INTO xp_ledger (user_id, source, amount, occurred_on, habit_id, habit_log_id)
+SELECT user_id, 'HABIT', xp_earned, date, habit_id, id
+FROM habit_logs
+WHERE xp_earned <> 0 AND NOT EXISTS (SELECT 1 FROM xp_ledger);
+
+INSERT INTO xp_ledger (user_id, source, amount, occurred_on)
+SELECT u.id, 'OPENING_BALANCE', u.total_xp - coalesce(l.xp, 0), coalesce(u.created_at::date, current_date)
+FROM users u
+LEFT JOIN (SELECT user_id, sum(xp_earned) AS xp FROM habit_logs GROUP BY user_id) l ON l.user_id = u.id
+WHERE u.total_xp <> coalesce(l.xp, 0)
+  AND NOT EXISTS (SELECT 1 FROM xp_ledger WHERE source = 'OPENING_BALANCE');
+
+INSERT INTO xp_ledger (family_id, source, amount, occurred_on)
+SELECT id, 'OPENING_BALANCE', total_xp, coalesce(created_at::date, current_date)
+FROM families
+WHERE total_xp <> 0 AND NOT EXISTS (SELECT 1 FROM xp_ledger WHERE family_id IS NOT NULL);
+
+-- Rollups from the ledger (opening balances are lifetime only, so families have none yet).
+INSERT INTO user_xp_daily (user_id, day, xp)
+SELECT user_id, occurred_on, sum(amount) FROM xp_ledger
+WHERE user_id IS NOT NULL AND source <> 'OPENING_BALANCE'
+GROUP BY user_id, occurred_on
+ON CONFLICT (user_id, day) DO UPDATE SET xp = EXCLUDED.xp;
+
+INSERT INTO user_xp_weekly (user_id, week_start, xp)
+SELECT user_id, date_trunc('week', occurred_on)::date, sum(amount) FROM xp_ledger
+WHERE user_id IS NOT NULL AND source <> 'OPENING_BALANCE'
+GROUP BY user_id, date_trunc('week', occurred_on)::date
+ON CONFLICT (user_id, week_start) DO UPDATE SET xp = EXCLUDED.xp;
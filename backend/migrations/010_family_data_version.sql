@@ -0,0 +1,4 @@
+-- Per-family data version behind ETag / If-None-Match on read endpoints (app.services.data_version).
+-- Applied by app.migrate.
+
+ALTER TABLE families ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0;
@@ -0,0 +1,9 @@
+-- Keyset pagination (app.services.pagination): the diary pages by (created_at, id) within a family and habit
+-- logs by (date, id) per user and habit. The new indexes end in id so the row comparison on the cursor is an
+-- index range; they replace the 002 indexes, which are their prefixes. Applied by app.migrate.
+
+CREATE INDEX IF NOT EXISTS ix_baby_events_family_created_id ON baby_events (family_id, created_at, id);
+DROP INDEX IF EXISTS ix_baby_events_family_created;
+
+CREATE INDEX IF NOT EXISTS ix_habit_logs_user_habit_date_id ON habit_logs (user_id, habit_id, date, id);
+DROP INDEX IF EXISTS ix_habit_logs_user_habit_date;
@@ -0,0 +1,7 @@
+-- Full-text search over the baby diary (app.services.diary_search): a stored tsvector of the content with
+-- the Russian config, kept current by Postgres, and a GIN index for @@ lookups. Applied by app.migrate.
+
+ALTER TABLE baby_events
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('russian', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_baby_events_content_tsv ON baby_events USING gin (content_tsv);
@@ -0,0 +1,86 @@
+"""Diary backfill cost against the fake GitHub API (scripts/fake_github.py): API calls, commits and time.
+
+Usage:
+    python scripts/fake_github.py --port 9100 --latency-ms 150 &
+    python scripts/bench_backup.py --url http://localhost:9100 --families 20 --days 30
+
+"contents" uploads every day file with its own Contents API PUT (the previous backup, one commit per file);
+"trees" sends the same files through the Git Data API, --per-commit files per commit.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/unused")  # settings require it; no DB is used
+
+
+def _fake_files(families: int, days: int, per_day: int, first_day: date) -> dict:
+    from app.models import BabyEvent, BabyEventType
+    from app.services.github_service import diary_path, generate_markdown
+    kinds = list(BabyEventType)
+    files = {}
+    for _ in range(families):
+        fid = uuid.uuid4()
+        for d in range(days):
+            day = first_day + timedelta(days=d)
+            events = [
+                BabyEvent(
+                    family_id=fid,
+                    event_type=random.choice(kinds),
+                    content=f"Событие {i}",
+                    created_at=datetime.combine(day, datetime.min.time()) + timedelta(minutes=i),
+                )
+                for i in range(per_day)
+            ]
+            files[diary_path(fid, day)] = generate_markdown(events, day, day)
+    return files
+
+
+async def main(args):
+    os.environ["GITHUB_API_URL"] = args.url
+    os.environ.setdefault("GITHUB_ACCESS_TOKEN", "bench")
+    os.environ.setdefault("GITHUB_REPO", "bench/diary")
+    from app.config import get_settings
+    from app.services.github_service import close_github_client, commit_files, put_file
+
+    get_settings().GITHUB_BACKUP_FILES_PER_COMMIT = args.per_commit
+    async with httpx.AsyncClient(base_url=args.url) as fake:
+        first_day = date(2000, 1, 1)
+        for mode in ("contents", "trees"):
+            first_day += timedelta(days=args.days)  # fresh paths every run
+            files = _fake_files(args.families, args.days, args.events, first_day)
+            await fake.post("/_reset")
+            started = time.perf_counter()
+            if mode == "contents":
+                for path, content in files.items():
+                    await put_file(path, content, "Diary")
+            else:
+                paths = list(files)
+                for i in range(0, len(paths), args.per_commit):
+                    chunk = paths[i:i + args.per_commit]
+                    await commit_files({p: files[p] for p in chunk}, f"Diary backfill ({len(chunk)} files)")
+            elapsed = time.perf_counter() - started
+            stats = (await fake.get("/_stats")).json()
+            print(
+                f"{mode:>8}: {len(files)} files, {stats['requests']} API calls, {stats['commits'] - 1} commits, "
+                f"{elapsed:.2f}s ({len(files) / elapsed:.1f} files/s)"
+            )
+    await close_github_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diary backfill benchmark")
+    parser.add_argument("--url", default="http://localhost:9100")
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--events", type=int, default=10, help="events per family and day")
+    parser.add_argument("--per-commit", type=int, default=200, help="files per Git Data API commit")
+    asyncio.run(main(parser.parse_args()))
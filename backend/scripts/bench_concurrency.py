@@ -0,0 +1,75 @@
+"""Concurrent-request throughput benchmark against a running API.
+
+Usage (run once on the old build and once on the new one, same DB and worker count):
+    python scripts/bench_concurrency.py --url http://localhost:8000 --init-data "$INIT_DATA" \
+        --path /api/habits/today --path /api/gamification/stats --concurrency 50 --requests 1000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def _worker(client: httpx.AsyncClient, paths, queue: asyncio.Queue, latencies: list, errors: list):
+    while True:
+        try:
+            i = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        path = paths[i % len(paths)]
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(path)
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run(url: str, init_data: str, paths, concurrency: int, total: int) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+    latencies: list = []
+    errors: list = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=url,
+        headers={"X-Telegram-Init-Data": init_data},
+        limits=limits,
+        timeout=60.0,
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(_worker(client, paths, queue, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(total / elapsed, 1) if elapsed else None,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--init-data", required=True, help="valid Telegram initData for X-Telegram-Init-Data")
+    parser.add_argument("--path", action="append", dest="paths", help="GET path (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+    paths = args.paths or ["/api/habits/today"]
+    result = asyncio.run(run(args.url, args.init_data, paths, args.concurrency, args.requests))
+    for k, v in result.items():
+        print(f"{k:>12}: {v}")
+
+
+if __name__ == "__main__":
+    main()
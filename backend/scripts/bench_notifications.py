@@ -0,0 +1,66 @@
+"""Outbox dispatcher throughput against the fake Bot API (scripts/fake_telegram.py).
+
+Usage (DATABASE_URL must point at a migrated database; the script only touches notification_outbox):
+    python scripts/fake_telegram.py --port 9200 --latency-ms 50 &
+    TELEGRAM_API_URL=http://localhost:9200 TELEGRAM_BOT_TOKEN=123:fake \\
+        python scripts/bench_notifications.py --messages 300 --chats 100
+
+Reports messages/s and how many sends the fake API rejected with 429 (should be 0: the limiter paces them).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+async def main(args):
+    from sqlalchemy import select, func, delete
+    from app.config import get_settings
+    from app.database import session_scope
+    from app.models import NotificationOutbox
+    from app.telegram.bot import get_bot, close_bot
+    from app.telegram.outbox import RateLimiter, dispatch_once, enqueue
+
+    settings = get_settings()
+    async with httpx.AsyncClient(base_url=settings.TELEGRAM_API_URL) as fake:
+        await fake.post("/_reset")
+        async with session_scope() as db:
+            await db.execute(delete(NotificationOutbox))
+            for i in range(args.messages):
+                await enqueue(db, [str(100000 + i % args.chats)], f"bench {i}")
+
+        bot = get_bot()
+        limiter = RateLimiter(settings.NOTIFY_GLOBAL_RATE, settings.NOTIFY_CHAT_RATE)
+        started = time.perf_counter()
+        while True:
+            await dispatch_once(bot, limiter)
+            async with session_scope() as db:
+                pending = await db.scalar(
+                    select(func.count()).select_from(NotificationOutbox).where(NotificationOutbox.sent_at.is_(None))
+                )
+            if not pending:
+                break
+            if time.perf_counter() - started > args.timeout:
+                print(f"timeout with {pending} pending")
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        stats = (await fake.get("/_stats")).json()
+    await close_bot()
+    print(
+        f"{stats['sent']} sent to {stats['chats']} chats in {elapsed:.2f}s ({stats['sent'] / elapsed:.1f} msg/s), "
+        f"429 global={stats['rate_limited_global']} chat={stats['rate_limited_chat']}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Notification outbox throughput benchmark")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,137 @@
+"""Concurrency check for POST /api/habits/{id}/complete against a running API.
+
+Creates a fresh family of --members users (signed with the bot token the API validates against) and --habits
+shared boolean habits, then fires every member's completion of every habit for today at once, each one
+--repeat times. Afterwards it asserts that no XP was lost or double-counted:
+    - every member's total_xp grew by habits * xp_reward (duplicates award nothing, no streak bonus on day one);
+    - the family's total_xp grew by habits * xp_reward (one shared-habit bonus per habit);
+    - exactly one response per habit reported family_xp_awarded.
+
+Usage (the API must run with the same TELEGRAM_BOT_TOKEN):
+    TELEGRAM_BOT_TOKEN=123:fake python scripts/check_concurrent_completions.py --url http://localhost:8000 \
+        --members 4 --habits 10 --repeat 3
+Exits non-zero if any request failed or any total is off.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import urllib.parse
+from collections import Counter
+from datetime import date
+
+import httpx
+
+XP_REWARD = 10
+
+
+def init_data(bot_token: str, telegram_id: int) -> str:
+    """Telegram WebApp initData for telegram_id, signed like the real client (see app/utils/telegram_auth.py)."""
+    fields = {
+        "auth_date": str(int(time.time())),
+        "query_id": "check",
+        "user": json.dumps({"id": telegram_id, "username": f"check{telegram_id}", "first_name": "Check"}),
+    }
+    check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urllib.parse.urlencode(fields)
+
+
+def _ok(r: httpx.Response) -> dict:
+    if r.status_code >= 400:
+        raise SystemExit(f"{r.request.method} {r.request.url.path} -> {r.status_code}: {r.text}")
+    return r.json()
+
+
+async def run(url: str, bot_token: str, members: int, habits: int, repeat: int) -> list:
+    base_id = int(time.time() * 1000) % 10**9 * 100
+    headers = [{"X-Telegram-Init-Data": init_data(bot_token, base_id + i)} for i in range(members)]
+    limits = httpx.Limits(max_connections=members * habits * repeat)
+    async with httpx.AsyncClient(base_url=url, timeout=120.0, limits=limits) as client:
+        admin = _ok(await client.get("/api/users/me", headers=headers[0]))
+        for h in headers[1:]:
+            _ok(await client.get("/api/users/me", headers=h))
+            _ok(await client.post("/api/users/join", headers=h, json={"family_id": admin["family_id"]}))
+        habit_ids = []
+        for i in range(habits):
+            habit = _ok(
+                await client.post(
+                    "/api/habits",
+                    headers=headers[0],
+                    json={
+                        "name": f"concurrency check {i}",
+                        "type": "boolean",
+                        "schedule_type": "daily",
+                        "privacy": "shared",
+                        "xp_reward": XP_REWARD,
+                    },
+                )
+            )
+            habit_ids.append(habit["id"])
+
+        before = {u["id"]: u["total_xp"] for u in _ok(await client.get("/api/users/family", headers=headers[0]))}
+        family_before = _ok(await client.get("/api/gamification/family-stats", headers=headers[0]))["total_xp"]
+
+        body = {"date": str(date.today())}
+        calls = [
+            (habit_id, client.post(f"/api/habits/{habit_id}/complete", headers=h, json=body))
+            for habit_id in habit_ids
+            for h in headers
+            for _ in range(repeat)
+        ]
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(c for _, c in calls), return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        failures = []
+        awarded = Counter()
+        for (habit_id, _), r in zip(calls, responses):
+            if isinstance(r, Exception):
+                failures.append(f"{habit_id}: {type(r).__name__}")
+            elif r.status_code != 200:
+                failures.append(f"{habit_id}: {r.status_code} {r.text}")
+            elif r.json()["family_xp_awarded"]:
+                awarded[habit_id] += 1
+        print(f"{len(calls)} completions in {elapsed:.2f}s, {len(failures)} failed")
+
+        after = {u["id"]: u["total_xp"] for u in _ok(await client.get("/api/users/family", headers=headers[0]))}
+        family_after = _ok(await client.get("/api/gamification/family-stats", headers=headers[0]))["total_xp"]
+
+    problems = failures[:10]
+    expected = habits * XP_REWARD
+    for user_id, xp in after.items():
+        if xp - before.get(user_id, 0) != expected:
+            problems.append(f"user {user_id}: total_xp grew by {xp - before.get(user_id, 0)}, expected {expected}")
+    if family_after - family_before != expected:
+        problems.append(f"family total_xp grew by {family_after - family_before}, expected {expected}")
+    for habit_id in habit_ids:
+        if awarded[habit_id] != 1:
+            problems.append(f"habit {habit_id}: shared-habit bonus reported {awarded[habit_id]} times, expected 1")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--bot-token", default=os.environ.get("TELEGRAM_BOT_TOKEN"), help="default $TELEGRAM_BOT_TOKEN")
+    parser.add_argument("--members", type=int, default=4)
+    parser.add_argument("--habits", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="identical requests per member, habit and day")
+    args = parser.parse_args()
+    if not args.bot_token:
+        parser.error("--bot-token or TELEGRAM_BOT_TOKEN is required")
+    problems = asyncio.run(run(args.url, args.bot_token, args.members, args.habits, args.repeat))
+    for p in problems:
+        print("FAIL", p)
+    if problems:
+        sys.exit(1)
+    print("OK: user, family and shared-habit bonus totals match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Statement count of GET /api/dashboard/today must not grow with the number of habits.
+
+Runs the app in-process (httpx ASGITransport) against DATABASE_URL, which must point at a migrated database;
+it only adds two throwaway families. One family gets a single habit, the other --habits of them (daily,
+times-per-week, shared and personal, each completed today so logs and streaks exist). A before_cursor_execute
+listener counts the statements of one warm dashboard request per family; the counts must be equal, and
+weekly_done must match /api/habits/{id}/stats.
+
+Usage:
+    DATABASE_URL=postgresql://... TELEGRAM_BOT_TOKEN=123:fake python scripts/check_dashboard_queries.py --habits 25
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from check_concurrent_completions import init_data  # noqa: E402  (same directory)
+
+
+def _habit(i: int) -> dict:
+    if i % 3 == 0:
+        return {
+            "name": f"query check {i}",
+            "type": "times_per_week",
+            "schedule_type": "weekly_target",
+            "privacy": "personal",
+            "target_value": {"weekly_target": 3},
+        }
+    return {
+        "name": f"query check {i}",
+        "type": "boolean",
+        "schedule_type": "daily",
+        "privacy": "shared" if i % 3 == 1 else "public",
+    }
+
+
+def _ok(r: httpx.Response) -> dict:
+    if r.status_code >= 400:
+        raise SystemExit(f"{r.request.method} {r.request.url.path} -> {r.status_code}: {r.text}")
+    return r.json()
+
+
+async def _count(client: httpx.AsyncClient, headers: dict, habits: int, statements: list) -> int:
+    _ok(await client.get("/api/users/me", headers=headers))
+    for i in range(habits):
+        habit = _ok(await client.post("/api/habits", headers=headers, json=_habit(i)))
+        _ok(await client.post(f"/api/habits/{habit['id']}/complete", headers=headers, json={"date": str(date.today())}))
+    _ok(await client.get("/api/dashboard/today", headers=headers))  # warm the auth cache and the active quest
+    statements.clear()
+    body = _ok(await client.get("/api/dashboard/today", headers=headers))
+    count = len(statements)
+    if len(body["habits"]) != habits:
+        raise SystemExit(f"dashboard returned {len(body['habits'])} habits, expected {habits}")
+    for item in body["habits"]:
+        if item["weekly_target"] is None:
+            continue
+        stats = _ok(await client.get(f"/api/habits/{item['habit']['id']}/stats", headers=headers))
+        if item["weekly_done"] != stats["weekly_done"]:
+            raise SystemExit(f"dashboard weekly_done {item['weekly_done']} != stats {stats['weekly_done']}")
+    return count
+
+
+async def run(habits: int) -> dict:
+    from sqlalchemy import event
+    from app.config import get_settings
+    from app.database import engine
+    from app.main import app, lifespan
+
+    bot_token = get_settings().TELEGRAM_BOT_TOKEN
+    statements: list = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda conn, cur, sql, *args: statements.append(sql))
+    base_id = int(time.time() * 1000) % 10**9 * 100
+    counts = {}
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+            for i, n in enumerate((1, habits)):
+                headers = {"X-Telegram-Init-Data": init_data(bot_token, base_id + i)}
+                counts[n] = await _count(client, headers, n, statements)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=25, help="habits in the larger family")
+    args = parser.parse_args()
+    counts = asyncio.run(run(args.habits))
+    for n, c in counts.items():
+        print(f"{n:>4} habits: {c} statements")
+    if len(set(counts.values())) != 1:
+        print("FAIL: statement count depends on the number of habits")
+        sys.exit(1)
+    print("OK: constant statement count")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Backdated completions must leave the Streak row and the streak bonus as if the days had been done in order.
+
+Runs the app in-process (httpx ASGITransport) against DATABASE_URL, which must point at a migrated database;
+it only adds throwaway users. Two scenarios, each on a fresh daily habit:
+    single: complete T-2, backdate T-1, then complete today. The Streak row must read 3 (not 1 from a today-based
+            update), last completed today, and today's log must carry the 3-day bonus.
+    batch:  /complete-batch with T-3..T-1 only. Today is not done, so current_streak must be 0 with the 3-day
+            bonus on T-1; completing today then makes it 4 and earns no further bonus.
+
+Usage:
+    DATABASE_URL=postgresql://... TELEGRAM_BOT_TOKEN=123:fake python scripts/check_streak_backfill.py
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from check_concurrent_completions import init_data  # noqa: E402  (same directory)
+
+XP_REWARD = 10
+THREE_DAY_BONUS = 10
+
+
+def _ok(r: httpx.Response):
+    if r.status_code >= 400:
+        raise SystemExit(f"{r.request.method} {r.request.url.path} -> {r.status_code}: {r.text}")
+    return r.json()
+
+
+async def _streak(habit_id: str):
+    from sqlalchemy import select
+    from app.database import session_scope
+    from app.models import Streak
+
+    async with session_scope() as db:
+        s = await db.scalar(select(Streak).where(Streak.habit_id == habit_id))
+        return (s.current_streak, s.longest_streak, s.last_completed_date) if s else None
+
+
+async def _new_habit(client: httpx.AsyncClient, headers: dict, name: str) -> str:
+    habit = await client.post(
+        "/api/habits",
+        headers=headers,
+        json={"name": name, "type": "boolean", "schedule_type": "daily", "privacy": "personal", "xp_reward": XP_REWARD},
+    )
+    return _ok(habit)["id"]
+
+
+async def single(client: httpx.AsyncClient, headers: dict, today: date) -> list:
+    problems = []
+    habit_id = await _new_habit(client, headers, "backfill single")
+    complete = lambda d: client.post(f"/api/habits/{habit_id}/complete", headers=headers, json={"date": str(d)})
+    _ok(await complete(today - timedelta(days=2)))
+    _ok(await complete(today - timedelta(days=1)))
+    if await _streak(habit_id) != (0, 2, today - timedelta(days=1)):
+        problems.append(f"single: after backdating T-1 streak is {await _streak(habit_id)}, expected (0, 2, T-1)")
+    log = _ok(await complete(today))
+    if await _streak(habit_id) != (3, 3, today):
+        problems.append(f"single: after today streak is {await _streak(habit_id)}, expected (3, 3, today)")
+    if log["xp_earned"] != XP_REWARD + THREE_DAY_BONUS:
+        problems.append(f"single: today's log earned {log['xp_earned']}, expected {XP_REWARD + THREE_DAY_BONUS}")
+    return problems
+
+
+async def batch(client: httpx.AsyncClient, headers: dict, today: date) -> list:
+    problems = []
+    habit_id = await _new_habit(client, headers, "backfill batch")
+    items = [{"habit_id": habit_id, "date": str(today - timedelta(days=i))} for i in (3, 2, 1)]
+    results = _ok(await client.post("/api/habits/complete-batch", headers=headers, json={"items": items}))
+    earned = {r["date"]: r["log"]["xp_earned"] for r in results}
+    expected = {str(today - timedelta(days=i)): XP_REWARD for i in (3, 2, 1)}
+    expected[str(today - timedelta(days=1))] += THREE_DAY_BONUS
+    if earned != expected:
+        problems.append(f"batch: logs earned {earned}, expected {expected}")
+    if await _streak(habit_id) != (0, 3, today - timedelta(days=1)):
+        problems.append(f"batch: streak is {await _streak(habit_id)}, expected (0, 3, T-1): today is not done")
+    log = _ok(await client.post(f"/api/habits/{habit_id}/complete", headers=headers, json={"date": str(today)}))
+    if await _streak(habit_id) != (4, 4, today):
+        problems.append(f"batch: after today streak is {await _streak(habit_id)}, expected (4, 4, today)")
+    if log["xp_earned"] != XP_REWARD:
+        problems.append(f"batch: today's log earned {log['xp_earned']}, expected {XP_REWARD} (no milestone at 4)")
+    return problems
+
+
+async def run() -> list:
+    from app.config import get_settings
+    from app.main import app, lifespan
+
+    headers = {"X-Telegram-Init-Data": init_data(get_settings().TELEGRAM_BOT_TOKEN, int(time.time() * 1000) % 10**9 * 100)}
+    today = date.today()
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+            _ok(await client.get("/api/users/me", headers=headers))
+            return await single(client, headers, today) + await batch(client, headers, today)
+
+
+def main():
+    problems = asyncio.run(run())
+    for p in problems:
+        print("FAIL", p)
+    if problems:
+        sys.exit(1)
+    print("OK: backdated completions keep the streak and bonus consistent with the runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Randomized check of the streak run logic against a full recompute. Pure Python, no database needed.
+
+Applies random sequences of add_streak_day / add_streak_days / remove_streak_day edits the way the service does
+(load the runs touching the edited dates, rewrite only those with add_days_to_runs / remove_day_from_runs) and
+after every edit asserts that
+    - the runs equal runs_from_dates over all counted dates (what rebuild_streak_runs stores);
+    - current, longest and last completed day derived from the runs (the sync_streak_from_runs aggregate) equal
+      the day-by-day recompute that recalc_streak did before runs existed.
+
+Usage:
+    python scripts/check_streak_runs.py --sequences 200 --ops 300 --span 60 --seed 1
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "postgresql://unused/unused")  # app settings require it; nothing connects
+
+
+def full_recompute(dates: set, today: date):
+    """(current, longest, last_completed) walking the counted dates one by one, as the old recalc_streak did."""
+    current = 0
+    d = today
+    while d in dates:
+        current += 1
+        d -= timedelta(days=1)
+    longest = current
+    run = 0
+    ordered = sorted(dates, reverse=True)
+    for i, d in enumerate(ordered):
+        run = run + 1 if i and (ordered[i - 1] - d).days == 1 else 1
+        longest = max(longest, run)
+    return current, longest, max(dates) if dates else None
+
+
+def from_runs(runs, today: date):
+    """Same values from runs, by the rules of sync_streak_from_runs."""
+    lengths = [((end - start).days + 1, end) for start, end in runs]
+    current = max((n for n, end in lengths if end == today), default=0)
+    longest = max((n for n, _ in lengths), default=0)
+    return current, longest, max((end for _, end in lengths), default=None)
+
+
+def _touching(runs, lo: date, hi: date):
+    return [r for r in runs if r[0] <= hi and r[1] >= lo]
+
+
+def check_sequence(rng: random.Random, ops: int, span: int, today: date) -> int:
+    from app.services.streak_service import add_days_to_runs, remove_day_from_runs, runs_from_dates
+
+    first = today - timedelta(days=span - 1)
+    dates: set = set()
+    runs: list = []
+    for step in range(ops):
+        kind = rng.choice(("add", "add", "batch", "remove", "remove"))
+        if kind == "remove":
+            day = rng.choice(sorted(dates)) if dates and rng.random() < 0.8 else first + timedelta(rng.randrange(span))
+            near = _touching(runs, day, day)
+            if near:
+                runs = sorted(set(runs) - set(near) | set(remove_day_from_runs(near, day)))
+            dates.discard(day)
+        else:
+            count = 1 if kind == "add" else rng.randint(1, 7)
+            days = sorted({first + timedelta(rng.randrange(span)) for _ in range(count)})
+            near = _touching(runs, days[0] - timedelta(days=1), days[-1] + timedelta(days=1))
+            runs = sorted(set(runs) - set(near) | set(add_days_to_runs(near, days)))
+            dates.update(days)
+        expected_runs = runs_from_dates(dates)
+        if runs != expected_runs:
+            raise AssertionError(f"step {step} ({kind}): runs {runs} != recomputed {expected_runs}")
+        if from_runs(runs, today) != full_recompute(dates, today):
+            raise AssertionError(
+                f"step {step} ({kind}): streak {from_runs(runs, today)} != recomputed {full_recompute(dates, today)}"
+            )
+    return ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sequences", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=300, help="edits per sequence")
+    parser.add_argument("--span", type=int, default=60, help="days the edits fall in, ending today")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    rng = random.Random(seed)
+    today = date.today()
+    total = 0
+    for i in range(args.sequences):
+        try:
+            total += check_sequence(rng, args.ops, args.span, today)
+        except AssertionError as e:
+            print(f"FAIL (seed {seed}, sequence {i}): {e}")
+            sys.exit(1)
+    print(f"OK: {total} edits in {args.sequences} sequences match the full recompute (seed {seed})")
+
+
+if __name__ == "__main__":
+    main()
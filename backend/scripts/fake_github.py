@@ -0,0 +1,188 @@
+"""In-memory stand-in for the GitHub Contents and Git Data APIs, for benchmarking diary backups offline.
+
+Usage:
+    python scripts/fake_github.py --port 9100 --latency-ms 150 --fail-rate 0.05
+    GITHUB_API_URL=http://localhost:9100 GITHUB_ACCESS_TOKEN=x GITHUB_REPO=me/diary ...
+
+Each repository has one branch (any name) whose head moves with every commit from either API. Like GitHub,
+a Contents PUT to an existing path without its current blob sha gets 422, and a ref update that is not a
+fast-forward gets 422. --fail-rate answers that share of requests with 502 so retries can be exercised.
+GET /_stats returns request counters; GET /_files/{owner}/{repo}/{path} returns a file's content.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+app = FastAPI()
+stats = {
+    "requests": 0, "created": 0, "updated": 0, "conflicts": 0, "commits": 0, "ref_conflicts": 0,
+    "injected_failures": 0, "in_flight_max": 0,
+}
+_in_flight = 0
+config = {"latency": 0.0, "fail_rate": 0.0}
+
+blobs: dict = {}  # blob sha -> bytes
+trees: dict = {}  # tree sha -> {path: blob sha}
+commits: dict = {}  # commit sha -> {"tree": sha, "parents": [...]}
+heads: dict = {}  # (owner, repo) -> commit sha
+
+
+def _sha(prefix: bytes, data: bytes) -> str:
+    return hashlib.sha1(prefix + b" %d\0" % len(data) + data).hexdigest()
+
+
+def _blob(data: bytes) -> str:
+    sha = _sha(b"blob", data)
+    blobs[sha] = data
+    return sha
+
+
+def _tree(entries: dict) -> str:
+    sha = _sha(b"tree", repr(sorted(entries.items())).encode())
+    trees[sha] = dict(entries)
+    return sha
+
+
+def _commit(tree: str, parents: list, message: str) -> str:
+    sha = _sha(b"commit", f"{tree}{parents}{message}{len(commits)}".encode())
+    commits[sha] = {"tree": tree, "parents": parents}
+    stats["commits"] += 1
+    return sha
+
+
+def _head(owner: str, repo: str) -> str:
+    key = (owner, repo)
+    if key not in heads:
+        heads[key] = _commit(_tree({}), [], "Initial commit")
+    return heads[key]
+
+
+def _files(owner: str, repo: str) -> dict:
+    return trees[commits[_head(owner, repo)]["tree"]]
+
+
+@app.middleware("http")
+async def _simulate_network(request: Request, call_next):
+    global _in_flight
+    if request.url.path.startswith("/_"):
+        return await call_next(request)
+    stats["requests"] += 1
+    _in_flight += 1
+    stats["in_flight_max"] = max(stats["in_flight_max"], _in_flight)
+    try:
+        await asyncio.sleep(config["latency"])
+        if random.random() < config["fail_rate"]:
+            stats["injected_failures"] += 1
+            return JSONResponse({"message": "Bad gateway"}, status_code=502)
+        return await call_next(request)
+    finally:
+        _in_flight -= 1
+
+
+@app.put("/repos/{owner}/{repo}/contents/{path:path}")
+async def put_contents(owner: str, repo: str, path: str, body: dict):
+    files = _files(owner, repo)
+    existing = files.get(path)
+    if existing is not None and body.get("sha") != existing:
+        stats["conflicts"] += 1
+        return JSONResponse({"message": "sha wasn't supplied"}, status_code=422)
+    blob = _blob(base64.b64decode(body["content"]))
+    head = _head(owner, repo)
+    heads[(owner, repo)] = commit_sha = _commit(_tree({**files, path: blob}), [head], body.get("message", ""))
+    stats["updated" if existing else "created"] += 1
+    return JSONResponse(
+        {"content": {"path": path, "sha": blob}, "commit": {"sha": commit_sha}},
+        status_code=200 if existing else 201,
+    )
+
+
+@app.get("/repos/{owner}/{repo}/contents/{path:path}")
+async def get_contents(owner: str, repo: str, path: str):
+    sha = _files(owner, repo).get(path)
+    if sha is None:
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+    return {"path": path, "sha": sha}
+
+
+@app.get("/repos/{owner}/{repo}/git/ref/heads/{branch:path}")
+async def get_ref(owner: str, repo: str, branch: str):
+    return {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": _head(owner, repo)}}
+
+
+@app.get("/repos/{owner}/{repo}/git/commits/{sha}")
+async def get_commit(owner: str, repo: str, sha: str):
+    commit = commits.get(sha)
+    if commit is None:
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+    return {"sha": sha, "tree": {"sha": commit["tree"]}, "parents": [{"sha": p} for p in commit["parents"]]}
+
+
+@app.post("/repos/{owner}/{repo}/git/trees", status_code=201)
+async def create_tree(owner: str, repo: str, body: dict):
+    entries = dict(trees.get(body.get("base_tree"), {}))
+    for entry in body["tree"]:
+        if entry.get("content") is not None:
+            stats["updated" if entry["path"] in entries else "created"] += 1
+            entries[entry["path"]] = _blob(entry["content"].encode("utf-8"))
+        elif entry.get("sha") is None:
+            entries.pop(entry["path"], None)
+        else:
+            entries[entry["path"]] = entry["sha"]
+    return {"sha": _tree(entries)}
+
+
+@app.post("/repos/{owner}/{repo}/git/commits", status_code=201)
+async def create_commit(owner: str, repo: str, body: dict):
+    if body["tree"] not in trees:
+        return JSONResponse({"message": "Tree not found"}, status_code=422)
+    return {"sha": _commit(body["tree"], body.get("parents", []), body.get("message", ""))}
+
+
+@app.patch("/repos/{owner}/{repo}/git/refs/heads/{branch:path}")
+async def update_ref(owner: str, repo: str, branch: str, body: dict):
+    head = _head(owner, repo)
+    commit = commits.get(body["sha"])
+    if commit is None or (head not in commit["parents"] and not body.get("force")):
+        stats["ref_conflicts"] += 1
+        return JSONResponse({"message": "Update is not a fast forward"}, status_code=422)
+    heads[(owner, repo)] = body["sha"]
+    return {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": body["sha"]}}
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {**stats, "files": sum(len(trees[commits[h]["tree"]]) for h in heads.values())}
+
+
+@app.get("/_files/{owner}/{repo}/{path:path}")
+async def get_file(owner: str, repo: str, path: str):
+    sha = _files(owner, repo).get(path)
+    if sha is None:
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+    return PlainTextResponse(blobs[sha].decode("utf-8"))
+
+
+@app.post("/_reset")
+async def reset():
+    for store in (blobs, trees, commits, heads):
+        store.clear()
+    for k in stats:
+        stats[k] = 0
+    return {"ok": True}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config["latency"] = args.latency_ms / 1000
+    config["fail_rate"] = args.fail_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
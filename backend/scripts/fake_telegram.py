@@ -0,0 +1,104 @@
+"""In-memory stand-in for the Telegram Bot API, for notification throughput tests offline.
+
+Usage:
+    python scripts/fake_telegram.py --port 9200 --latency-ms 50
+    TELEGRAM_API_URL=http://localhost:9200 TELEGRAM_BOT_TOKEN=123:fake ...
+
+Enforces Telegram's limits the way the real API reports them: more than --global-rate messages in any
+second, or more than one per second to the same chat, gets 429 with parameters.retry_after.
+GET /_stats returns counters (sent, rate_limited, per-chat maximum burst).
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+config = {"latency": 0.0, "global_rate": 30, "chat_interval": 1.0}
+stats = {"requests": 0, "sent": 0, "rate_limited_global": 0, "rate_limited_chat": 0, "chats": 0}
+_recent: deque = deque()
+_last_by_chat: dict = {}
+_messages_by_chat: dict = defaultdict(int)
+
+
+def _too_many(retry_after: int, kind: str) -> JSONResponse:
+    stats[f"rate_limited_{kind}"] += 1
+    return JSONResponse(
+        {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+         "parameters": {"retry_after": retry_after}},
+        status_code=429,
+    )
+
+
+async def _params(request: Request) -> dict:
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        import json
+        return json.loads(body or b"{}")
+    return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+
+
+@app.post("/bot{token}/{method}")
+async def bot_method(token: str, method: str, request: Request):
+    stats["requests"] += 1
+    params = await _params(request)
+    await asyncio.sleep(config["latency"])
+    if method == "getMe":
+        return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+    if method != "sendMessage":
+        return {"ok": True, "result": True}
+
+    now = time.monotonic()
+    while _recent and now - _recent[0] > 1.0:
+        _recent.popleft()
+    if len(_recent) >= config["global_rate"]:
+        return _too_many(1, "global")
+    chat_id = str(params.get("chat_id"))
+    last = _last_by_chat.get(chat_id)
+    if last is not None and now - last < config["chat_interval"]:
+        return _too_many(1, "chat")
+    _recent.append(now)
+    _last_by_chat[chat_id] = now
+    _messages_by_chat[chat_id] += 1
+    stats["sent"] += 1
+    stats["chats"] = len(_messages_by_chat)
+    return {
+        "ok": True,
+        "result": {
+            "message_id": stats["sent"],
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0, "type": "private"},
+            "text": params.get("text", ""),
+        },
+    }
+
+
+@app.get("/_stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/_reset")
+async def reset():
+    _recent.clear()
+    _last_by_chat.clear()
+    _messages_by_chat.clear()
+    for k in stats:
+        stats[k] = 0
+    return {"ok": True}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--global-rate", type=int, default=30)
+    args = parser.parse_args()
+    config["latency"] = args.latency_ms / 1000
+    config["global_rate"] = args.global_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
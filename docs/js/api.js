@@ -1,6 +1,9 @@
 const API = {
   baseURL: window.BACKEND_URL || '',
   async request(path, options = {}) {
+    return (await this.send(path, options)).data;
+  },
+  async send(path, options = {}) {
     const initData = window.Telegram?.WebApp?.initData || '';
     const res = await fetch(this.baseURL + path, {
       ...options,
@@ -16,9 +19,15 @@ const API = {
       if (res.status === 401) msg = 'Откройте приложение из Telegram (бот → кнопка «Открыть Трекер»).';
       throw new Error(msg);
     }
-    return data;
+    return { data, res };
   },
   get(path) { return this.request(path, { method: 'GET' }); },
+  // Keyset-paginated list: { items, next } where next is the cursor for the following page or null.
+  async getPage(path, cursor) {
+    if (cursor) path += (path.indexOf('?') >= 0 ? '&' : '?') + 'cursor=' + encodeURIComponent(cursor);
+    const { data, res } = await this.send(path, { method: 'GET' });
+    return { items: data, next: res.headers.get('X-Next-Cursor') };
+  },
   post(path, body) { return this.request(path, { method: 'POST', body: body ? JSON.stringify(body) : undefined }); },
   put(path, body) { return this.request(path, { method: 'PUT', body: body ? JSON.stringify(body) : undefined }); },
   delete(path) { return this.request(path, { method: 'DELETE' }); },
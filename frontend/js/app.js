@@ -452,17 +452,69 @@
     });
   }
 
+  function babyEventCard(e, html) {
+    return '<div class="card"><small>' + e.event_type + '</small> ' + (html || escapeHtml(e.content)) + '</div>';
+  }
+
   function loadBaby() {
-    API.get('/api/baby/events')
-      .then(events => {
+    API.getPage('/api/baby/events')
+      .then(page => {
         var html = '<h2 class="page-title">Дневник малыша</h2>';
-        if (!events.length) html += '<p>Пока нет записей</p>';
-        else events.forEach(e => { html += '<div class="card"><small>' + e.event_type + '</small> ' + escapeHtml(e.content) + '</div>'; });
-        content.innerHTML = html;
+        html += '<form id="baby-search" class="form-row"><input type="search" name="q" placeholder="Поиск по дневнику"></form>';
+        html += '<div id="baby-results">';
+        if (!page.items.length) html += '<p>Пока нет записей</p>';
+        else html += '<div id="baby-events">' + page.items.map(e => babyEventCard(e)).join('') + '</div>';
+        content.innerHTML = html + '</div>';
+        bindBabySearch();
+        if (page.next) watchBabyScroll(page.next);
       })
       .catch(e => { content.innerHTML = '<p class="error">Ошибка загрузки.</p><p class="empty-hint">' + e.message + '</p>'; });
   }
 
+  // Search results replace the list; the snippet marks matched words with **...** (content is not escaped).
+  function bindBabySearch() {
+    var form = document.getElementById('baby-search');
+    form.addEventListener('submit', function (e) {
+      e.preventDefault();
+      var q = form.q.value.trim();
+      if (!q) { loadBaby(); return; }
+      var results = document.getElementById('baby-results');
+      API.get('/api/baby/search?q=' + encodeURIComponent(q))
+        .then(found => {
+          results.innerHTML = found.length
+            ? found.map(r => babyEventCard(r, escapeHtml(r.snippet).replace(/\*\*(.+?)\*\*/g, '<b>$1</b>'))).join('')
+            : '<p class="empty-hint">Ничего не найдено</p>';
+        })
+        .catch(err => { results.innerHTML = '<p class="error">' + escapeHtml(err.message) + '</p>'; });
+    });
+  }
+
+  // Infinite scroll: when the sentinel under the list comes into view, append the next (older) page.
+  function watchBabyScroll(cursor) {
+    var list = document.getElementById('baby-events');
+    var sentinel = document.createElement('p');
+    sentinel.className = 'loading';
+    sentinel.textContent = 'Загрузка...';
+    list.after(sentinel);
+    var busy = false;
+    var observer = new IntersectionObserver(function (entries) {
+      if (busy || !entries[0].isIntersecting) return;
+      if (!document.body.contains(list)) { observer.disconnect(); return; }
+      busy = true;
+      API.getPage('/api/baby/events', cursor)
+        .then(page => {
+          list.insertAdjacentHTML('beforeend', page.items.map(e => babyEventCard(e)).join(''));
+          cursor = page.next;
+          if (!cursor) { observer.disconnect(); sentinel.remove(); return; }
+          observer.unobserve(sentinel);
+          observer.observe(sentinel); // re-check: the sentinel may still be in view after a short page
+        })
+        .catch(e => { observer.disconnect(); sentinel.className = 'empty-hint'; sentinel.textContent = e.message; })
+        .finally(() => { busy = false; });
+    });
+    observer.observe(sentinel);
+  }
+
   function loadGamification() {
     API.get('/api/gamification/stats')
       .then(s => {